@@ -1,12 +1,131 @@
 import logging
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import PyMongoError
 import os
+import time
+import threading
+from collections import OrderedDict
+from be.model import request_timing
+from be.model import metrics
+from be.model import generation
+
+BLOB_FIELDS = ("content", "book_intro", "author_intro")
+
+
+class BlobCache:
+    """
+    按字节数限制大小的进程内 LRU 缓存 (read-through)。
+    每本书一个缓存项，记录已经读取过的字段，因此按字段投影的读取也能命中；
+    MongoDB 中不存在的书会以 None 缓存 (negative caching)，过期时间更短。
+    缓存项记录写入时该书的 generation，其他 worker 写入同一本书后 (见
+    be.model.generation) 这里的缓存项不再命中。
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, negative_ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        # book_id -> (fields, doc, expiry, size, generation)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, book_id: str, fields: frozenset):
+        """
+        返回 (hit, doc)；doc 为 None 表示该书在 MongoDB 中不存在
+        """
+        now = time.time()
+        gen = generation.current("blob", book_id)
+        with self.lock:
+            entry = self.entries.get(book_id)
+            if entry is not None and (now >= entry[2] or gen != entry[4]):
+                self._remove(book_id)
+                entry = None
+            if entry is None or (entry[1] is not None and not fields <= entry[0]):
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(book_id)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[1]
+
+    def generation(self, book_id: str) -> int:
+        # Read before fetching from MongoDB and pass to put()
+        return generation.current("blob", book_id)
+
+    def put(self, book_id: str, fields: frozenset, doc, gen: int = None):
+        if self.max_bytes <= 0:
+            return
+        if gen is None:
+            gen = self.generation(book_id)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(book_id)
+            if (
+                doc is not None and entry is not None and entry[1] is not None
+                and now < entry[2] and entry[4] == gen
+            ):
+                # Merge with the fields fetched earlier by another projection
+                fields = fields | entry[0]
+                doc = dict(entry[1], **doc)
+            if book_id in self.entries:
+                self._remove(book_id)
+            size = len(book_id) + sum(len(str(v).encode("utf-8")) for v in (doc or {}).values())
+            if size > self.max_bytes:
+                return
+            expiry = now + (self.negative_ttl if doc is None else self.ttl)
+            self.entries[book_id] = (fields, doc, expiry, size, gen)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, book_id: str):
+        generation.bump("blob", book_id)
+        with self.lock:
+            if book_id in self.entries:
+                self._remove(book_id)
+
+    def _remove(self, book_id: str):
+        entry = self.entries.pop(book_id)
+        self.size -= entry[3]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
 
 class BlobStore:
     def __init__(self):
         self.client = None
         self.col = None
+        self.cache = BlobCache(
+            max_bytes=int(os.environ.get("BLOB_CACHE_BYTES", 64 * 1024 * 1024)),
+            ttl=float(os.environ.get("BLOB_CACHE_TTL", 600)),
+            negative_ttl=float(os.environ.get("BLOB_CACHE_NEGATIVE_TTL", 30)),
+        )
         try:
             # 默认连接本地 MongoDB，实际生产环境应从配置读取
             self.client = MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=2000)
@@ -29,27 +148,64 @@ class BlobStore:
                 "author_intro": author_intro
             }
             # 使用 upsert，如果已存在则更新
-            self.col.update_one({"book_id": book_id}, {"$set": doc}, upsert=True)
+            with request_timing.timed("mongo"), metrics.timed("bookstore_blob_store_duration_seconds", op="put"):
+                self.col.update_one({"book_id": book_id}, {"$set": doc}, upsert=True)
         except PyMongoError as e:
             logging.error(f"Blob Store Put Error: {e}")
+        finally:
+            self.cache.invalidate(book_id)
 
-    def get_book_blob(self, book_id: str):
+    def put_book_blobs(self, docs: list):
+        """
+        批量保存多本书的大文本数据 (一次 bulk_write)。docs 中每项需包含 book_id。
+        """
+        if self.col is None or not docs:
+            return
+        try:
+            ops = [UpdateOne({"book_id": doc["book_id"]}, {"$set": doc}, upsert=True) for doc in docs]
+            with request_timing.timed("mongo"), metrics.timed("bookstore_blob_store_duration_seconds", op="bulk_put"):
+                self.col.bulk_write(ops, ordered=False)
+        except PyMongoError as e:
+            logging.error(f"Blob Store Bulk Put Error: {e}")
+        finally:
+            for doc in docs:
+                self.cache.invalidate(doc["book_id"])
+
+    def get_book_blob(self, book_id: str, fields: list = None):
         """
         获取书籍的大文本数据。如果失败，返回空对象。
+        fields 为需要的字段 (默认全部)，只会从 MongoDB 读取这些字段。
         """
-        default_res = {"content": "", "book_intro": "", "author_intro": ""}
+        fields = frozenset(fields) if fields else frozenset(BLOB_FIELDS)
+        default_res = {f: "" for f in fields}
         if self.col is None:
             return default_res
-            
+
+        hit, doc = self.cache.get(book_id, fields)
+        if hit:
+            return self._project(doc, fields) if doc is not None else default_res
+
+        gen = self.cache.generation(book_id)
         try:
-            doc = self.col.find_one({"book_id": book_id}, {"_id": 0})
+            projection = {"_id": 0, "book_id": 1}
+            projection.update({f: 1 for f in fields})
+            with request_timing.timed("mongo"), metrics.timed("bookstore_blob_store_duration_seconds", op="get"):
+                doc = self.col.find_one({"book_id": book_id}, projection)
+            self.cache.put(book_id, fields, doc or None, gen)
             if doc:
-                return doc
+                return self._project(doc, fields)
             return default_res
         except PyMongoError as e:
             logging.error(f"Blob Store Get Error: {e}")
             return default_res
 
+    @staticmethod
+    def _project(doc: dict, fields: frozenset) -> dict:
+        res = {k: v for k, v in doc.items() if k in fields or k == "book_id"}
+        for f in fields:
+            res.setdefault(f, "")
+        return res
+
     def search_in_blob(self, keyword: str):
         """
         (Optional) 在 Blob 中搜索关键字，返回匹配的 book_id 列表
@@ -71,7 +227,19 @@ class BlobStore:
             logging.error(f"Mongo Search Error: {e}")
             return []
 
-blob_store_instance = BlobStore()
+blob_store_instance: BlobStore = None
+blob_store_lock = threading.Lock()
 
 def get_blob_store():
+    # Created lazily so that a pre-fork master never opens Mongo sockets
+    # that its workers would then share
+    global blob_store_instance
+    if blob_store_instance is None:
+        with blob_store_lock:
+            if blob_store_instance is None:
+                blob_store_instance = BlobStore()
     return blob_store_instance
+
+def reset_blob_store():
+    global blob_store_instance
+    blob_store_instance = None
@@ -1,5 +1,6 @@
-from sqlalchemy import or_
 from be.model import db_conn
+from be.model import store
+from be.model.fulltext import capped_count
 from be.model.db_schema import Book as BookModel, StoreBook
 from be.model.blob_store import get_blob_store
 
@@ -41,23 +42,15 @@ class Book(db_conn.DBConn):
         return res
 
     def search_complex(self, keyword: str, limit: int = 10, skip: int = 0):
-        # Full text search simulation using LIKE on multiple columns
+        # Keyword search over title/author/tags goes through the full-text index;
+        # total is exact up to fulltext.COUNT_CAP and capped above that.
         # Note: Content/Intro search moved to NoSQL is possible, but for now we search SQL fields
         if not keyword:
             query = self.conn.query(BookModel).order_by(BookModel.id)
+            books = query.offset(skip).limit(limit).all()
+            total = capped_count(self.conn, query)
         else:
-            term = f"%{keyword}%"
-            query = self.conn.query(BookModel).filter(
-                or_(
-                    BookModel.title.like(term),
-                    BookModel.author.like(term),
-                    # BookModel.book_intro.like(term), # Removed from SQL
-                    BookModel.tags.like(term)
-                )
-            ).order_by(BookModel.id)
-            
-        books = query.offset(skip).limit(limit).all()
-        total = query.count()
+            books, total = store.get_fulltext_backend().search(self.conn, keyword, limit, skip)
         return self._enrich_books(books), total
 
     def _enrich_books(self, books):
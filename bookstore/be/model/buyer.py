@@ -1,168 +1,306 @@
 import uuid
 import time
+import logging
 from datetime import datetime
+from sqlalchemy import case, delete, select, tuple_, update
 from sqlalchemy.exc import SQLAlchemyError
 from be.model import db_conn
 from be.model import error
-from be.model.db_schema import User, Store as StoreModel, StoreBook, Order, OrderDetail, Book, UserCoupon, Coupon
+from be.model import metrics
+from be.model.ledger import Ledger, ledger_sum
+from be.model.coupon import wallet_cache
+from be.model.db_schema import User, Store as StoreModel, StoreBook, Order, OrderDetail, Book, UserCoupon, Coupon, ShoppingCart
 from be.model.user import User as UserManager
 
 class Buyer(db_conn.DBConn):
     def __init__(self):
         db_conn.DBConn.__init__(self)
 
+    def _reserve_stock(self, store_id: str, books: list) -> (bool, str, list, int):
+        """
+        Reserve stock for every line of an order with set-based statements:
+        one locked SELECT over all requested rows (ordered by book_id so that
+        concurrent orders always lock in the same order and cannot deadlock),
+        then one conditional bulk UPDATE. Does not commit.
+        """
+        counts = {}
+        for item in books:
+            book_id = item.get("id")
+            count = int(item.get("count", 0))
+            if count <= 0:
+                continue
+            # Repeated lines for the same book are merged into one detail row
+            counts[book_id] = counts.get(book_id, 0) + count
+
+        if not counts:
+            return True, "ok", [], 0
+
+        rows = self.conn.query(StoreBook.book_id, StoreBook.stock_level, StoreBook.price).filter(
+            StoreBook.store_id == store_id,
+            StoreBook.book_id.in_(list(counts.keys()))
+        ).order_by(StoreBook.book_id).with_for_update().all()
+        store_books = {r.book_id: r for r in rows}
+
+        for book_id, count in counts.items():
+            store_book = store_books.get(book_id)
+            if store_book is None:
+                return False, error.error_non_exist_book_id(book_id)[1], [], 0
+            if store_book.stock_level < count:
+                return False, error.error_stock_level_low(book_id)[1], [], 0
+
+        wanted = case(counts, value=StoreBook.book_id)
+        result = self.conn.execute(
+            update(StoreBook)
+            .where(
+                StoreBook.store_id == store_id,
+                StoreBook.book_id.in_(list(counts.keys())),
+                StoreBook.stock_level >= wanted
+            )
+            .values(stock_level=StoreBook.stock_level - wanted)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(counts):
+            # Stock moved between the SELECT and the UPDATE (e.g. SQLite, which ignores FOR UPDATE)
+            return False, error.error_stock_level_low(next(iter(counts)))[1], [], 0
+
+        order_details = []
+        total_price = 0
+        for book_id, count in counts.items():
+            price = store_books[book_id].price
+            total_price += price * count
+            order_details.append({
+                "book_id": book_id,
+                "count": count,
+                "price": price
+            })
+        return True, "ok", order_details, total_price
+
     def new_order(self, user_id: str, store_id: str, books: list, coupon_id: int = None) -> (bool, str, str):
-        order_id = ""
         try:
             if not self.user_id_exist(user_id):
                 return False, error.error_non_exist_user_id(user_id)[1], ""
             if not self.store_id_exist(store_id):
                 return False, error.error_non_exist_store_id(store_id)[1], ""
-            
-            total_price = 0
-            order_details = []
-            
-            # Prepare data and check stock
-            for item in books:
-                book_id = item.get("id")
-                count = int(item.get("count", 0))
-                
-                if count <= 0:
-                    continue
-                
-                store_book = self.conn.query(StoreBook).filter_by(store_id=store_id, book_id=book_id).with_for_update().first()
-                
-                if not store_book:
-                    self.conn.rollback()
-                    return False, error.error_non_exist_book_id(book_id)[1], ""
-                
-                if store_book.stock_level < count:
-                    self.conn.rollback()
-                    return False, error.error_stock_level_low(book_id)[1], ""
-                
-                store_book.stock_level -= count
-                price = store_book.price
-                total_price += price * count
-                
-                order_details.append({
-                    "book_id": book_id,
-                    "count": count,
-                    "price": price
-                })
-
-            if not order_details:
-                 return False, "no valid books", ""
-
-            # --- Coupon Logic ---
-            if coupon_id:
-                user_coupon = self.conn.query(UserCoupon).filter_by(id=coupon_id, user_id=user_id).with_for_update().first()
-                if not user_coupon:
-                    self.conn.rollback()
-                    return False, "coupon not found", ""
-                
-                if user_coupon.status != "unused":
-                    self.conn.rollback()
-                    return False, "coupon already used", ""
-                
-                coupon = self.conn.query(Coupon).filter_by(id=user_coupon.coupon_id).first()
-                if not coupon:
-                    self.conn.rollback()
-                    return False, "invalid coupon", ""
-                
-                if coupon.store_id != store_id:
-                    self.conn.rollback()
-                    return False, "coupon not for this store", ""
-                
-                if coupon.end_time < datetime.now():
-                    self.conn.rollback()
-                    return False, "coupon expired", ""
-                
-                if total_price < coupon.threshold:
-                    self.conn.rollback()
-                    return False, f"total price {total_price} less than threshold {coupon.threshold}", ""
-                
-                # Apply Discount
-                total_price = max(0, total_price - coupon.discount)
-                
-                # Mark as used (will commit later)
-                user_coupon.status = "used"
-            
-            # --- End Coupon Logic ---
-
-            # Create Order
-            order_id = f"order_{uuid.uuid4().hex}"
-            new_order = Order(
-                order_id=order_id,
-                user_id=user_id,
-                store_id=store_id,
-                status="unpaid", 
-                total_price=total_price,
-                created_at=datetime.now()
-            )
-            self.conn.add(new_order)
-            self.conn.flush() 
-            
-            # Link coupon to order if used
-            if coupon_id and user_coupon:
-                user_coupon.order_id = order_id
-
-            for detail in order_details:
-                new_detail = OrderDetail(
-                    order_id=order_id,
-                    book_id=detail["book_id"],
-                    count=detail["count"],
-                    price=detail["price"]
-                )
-                self.conn.add(new_detail)
-            
+
+            ok, msg, order_id, _ = self._create_order(user_id, store_id, books, coupon_id)
+            if not ok:
+                self.conn.rollback()
+                return False, msg, ""
+
             self.conn.commit()
+            if coupon_id:
+                wallet_cache.invalidate(user_id)
+            metrics.inc("bookstore_orders_created_total")
             return True, "ok", order_id
 
         except SQLAlchemyError as e:
             self.conn.rollback()
-            import logging
             logging.error(f"New Order SQL Error: {e}")
             return False, str(e), ""
         except Exception as e:
             self.conn.rollback()
-            import logging
             logging.error(f"New Order Generic Error: {e}")
             return False, str(e), ""
 
+    def _create_order(self, user_id: str, store_id: str, books: list, coupon_id: int = None) -> (bool, str, str, int):
+        """
+        Reserve the stock, apply the coupon and insert the order with its
+        details. Does not commit; on failure the caller rolls back.
+        Returns (ok, message, order_id, total_price).
+        """
+        ok, msg, order_details, total_price = self._reserve_stock(store_id, books)
+        if not ok:
+            return False, msg, "", 0
+
+        if not order_details:
+            return False, "no valid books", "", 0
+
+        # --- Coupon Logic ---
+        user_coupon = None
+        if coupon_id:
+            user_coupon = self.conn.query(UserCoupon).filter_by(id=coupon_id, user_id=user_id).with_for_update().first()
+            if not user_coupon:
+                return False, "coupon not found", "", 0
+
+            if user_coupon.status == "expired":
+                return False, "coupon expired", "", 0
+
+            if user_coupon.status != "unused":
+                return False, "coupon already used", "", 0
+
+            coupon = self.conn.query(Coupon).filter_by(id=user_coupon.coupon_id).first()
+            if not coupon:
+                return False, "invalid coupon", "", 0
+
+            if coupon.store_id != store_id:
+                return False, "coupon not for this store", "", 0
+
+            if coupon.end_time < datetime.now():
+                return False, "coupon expired", "", 0
+
+            if total_price < coupon.threshold:
+                return False, f"total price {total_price} less than threshold {coupon.threshold}", "", 0
+
+            # Apply Discount
+            total_price = max(0, total_price - coupon.discount)
+
+            # Mark as used (committed with the order)
+            user_coupon.status = "used"
+
+        # --- End Coupon Logic ---
+
+        # Create Order
+        order_id = f"order_{uuid.uuid4().hex}"
+        new_order = Order(
+            order_id=order_id,
+            user_id=user_id,
+            store_id=store_id,
+            status="unpaid",
+            total_price=total_price,
+            created_at=datetime.now()
+        )
+        self.conn.add(new_order)
+        self.conn.flush()
+
+        # Link coupon to order if used
+        if user_coupon is not None:
+            user_coupon.order_id = order_id
+
+        # One executemany for all lines instead of one ORM add per line
+        self.conn.execute(
+            OrderDetail.__table__.insert(),
+            [dict(detail, order_id=order_id) for detail in order_details]
+        )
+        return True, "ok", order_id, total_price
+
+    def checkout(self, user_id: str, coupons: dict = None) -> (bool, str, list):
+        """
+        Turn the whole shopping cart into orders in one transaction: the cart
+        is read once, grouped by store, and every store gets one order (stock
+        reserved with the same batched locked statements as new_order, plus
+        that store's coupon from `coupons` {store_id: user_coupon_id}). The
+        purchased lines are removed from the cart. Any failure rolls back all
+        stores. Returns (ok, message, [{"store_id", "order_id", "total_price"}]).
+        """
+        coupons = coupons or {}
+        try:
+            if not self.user_id_exist(user_id):
+                return False, error.error_non_exist_user_id(user_id)[1], []
+
+            lines = self.conn.query(ShoppingCart.store_id, ShoppingCart.book_id, ShoppingCart.count).filter(
+                ShoppingCart.user_id == user_id
+            ).order_by(ShoppingCart.store_id, ShoppingCart.book_id).with_for_update().all()
+            if not lines:
+                return False, "cart is empty", []
+
+            by_store = {}
+            for line in lines:
+                by_store.setdefault(line.store_id, []).append({"id": line.book_id, "count": line.count})
+            unknown = set(coupons) - set(by_store)
+            if unknown:
+                self.conn.rollback()
+                return False, "coupon not for this store", []
+
+            orders = []
+            # Stores in a fixed order, so concurrent checkouts lock stock rows in the same order
+            for store_id in sorted(by_store):
+                ok, msg, order_id, total_price = self._create_order(
+                    user_id, store_id, by_store[store_id], coupons.get(store_id)
+                )
+                if not ok:
+                    self.conn.rollback()
+                    return False, msg, []
+                orders.append({"store_id": store_id, "order_id": order_id, "total_price": total_price})
+
+            self.conn.execute(
+                delete(ShoppingCart)
+                .where(
+                    ShoppingCart.user_id == user_id,
+                    tuple_(ShoppingCart.store_id, ShoppingCart.book_id).in_(
+                        [(line.store_id, line.book_id) for line in lines]
+                    ),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self.conn.commit()
+            if coupons:
+                wallet_cache.invalidate(user_id)
+            metrics.inc("bookstore_orders_created_total", len(orders))
+            return True, "ok", orders
+
+        except SQLAlchemyError as e:
+            self.conn.rollback()
+            logging.error(f"Checkout SQL Error: {e}")
+            return False, str(e), []
+        except Exception as e:
+            self.conn.rollback()
+            logging.error(f"Checkout Generic Error: {e}")
+            return False, str(e), []
+
     def payment(self, user_id: str, order_id: str, password: str) -> (bool, str):
+        """
+        Pay an order with conditional statements instead of loading rows through
+        the ORM: one SELECT for the order and its seller, the order status flip,
+        a SELECT ... FOR UPDATE of the buyer row (password check), the buyer
+        debit (balance checked in its WHERE) and an append to the seller's
+        balance ledger. The seller's user row is never locked, so payments to the
+        same store do not queue on it; the order row is always locked before the
+        buyer row.
+        """
         try:
-            order = self.conn.query(Order).filter_by(order_id=order_id).with_for_update().first()
-            if not order:
-                 return False, "order not found"
-            
-            if order.user_id != user_id:
+            row = self.conn.execute(
+                select(Order.user_id, Order.status, Order.total_price, StoreModel.user_id)
+                .outerjoin(StoreModel, StoreModel.store_id == Order.store_id)
+                .where(Order.order_id == order_id)
+            ).first()
+            if row is None:
+                return False, "order not found"
+            buyer_id, status, total_price, seller_id = row
+            if buyer_id != user_id:
                 return False, "authorization fail"
-                
-            if order.status != "unpaid":
+            if status != "unpaid":
                 return False, "order status invalid"
-            
-            um = UserManager()
-            code, msg = um.check_password(user_id, password)
-            if code != 200:
+
+            flipped = self.conn.execute(
+                update(Order)
+                .where(Order.order_id == order_id, Order.status == "unpaid")
+                .values(status="paid")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if flipped != 1:
+                # Paid or canceled concurrently
+                self.conn.rollback()
+                return False, "order status invalid"
+
+            # Lock the buyer row before reading the ledger. Under READ COMMITTED a
+            # debit that waited on the row lock while the compactor folded this
+            # user's ledger rows into user.balance would see the new balance but
+            # still sum the folded rows from its old snapshot, counting them twice.
+            # Once the lock is held, the debit below starts with a fresh snapshot.
+            buyer = self.conn.execute(
+                select(User.password).where(User.user_id == user_id).with_for_update()
+            ).first()
+            if buyer is None or buyer.password != password:
+                self.conn.rollback()
                 return False, "authorization fail"
-            
-            total_price = order.total_price
-            
-            buyer = self.conn.query(User).filter_by(user_id=user_id).with_for_update().first()
-            if buyer.balance < total_price:
+
+            # The balance check counts the buyer's own not yet compacted ledger
+            # credits; RETURNING yields no row when it fails
+            debited = self.conn.execute(
+                update(User)
+                .where(User.user_id == user_id, User.balance + ledger_sum(user_id) >= total_price)
+                .values(balance=User.balance - total_price)
+                .returning(User.balance)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if debited is None:
                 self.conn.rollback()
                 return False, "not sufficient funds"
-            
-            buyer.balance -= total_price
-            
-            store = self.conn.query(StoreModel).filter_by(store_id=order.store_id).first()
-            if store and store.user_id:
-                seller = self.conn.query(User).filter_by(user_id=store.user_id).with_for_update().first()
-                if seller:
-                    seller.balance += total_price
-            
-            order.status = "paid"
+            if seller_id:
+                Ledger().credit(seller_id, total_price, order_id)
+
             self.conn.commit()
+            metrics.inc("bookstore_payments_total")
             return True, "ok"
 
         except SQLAlchemyError as e:
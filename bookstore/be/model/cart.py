@@ -1,7 +1,8 @@
+from sqlalchemy import delete, not_, select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from be.model import db_conn
 from be.model import error
-from be.model.db_schema import ShoppingCart
+from be.model.db_schema import ShoppingCart, StoreBook
 
 class Cart(db_conn.DBConn):
     def __init__(self):
@@ -48,6 +49,76 @@ class Cart(db_conn.DBConn):
             self.conn.rollback()
             return 530, str(e)
 
+    def apply_diff(self, user_id: str, items: list, replace: bool = False):
+        """
+        Apply a batch of cart changes in one transaction and return the
+        resulting cart. items: [{"store_id", "book_id", "count"}], count is the
+        new quantity of the line (<= 0 removes it); with replace=True lines not
+        in items are removed too (full sync). All (store_id, book_id) pairs are
+        validated with one IN query, then one bulk upsert and one bulk delete.
+        """
+        try:
+            changes = {}
+            for item in items:
+                key = (item.get("store_id"), item.get("book_id"))
+                # The last change of a line wins
+                changes[key] = int(item.get("count", 0))
+        except (TypeError, ValueError, AttributeError):
+            return 400, "invalid cart item", []
+
+        try:
+            if not self.user_id_exist(user_id):
+                return error.error_non_exist_user_id(user_id) + ([],)
+
+            upserts = {key: count for key, count in changes.items() if count > 0}
+            removals = [key for key, count in changes.items() if count <= 0]
+
+            if upserts:
+                found = set(
+                    tuple(row) for row in self.conn.execute(
+                        select(StoreBook.store_id, StoreBook.book_id)
+                        .where(tuple_(StoreBook.store_id, StoreBook.book_id).in_(list(upserts)))
+                    )
+                )
+                for store_id, book_id in upserts:
+                    if (store_id, book_id) not in found:
+                        self.conn.rollback()
+                        return error.error_non_exist_book_id(book_id) + ([],)
+
+                stmt = self.insert_stmt(ShoppingCart.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "store_id", "book_id"],
+                    set_={"count": stmt.excluded["count"]},
+                )
+                self.conn.execute(stmt, [
+                    {"user_id": user_id, "store_id": s, "book_id": b, "count": count}
+                    for (s, b), count in upserts.items()
+                ])
+
+            line = tuple_(ShoppingCart.store_id, ShoppingCart.book_id)
+            removal = None
+            if replace:
+                removal = delete(ShoppingCart).where(ShoppingCart.user_id == user_id)
+                if upserts:
+                    removal = removal.where(not_(line.in_(list(upserts))))
+            elif removals:
+                removal = delete(ShoppingCart).where(ShoppingCart.user_id == user_id, line.in_(removals))
+            if removal is not None:
+                self.conn.execute(removal.execution_options(synchronize_session=False))
+
+            rows = self.conn.execute(
+                select(ShoppingCart.store_id, ShoppingCart.book_id, ShoppingCart.count)
+                .where(ShoppingCart.user_id == user_id)
+                .order_by(ShoppingCart.store_id, ShoppingCart.book_id)
+            ).all()
+            self.conn.commit()
+            return 200, "ok", [
+                {"store_id": row.store_id, "book_id": row.book_id, "count": row.count} for row in rows
+            ]
+        except SQLAlchemyError as e:
+            self.conn.rollback()
+            return 528, str(e), []
+
     def remove_item(self, user_id: str, store_id: str, book_id: str) -> (int, str):
         try:
             item = self.conn.query(ShoppingCart).filter_by(
@@ -1,14 +1,293 @@
+import os
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from sqlalchemy import select, update, func
 from sqlalchemy.exc import SQLAlchemyError
 from be.model import db_conn
 from be.model import error
-from be.model.db_schema import Coupon, UserCoupon, Store as StoreModel
+from be.model import metrics
+from be.model import generation
+from be.model import store as store_module
+from be.model.job_lock import JobLock
+from be.model.db_schema import Coupon, CouponStockBucket, UserCoupon, Store as StoreModel
+
+# Stock buckets of a new coupon (body "buckets" overrides): claims pick a
+# random bucket row, so concurrent collectors rarely wait on the same row
+COUPON_STOCK_BUCKETS = int(os.environ.get("COUPON_STOCK_BUCKETS", 1))
+# Flash-sale mode: a claim commits only the stock decrement and the UserCoupon
+# rows are inserted in batches by a background writer
+COUPON_WRITE_BEHIND = os.environ.get("COUPON_WRITE_BEHIND", "0") == "1"
+# Queued write-behind rows above which collects insert synchronously again
+COUPON_WRITE_BEHIND_MAX_PENDING = int(os.environ.get("COUPON_WRITE_BEHIND_MAX_PENDING", 10000))
+# User coupons marked expired per statement by the expiry job
+EXPIRY_BATCH_SIZE = 1000
+# Claim made on the coupon row itself rather than on a stock bucket
+COUPON_ROW = -1
+
+
+def split_stock(stock: int, buckets: int) -> list:
+    """Per-bucket stock; at most one bucket per coupon in stock"""
+    buckets = max(1, min(buckets, stock))
+    return [stock // buckets + (1 if i < stock % buckets else 0) for i in range(buckets)]
+
+
+class CouponCache:
+    """
+    Per-process coupon facts: end_time and the bucket count of a coupon,
+    which never change, and whether it has sold out. Stock can come back
+    (a write-behind row that cannot be written gives its unit back), so a
+    sold-out mark remembers the coupon's "coupon" generation and
+    unmark_sold_out bumps it: the mark is dropped in every pre-fork worker
+    (be.model.generation). Lets a sold-out or expired collect return without
+    touching the coupon tables. Coupon ids are only unique within one
+    database: clear() when it is restored or re-created (reset_caches).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.meta = {}
+        self.sold_out = {}
+
+    def get(self, coupon_id: int):
+        entry = self.meta.get(coupon_id)
+        if entry is None or entry[2] != generation.current("coupon", str(coupon_id)):
+            return None
+        return entry[0], entry[1]
+
+    def put(self, coupon_id: int, end_time: datetime, buckets: int):
+        gen = generation.current("coupon", str(coupon_id))
+        with self.lock:
+            if len(self.meta) >= self.max_size:
+                self.meta.clear()
+            self.meta[coupon_id] = (end_time, buckets, gen)
+
+    def is_sold_out(self, coupon_id: int) -> bool:
+        gen = self.sold_out.get(coupon_id)
+        return gen is not None and gen == generation.current("coupon", str(coupon_id))
+
+    def mark_sold_out(self, coupon_id: int, gen: int = None):
+        """gen: the generation read before the claim that found no stock"""
+        if gen is None:
+            gen = generation.current("coupon", str(coupon_id))
+        with self.lock:
+            if len(self.sold_out) >= self.max_size:
+                self.sold_out.clear()
+            self.sold_out[coupon_id] = gen
+
+    def unmark_sold_out(self, coupon_id: int):
+        generation.bump("coupon", str(coupon_id))
+        with self.lock:
+            self.sold_out.pop(coupon_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.meta.clear()
+            self.sold_out.clear()
+
+
+coupon_cache = CouponCache()
+
+
+class WalletCache:
+    """
+    Per-process LRU + TTL cache of each user's unused coupons (all stores).
+    Collect and use invalidate the entry here and bump the user's "wallet"
+    generation, so the other pre-fork workers drop theirs on the next lookup
+    (be.model.generation). Entries keep each coupon's end_time so an expired
+    coupon is never served from the cache.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id: str):
+        if self.max_size <= 0:
+            return None
+        gen = generation.current("wallet", user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            wallet, expiry, entry_gen = entry
+            if time.time() >= expiry or gen != entry_gen:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return wallet
+
+    def generation(self, user_id: str) -> int:
+        """Read before loading the wallet and pass to put, so an invalidation in between is not hidden"""
+        return generation.current("wallet", user_id)
+
+    def put(self, user_id: str, wallet: list, gen: int = None):
+        if self.max_size <= 0:
+            return
+        if gen is None:
+            gen = self.generation(user_id)
+        with self.lock:
+            self.entries[user_id] = (wallet, time.time() + self.ttl, gen)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        generation.bump("wallet", user_id)
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+wallet_cache = WalletCache(
+    max_size=int(os.environ.get("COUPON_WALLET_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("COUPON_WALLET_TTL", 5)),
+)
+
+
+def reset_caches():
+    """Forget cached coupon facts and wallets, e.g. after the database was restored or re-created"""
+    coupon_cache.clear()
+    wallet_cache.clear()
+
+
+def release_stock(conn, coupon_id: int, bucket: int):
+    """
+    Give one unit of claimed stock back to the coupon row or to its bucket.
+    The caller calls coupon_cache.unmark_sold_out once this has committed:
+    a claim that read the old generation and found no stock cannot then
+    leave a fresh sold-out mark behind.
+    """
+    if bucket == COUPON_ROW:
+        stmt = update(Coupon).where(Coupon.id == coupon_id).values(stock=Coupon.stock + 1)
+    else:
+        stmt = update(CouponStockBucket).where(
+            CouponStockBucket.coupon_id == coupon_id, CouponStockBucket.bucket == bucket
+        ).values(stock=CouponStockBucket.stock + 1)
+    conn.execute(stmt.execution_options(synchronize_session=False))
+
+
+class UserCouponWriter:
+    """
+    Write-behind queue for UserCoupon rows: a background thread inserts what
+    has been queued in one executemany per batch_size rows / flush_interval.
+    A failed batch is retried, then written row by row; a row that still
+    fails gets its claimed stock back, so the unit is not lost with it.
+    put() refuses rows once max_pending are queued and the caller inserts
+    synchronously. Rows still queued when the process is killed (no atexit
+    flush) are lost together with their stock: the trade-off of this mode.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.05, retries: int = 3,
+                 max_pending: int = COUPON_WRITE_BEHIND_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def put(self, user_id: str, coupon_id: int, bucket: int) -> bool:
+        """Queue a row; False when the queue is full and the caller must write it itself"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((user_id, coupon_id, bucket))
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self):
+        """Block until every queued row has been written (or given up on)"""
+        # Also registered with atexit: nothing to wait for when this process's writer never ran
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.join()
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked worker or after the thread died
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._loop, name="user-coupon-writer", daemon=True)
+            self.thread.start()
+
+    def _loop(self):
+        while True:
+            rows = [self.queue.get()]
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self.queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+            try:
+                self.write(rows)
+            except Exception as e:
+                logging.error(f"user coupon write-behind batch failed: {e}")
+            finally:
+                for _ in rows:
+                    self.queue.task_done()
+
+    def write(self, rows: list):
+        """Insert (user_id, coupon_id, bucket) rows; also the synchronous fallback of put()"""
+        engine = store_module.database_instance.engine
+        for attempt in range(self.retries):
+            try:
+                with engine.begin() as c:
+                    c.execute(UserCoupon.__table__.insert(), [self._values(row) for row in rows])
+                for row in rows:
+                    wallet_cache.invalidate(row[0])
+                return
+            except SQLAlchemyError as e:
+                logging.error(f"user coupon write-behind failed (attempt {attempt + 1}): {e}")
+        # One bad row fails the whole batch: write the rows one by one
+        for row in rows:
+            try:
+                with engine.begin() as c:
+                    c.execute(UserCoupon.__table__.insert(), self._values(row))
+                wallet_cache.invalidate(row[0])
+            except SQLAlchemyError as e:
+                logging.error(f"user coupon write-behind dropped {row}, giving its stock back: {e}")
+                self._release(engine, row)
+
+    @staticmethod
+    def _values(row) -> dict:
+        return {"user_id": row[0], "coupon_id": row[1], "status": "unused"}
+
+    @staticmethod
+    def _release(engine, row):
+        try:
+            with engine.begin() as c:
+                release_stock(c, row[1], row[2])
+        except SQLAlchemyError as e:
+            logging.error(f"user coupon write-behind lost {row} and its stock: {e}")
+            return
+        coupon_cache.unmark_sold_out(row[1])
+
+
+user_coupon_writer = UserCouponWriter()
+
 
 class CouponManager(db_conn.DBConn):
     def __init__(self):
         db_conn.DBConn.__init__(self)
 
-    def create_coupon(self, user_id: str, store_id: str, name: str, threshold: int, discount: int, stock: int, end_time: datetime):
+    def create_coupon(self, user_id: str, store_id: str, name: str, threshold: int, discount: int, stock: int, end_time: datetime,
+                      buckets: int = None):
         try:
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
@@ -20,15 +299,23 @@ class CouponManager(db_conn.DBConn):
             if store.user_id != user_id:
                 return 401, "user is not the owner of this store", 0
 
+            split = split_stock(stock, buckets or COUPON_STOCK_BUCKETS)
             coupon = Coupon(
                 store_id=store_id,
                 name=name,
                 threshold=threshold,
                 discount=discount,
-                stock=stock,
+                # A bucketed coupon keeps its stock in coupon_stock_bucket
+                stock=stock if len(split) == 1 else 0,
                 end_time=end_time
             )
             self.conn.add(coupon)
+            if len(split) > 1:
+                self.conn.flush()
+                self.conn.execute(
+                    CouponStockBucket.__table__.insert(),
+                    [{"coupon_id": coupon.id, "bucket": i, "stock": n} for i, n in enumerate(split)]
+                )
             self.conn.commit()
             return 200, "ok", coupon.id
         except SQLAlchemyError as e:
@@ -36,62 +323,206 @@ class CouponManager(db_conn.DBConn):
             return 528, str(e), 0
 
     def collect_coupon(self, user_id: str, coupon_id: int):
+        """
+        Claim one unit of stock with a conditional UPDATE (no SELECT ... FOR
+        UPDATE) on the coupon row, or on a random stock bucket of a bucketed
+        coupon. Once the user is validated, sold-out and expired coupons are
+        answered from the per-process cache without touching the coupon tables.
+        """
         try:
             if not self.user_id_exist(user_id):
                 return error.error_non_exist_user_id(user_id)
-            
-            # Transaction: check stock and decrease
-            coupon = self.conn.query(Coupon).filter_by(id=coupon_id).with_for_update().first()
-            if not coupon:
-                return 404, "coupon not found"
-            
-            if coupon.stock <= 0:
-                self.conn.rollback()
+            if coupon_cache.is_sold_out(coupon_id):
                 return 400, "coupon out of stock"
-            
-            if coupon.end_time < datetime.now():
-                self.conn.rollback()
+            meta = coupon_cache.get(coupon_id) or self._load_meta(coupon_id)
+            if meta is None:
+                return 404, "coupon not found"
+            end_time, buckets = meta
+            if end_time < datetime.now():
                 return 400, "coupon expired"
 
-            # Check if user already has this coupon (optional logic, let's allow multiple)
-            # For now, let's say unlimited collection per user for simplicity, or limit 1
-            # existing = self.conn.query(UserCoupon).filter_by(user_id=user_id, coupon_id=coupon_id, status="unused").first()
-            # if existing: ...
+            gen = generation.current("coupon", str(coupon_id))
+            bucket = self._claim(coupon_id, buckets)
+            if bucket is None:
+                self.conn.rollback()
+                coupon_cache.mark_sold_out(coupon_id, gen)
+                return 400, "coupon out of stock"
 
-            coupon.stock -= 1
-            user_coupon = UserCoupon(
-                user_id=user_id,
-                coupon_id=coupon_id,
-                status="unused"
-            )
-            self.conn.add(user_coupon)
-            self.conn.commit()
+            if COUPON_WRITE_BEHIND:
+                self.conn.commit()
+                if not user_coupon_writer.put(user_id, coupon_id, bucket):
+                    # Writer backlogged: insert now (stock given back if that fails)
+                    user_coupon_writer.write([(user_id, coupon_id, bucket)])
+            else:
+                self.conn.add(UserCoupon(user_id=user_id, coupon_id=coupon_id, status="unused"))
+                self.conn.commit()
+            wallet_cache.invalidate(user_id)
+            metrics.inc("bookstore_coupons_collected_total")
             return 200, "ok"
         except SQLAlchemyError as e:
             self.conn.rollback()
             return 528, str(e)
 
+    def _load_meta(self, coupon_id: int):
+        row = self.conn.execute(
+            select(Coupon.end_time, func.count(CouponStockBucket.bucket))
+            .outerjoin(CouponStockBucket, CouponStockBucket.coupon_id == Coupon.id)
+            .where(Coupon.id == coupon_id)
+            .group_by(Coupon.id, Coupon.end_time)
+        ).first()
+        if row is None:
+            return None
+        coupon_cache.put(coupon_id, row[0], max(1, row[1]))
+        return row[0], max(1, row[1])
+
+    def _claim(self, coupon_id: int, buckets: int):
+        """The claimed bucket (COUPON_ROW for an unbucketed coupon), None when sold out"""
+        if buckets <= 1:
+            claimed = self.conn.execute(
+                update(Coupon)
+                .where(Coupon.id == coupon_id, Coupon.stock > 0)
+                .values(stock=Coupon.stock - 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            return COUPON_ROW if claimed == 1 else None
+        # Start at a random bucket and walk on only when it is empty
+        start = random.randrange(buckets)
+        for i in range(buckets):
+            claimed = self.conn.execute(
+                update(CouponStockBucket)
+                .where(
+                    CouponStockBucket.coupon_id == coupon_id,
+                    CouponStockBucket.bucket == (start + i) % buckets,
+                    CouponStockBucket.stock > 0,
+                )
+                .values(stock=CouponStockBucket.stock - 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed == 1:
+                return (start + i) % buckets
+        return None
+
     def get_available_coupons(self, user_id: str, store_id: str = None):
+        """
+        The user's unused, unexpired coupons, from the wallet cache or from one
+        projected query (user_coupon(user_id, status) index, coupon by primary
+        key) instead of loading each coupon through the lazy relationship.
+        """
         try:
-            query = self.conn.query(UserCoupon).join(Coupon).filter(
-                UserCoupon.user_id == user_id,
-                UserCoupon.status == "unused",
-                Coupon.end_time > datetime.now()
-            )
-            if store_id:
-                query = query.filter(Coupon.store_id == store_id)
-            
+            wallet = wallet_cache.get(user_id)
+            if wallet is None:
+                gen = wallet_cache.generation(user_id)
+                rows = self.conn.query(
+                    UserCoupon.id, UserCoupon.coupon_id, Coupon.name, Coupon.threshold,
+                    Coupon.discount, Coupon.store_id, Coupon.end_time,
+                ).join(Coupon, Coupon.id == UserCoupon.coupon_id).filter(
+                    UserCoupon.user_id == user_id,
+                    UserCoupon.status == "unused",
+                    # Expired coupons are flipped to "expired" by the expiry job;
+                    # this only covers the ones that expired since its last run
+                    Coupon.end_time > datetime.now()
+                ).all()
+                wallet = [tuple(row) for row in rows]
+                wallet_cache.put(user_id, wallet, gen)
+
+            now = datetime.now()
             res = []
-            for uc in query.all():
+            for uc_id, coupon_id, name, threshold, discount, coupon_store_id, end_time in wallet:
+                if end_time <= now or (store_id and coupon_store_id != store_id):
+                    continue
                 res.append({
-                    "id": uc.id,
-                    "coupon_id": uc.coupon_id,
-                    "name": uc.coupon.name,
-                    "threshold": uc.coupon.threshold,
-                    "discount": uc.coupon.discount,
-                    "store_id": uc.coupon.store_id
+                    "id": uc_id,
+                    "coupon_id": coupon_id,
+                    "name": name,
+                    "threshold": threshold,
+                    "discount": discount,
+                    "store_id": coupon_store_id
                 })
             return 200, "ok", res
         except SQLAlchemyError as e:
             return 528, str(e), []
 
+    def expire_coupons(self, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+        """Mark unused user coupons of expired coupons as "expired"; returns how many"""
+        total = 0
+        while True:
+            try:
+                expired_ids = (
+                    select(UserCoupon.id)
+                    .join(Coupon, Coupon.id == UserCoupon.coupon_id)
+                    .where(UserCoupon.status == "unused", Coupon.end_time <= datetime.now())
+                    .limit(batch_size)
+                )
+                n = self.conn.execute(
+                    update(UserCoupon)
+                    .where(UserCoupon.id.in_(expired_ids.scalar_subquery()), UserCoupon.status == "unused")
+                    .values(status="expired")
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                self.conn.commit()
+            except SQLAlchemyError as e:
+                self.conn.rollback()
+                logging.error(f"coupon expiry failed: {e}")
+                break
+            total += n
+            if n < batch_size:
+                break
+        if total:
+            logging.info(f"coupon expiry: marked {total} user coupons expired")
+        return total
+
+
+class CouponExpiryJob:
+    """
+    Background thread that runs expire_coupons every `interval` seconds.
+    Under the pre-fork server only the holder of the "coupon-expiry" JobLock
+    runs it, so the workers do not all write user_coupon at once.
+    """
+
+    def __init__(self, interval: float, batch_size: int = EXPIRY_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = JobLock("coupon-expiry")
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def run_once(self) -> int:
+        try:
+            return CouponManager().expire_coupons(self.batch_size)
+        finally:
+            store_module.database_instance.Session.remove()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                if self.lock.acquire():
+                    self.run_once()
+            except Exception as e:
+                logging.error(f"coupon expiry job failed: {e}")
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="coupon-expiry", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.lock.release()
+
+
+def start_expiry_from_env():
+    """
+    Run the expiry job every COUPON_EXPIRY_INTERVAL seconds (default 60, 0
+    disables). Returns the job, or None when disabled.
+    """
+    interval = float(os.environ.get("COUPON_EXPIRY_INTERVAL", 60))
+    if interval <= 0:
+        return None
+    job = CouponExpiryJob(interval)
+    job.start()
+    return job
@@ -1,3 +1,5 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
 from be.model import store
 from be.model.db_schema import User, Store as StoreModel, StoreBook
 
@@ -17,3 +19,12 @@ class DBConn:
     def store_id_exist(self, store_id):
         store_obj = self.conn.query(StoreModel).filter_by(store_id=store_id).first()
         return store_obj is not None
+
+    def insert_stmt(self, table):
+        # Dialect-specific INSERT so callers can use on_conflict_do_nothing / on_conflict_do_update
+        dialect = self.conn.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        if dialect == "sqlite":
+            return sqlite.insert(table)
+        return insert(table)
@@ -82,6 +82,8 @@ class Order(Base):
     
     __table_args__ = (
         Index('idx_order_status_created_at', 'status', 'created_at'),
+        # Keyset pagination of a buyer's orders: (user_id, created_at, order_id)
+        Index('idx_order_user_created_at', 'user_id', 'created_at', 'order_id'),
     )
     
     user = relationship("User", back_populates="orders")
@@ -157,9 +159,20 @@ class Coupon(Base):
     stock = Column(Integer, default=0)          # 总库存
     start_time = Column(DateTime, default=func.now())
     end_time = Column(DateTime, nullable=False) # 过期时间
+
+    __table_args__ = (
+        Index('idx_coupon_store_end_time', 'store_id', 'end_time'),
+    )
     
     store = relationship("Store")
 
+class CouponStockBucket(Base):
+    # 秒杀优惠券：库存拆分到多行，领取时分散到不同的行上扣减
+    __tablename__ = 'coupon_stock_bucket'
+    coupon_id = Column(Integer, ForeignKey('coupon.id'), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    stock = Column(Integer, nullable=False, default=0)
+
 class UserCoupon(Base):
     __tablename__ = 'user_coupon'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -167,12 +180,30 @@ class UserCoupon(Base):
     coupon_id = Column(Integer, ForeignKey('coupon.id'), nullable=False)
     status = Column(String(20), default="unused") # unused, used, expired
     order_id = Column(String(255), ForeignKey('order.order_id'), nullable=True) # 关联订单
+
+    __table_args__ = (
+        # 用户的可用优惠券: (user_id, status = 'unused')
+        Index('idx_user_coupon_user_status', 'user_id', 'status'),
+    )
     
     coupon = relationship("Coupon")
     user = relationship("User")
 
+class BalanceLedger(Base):
+    # 卖家收入流水：付款只追加一行，不锁卖家的 user 行；定期合并进 user.balance
+    __tablename__ = 'balance_ledger'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(255), ForeignKey('user.user_id'), nullable=False, index=True)
+    amount = Column(Integer, nullable=False)
+    order_id = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
 def init_db_schema(engine):
     Base.metadata.create_all(engine)
+    # create_all skips existing tables, so add indexes declared after a table was created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 def get_base():
     return Base
@@ -0,0 +1,237 @@
+import os
+import logging
+from sqlalchemy import event, or_, text, func
+from be.model.db_schema import Book as BookModel
+
+# Totals above this are reported as "at least COUNT_CAP" instead of being
+# counted exactly; a page of results never needs more than that.
+COUNT_CAP = int(os.environ.get("FULLTEXT_COUNT_CAP", 1000))
+
+
+class LikeBackend:
+    """
+    Fallback: leading-wildcard LIKE over title/author/tags (full table scan).
+    """
+    name = "like"
+
+    def setup(self, engine):
+        pass
+
+    def search(self, conn, keyword: str, limit: int, skip: int):
+        term = f"%{keyword}%"
+        query = conn.query(BookModel).filter(
+            or_(
+                BookModel.title.like(term),
+                BookModel.author.like(term),
+                BookModel.tags.like(term)
+            )
+        ).order_by(BookModel.id)
+        books = query.offset(skip).limit(limit).all()
+        return books, capped_count(conn, query)
+
+
+def short_grams(value):
+    """
+    Every 1- and 2-character window of the letter/digit runs of value, space
+    separated: "三体 II" -> "三 体 三体 I I II". Indexed with the unicode61
+    tokenizer, a 1-2 character term then matches as a single token.
+    Registered on SQLite connections as book_short_grams() for the triggers.
+    """
+    if not value:
+        return value
+    grams = []
+    run = []
+    for ch in value + " ":
+        if ch.isalnum():
+            run.append(ch)
+            continue
+        grams.extend(run)
+        grams.extend(run[i] + run[i + 1] for i in range(len(run) - 1))
+        run = []
+    return " ".join(grams)
+
+
+def install_sqlite_functions(engine):
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_conn, connection_record):
+        dbapi_conn.create_function("book_short_grams", 1, short_grams, deterministic=True)
+
+
+class SqliteFts5Backend(LikeBackend):
+    """
+    SQLite FTS5 tables over book(title, author, tags), kept in sync by triggers:
+      book_fts        trigram tokenizer, every 3-character window is indexed, so
+                      Chinese titles match on substrings without a word segmenter;
+      book_fts_short  the 1- and 2-character windows (short_grams) as unicode61
+                      tokens, for the short terms trigram cannot match ("三体");
+      book_fts_docid  INTEGER PRIMARY KEY docid <-> book.id. book has a string
+                      primary key, so its implicit rowid may be renumbered by
+                      VACUUM; the FTS rows are keyed by docid instead.
+    Both FTS tables store their own copy of the text. Results are ranked by
+    bm25 with title weighted above author and tags.
+    """
+    name = "fts5"
+    # trigram cannot match terms shorter than 3 characters: book_fts_short below that
+    min_keyword_length = 3
+
+    tables = ("book_fts", "book_fts_short")
+
+    statements = [
+        "CREATE TABLE book_fts_docid (docid INTEGER PRIMARY KEY, book_id TEXT NOT NULL UNIQUE)",
+        "CREATE VIRTUAL TABLE book_fts USING fts5(title, author, tags, tokenize='trigram')",
+        "CREATE VIRTUAL TABLE book_fts_short USING fts5(title, author, tags, tokenize='unicode61')",
+        "CREATE TRIGGER book_fts_ai AFTER INSERT ON book BEGIN "
+        "INSERT INTO book_fts_docid(book_id) VALUES (new.id); "
+        "INSERT INTO book_fts(rowid, title, author, tags) "
+        "SELECT docid, new.title, new.author, new.tags FROM book_fts_docid WHERE book_id = new.id; "
+        "INSERT INTO book_fts_short(rowid, title, author, tags) "
+        "SELECT docid, book_short_grams(new.title), book_short_grams(new.author), book_short_grams(new.tags) "
+        "FROM book_fts_docid WHERE book_id = new.id; "
+        "END",
+        "CREATE TRIGGER book_fts_ad AFTER DELETE ON book BEGIN "
+        "DELETE FROM book_fts WHERE rowid = (SELECT docid FROM book_fts_docid WHERE book_id = old.id); "
+        "DELETE FROM book_fts_short WHERE rowid = (SELECT docid FROM book_fts_docid WHERE book_id = old.id); "
+        "DELETE FROM book_fts_docid WHERE book_id = old.id; "
+        "END",
+        "CREATE TRIGGER book_fts_au AFTER UPDATE OF id, title, author, tags ON book BEGIN "
+        "UPDATE book_fts_docid SET book_id = new.id WHERE book_id = old.id; "
+        "UPDATE book_fts SET title = new.title, author = new.author, tags = new.tags "
+        "WHERE rowid = (SELECT docid FROM book_fts_docid WHERE book_id = new.id); "
+        "UPDATE book_fts_short SET title = book_short_grams(new.title), "
+        "author = book_short_grams(new.author), tags = book_short_grams(new.tags) "
+        "WHERE rowid = (SELECT docid FROM book_fts_docid WHERE book_id = new.id); "
+        "END",
+        # Index the rows that existed before the tables were created
+        "INSERT INTO book_fts_docid(book_id) SELECT id FROM book",
+        "INSERT INTO book_fts(rowid, title, author, tags) "
+        "SELECT d.docid, b.title, b.author, b.tags FROM book_fts_docid d JOIN book b ON b.id = d.book_id",
+        "INSERT INTO book_fts_short(rowid, title, author, tags) "
+        "SELECT d.docid, book_short_grams(b.title), book_short_grams(b.author), book_short_grams(b.tags) "
+        "FROM book_fts_docid d JOIN book b ON b.id = d.book_id",
+    ]
+
+    # Earlier layout: an external-content book_fts keyed by book's implicit rowid
+    legacy = [
+        "DROP TRIGGER IF EXISTS book_fts_ai",
+        "DROP TRIGGER IF EXISTS book_fts_ad",
+        "DROP TRIGGER IF EXISTS book_fts_au",
+        "DROP TABLE IF EXISTS book_fts",
+        "DROP TABLE IF EXISTS book_fts_short",
+        "DROP TABLE IF EXISTS book_fts_docid",
+    ]
+
+    @staticmethod
+    def available(engine) -> bool:
+        try:
+            with engine.connect() as c:
+                c.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')")
+                c.exec_driver_sql("DROP TABLE temp.fts5_probe")
+            return True
+        except Exception:
+            return False
+
+    def setup(self, engine):
+        with engine.begin() as c:
+            exists = c.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='book_fts_docid'"
+            ).first()
+            if exists:
+                return
+            for stmt in self.legacy + self.statements:
+                c.exec_driver_sql(stmt)
+
+    def search(self, conn, keyword: str, limit: int, skip: int):
+        if len(keyword) >= self.min_keyword_length:
+            table = "book_fts"
+        elif keyword.isalnum():
+            table = "book_fts_short"
+        else:
+            # Short terms with punctuation / spaces have no index-backed form
+            return LikeBackend.search(self, conn, keyword, limit, skip)
+        # Quote as a single FTS5 string so user input is never parsed as query syntax
+        match = '"{}"'.format(keyword.replace('"', '""'))
+        books = conn.query(BookModel).from_statement(text(
+            "SELECT book.* FROM {t} JOIN book_fts_docid d ON d.docid = {t}.rowid "
+            "JOIN book ON book.id = d.book_id "
+            "WHERE {t} MATCH :match ORDER BY bm25({t}, 10.0, 5.0, 1.0), book.id "
+            "LIMIT :limit OFFSET :skip".format(t=table)
+        )).params(match=match, limit=limit, skip=skip).all()
+        total = conn.execute(text(
+            "SELECT count(*) FROM (SELECT 1 FROM {t} WHERE {t} MATCH :match LIMIT :cap)".format(t=table)
+        ), {"match": match, "cap": COUNT_CAP}).scalar()
+        return books, total
+
+
+class PostgresBackend(LikeBackend):
+    """
+    PostgreSQL: GIN index on a 'simple' tsvector for token matches and ranking,
+    plus a pg_trgm GIN index on the same text so that substring / CJK queries
+    (which the default parser cannot segment) are also served from an index.
+    Both are expression indexes, so Postgres keeps them in sync itself.
+    """
+    name = "postgres"
+
+    document = "(coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(tags, ''))"
+
+    def setup(self, engine):
+        with engine.begin() as c:
+            c.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            c.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS idx_book_fts ON book "
+                "USING GIN (to_tsvector('simple', {}))".format(self.document)
+            )
+            c.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS idx_book_trgm ON book "
+                "USING GIN ({} gin_trgm_ops)".format(self.document)
+            )
+
+    def search(self, conn, keyword: str, limit: int, skip: int):
+        condition = (
+            "(to_tsvector('simple', {doc}) @@ plainto_tsquery('simple', :kw) "
+            "OR {doc} ILIKE :pattern)"
+        ).format(doc=self.document)
+        pattern = "%{}%".format(keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+        books = conn.query(BookModel).from_statement(text(
+            "SELECT * FROM book WHERE {cond} "
+            "ORDER BY ts_rank(to_tsvector('simple', {doc}), plainto_tsquery('simple', :kw)) DESC, "
+            "similarity({doc}, :kw) DESC, id "
+            "LIMIT :limit OFFSET :skip".format(cond=condition, doc=self.document)
+        )).params(kw=keyword, pattern=pattern, limit=limit, skip=skip).all()
+        total = conn.execute(text(
+            "SELECT count(*) FROM (SELECT 1 FROM book WHERE {} LIMIT :cap) t".format(condition)
+        ), {"kw": keyword, "pattern": pattern, "cap": COUNT_CAP}).scalar()
+        return books, total
+
+
+def capped_count(conn, query) -> int:
+    """
+    Count at most COUNT_CAP matching rows (approximate total for large result sets)
+    """
+    sub = query.order_by(None).with_entities(BookModel.id).limit(COUNT_CAP).subquery()
+    return conn.query(func.count()).select_from(sub).scalar()
+
+
+def create_fulltext_backend(engine):
+    """
+    Pick the backend from FULLTEXT_BACKEND (like / fts5 / postgres), or from
+    the database dialect when it is not set.
+    """
+    name = os.environ.get("FULLTEXT_BACKEND")
+    dialect = engine.dialect.name
+    if name is None:
+        if dialect == "postgresql":
+            name = "postgres"
+        elif dialect == "sqlite" and SqliteFts5Backend.available(engine):
+            name = "fts5"
+        else:
+            name = "like"
+
+    backends = {"like": LikeBackend, "fts5": SqliteFts5Backend, "postgres": PostgresBackend}
+    backend = backends.get(name, LikeBackend)()
+    try:
+        backend.setup(engine)
+    except Exception as e:
+        logging.error(f"Full-text backend {backend.name} setup failed, falling back to LIKE: {e}")
+        backend = LikeBackend()
+    logging.info(f"Using full-text search backend: {backend.name}")
+    return backend
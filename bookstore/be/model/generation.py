@@ -0,0 +1,50 @@
+import os
+import hashlib
+
+# 跨进程的缓存失效计数 (per-key generation)。
+# pre-fork 模式下每个 worker 都有自己的 token / blob / 优惠券钱包缓存，只在处理请求的那个
+# worker 里 invalidate 是不够的。CACHE_GENERATION_DIR 设置时，bump(kind, key)
+# 向该 key 的文件追加一个字节，文件大小即该 key 的 generation；缓存项记住写入时
+# 的 generation，命中时 generation 变了就按未命中处理 (一次 stat，不查数据库)。
+# 未设置时 (单进程) 进程内 invalidate 已经足够，generation 恒为 0。
+# bump_all() 追加到所有 key 共用的 "all" 文件，current() 是两个文件大小之和：
+# 数据库被整体替换 (压测快照恢复) 后，所有 worker 的所有缓存项一次失效。
+
+
+def _path(kind: str, key: str):
+    directory = os.environ.get("CACHE_GENERATION_DIR")
+    if not directory:
+        return None
+    return os.path.join(directory, "{}-{}".format(kind, hashlib.sha1(key.encode("utf-8")).hexdigest()))
+
+
+def _size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def current(kind: str, key: str) -> int:
+    path = _path(kind, key)
+    if path is None:
+        return 0
+    # Both files only grow, so any bump changes the sum
+    return _size(path) + _size(os.path.join(os.path.dirname(path), "all"))
+
+
+def bump(kind: str, key: str):
+    path = _path(kind, key)
+    if path is None:
+        return
+    # O_APPEND: concurrent bumps from several workers never overwrite each other
+    with open(path, "ab") as f:
+        f.write(b"\0")
+
+
+def bump_all():
+    directory = os.environ.get("CACHE_GENERATION_DIR")
+    if not directory:
+        return
+    with open(os.path.join(directory, "all"), "ab") as f:
+        f.write(b"\0")
@@ -0,0 +1,38 @@
+import os
+import logging
+
+# 跨进程只运行一份的后台任务 (账本合并等)。
+# pre-fork 模式下每个 worker 都执行 create_app()，都会启动后台线程；JOB_LOCK_DIR
+# 设置时，线程每次运行前对 <dir>/<name>.lock 非阻塞地加 flock，拿到锁的 worker
+# 一直持有到退出，其它 worker 跳过这一轮。持有者退出 (或被 gunicorn 重启) 时锁由
+# 内核释放，下一轮由另一个 worker 接手。未设置时 (单进程) 总是运行。
+
+
+class JobLock:
+    def __init__(self, name: str):
+        self.name = name
+        self.fd = None
+
+    def acquire(self) -> bool:
+        """True when this process runs the job (already holding the lock, or just took it)"""
+        directory = os.environ.get("JOB_LOCK_DIR")
+        if not directory:
+            return True
+        if self.fd is not None:
+            return True
+        import fcntl
+
+        fd = os.open(os.path.join(directory, "{}.lock".format(self.name)), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        logging.info(f"process {os.getpid()} runs the {self.name} job")
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,156 @@
+import os
+import logging
+import threading
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import SQLAlchemyError
+from be.model import db_conn
+from be.model import store
+from be.model.job_lock import JobLock
+from be.model.db_schema import User, BalanceLedger
+
+# Ledger rows folded into user.balance per compaction transaction
+COMPACT_BATCH_SIZE = 1000
+
+
+def ledger_sum(user_id):
+    """Scalar subquery: the not yet compacted ledger credits of user_id"""
+    return (
+        select(func.coalesce(func.sum(BalanceLedger.amount), 0))
+        .where(BalanceLedger.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+class Ledger(db_conn.DBConn):
+    """
+    Seller income is appended to balance_ledger instead of being added to the
+    seller's user row, so payments to the same store never wait on one row
+    lock. A user's exact balance is user.balance plus the sum of their ledger
+    rows; compact() periodically folds the rows into user.balance.
+    """
+
+    def __init__(self):
+        db_conn.DBConn.__init__(self)
+
+    def credit(self, user_id: str, amount: int, order_id: str = None):
+        # Part of the caller's transaction, committed with it
+        self.conn.execute(BalanceLedger.__table__.insert().values(user_id=user_id, amount=amount, order_id=order_id))
+
+    def balance(self, user_id: str):
+        """Exact balance (user.balance + ledger), None for an unknown user"""
+        return self.conn.execute(
+            select(User.balance + ledger_sum(user_id)).where(User.user_id == user_id)
+        ).scalar()
+
+    def compact(self, batch_size: int = COMPACT_BATCH_SIZE, max_batches: int = None) -> int:
+        """Fold ledger rows into user.balance, batch_size rows per transaction; returns the rows folded"""
+        folded = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            try:
+                n = self._compact_batch(batch_size)
+            except SQLAlchemyError as e:
+                # e.g. another worker compacted the same rows first
+                self.conn.rollback()
+                logging.error(f"ledger compaction failed: {e}")
+                break
+            batches += 1
+            if n is None:
+                continue
+            folded += n
+            if n < batch_size:
+                break
+        return folded
+
+    def _compact_batch(self, batch_size: int):
+        query = select(BalanceLedger.id, BalanceLedger.user_id, BalanceLedger.amount).order_by(
+            BalanceLedger.id
+        ).limit(batch_size)
+        if self.conn.get_bind().dialect.name == "postgresql":
+            # Concurrent compactors take disjoint rows
+            query = query.with_for_update(skip_locked=True)
+        rows = self.conn.execute(query).all()
+        if not rows:
+            self.conn.rollback()
+            return 0
+
+        totals = {}
+        for _, user_id, amount in rows:
+            totals[user_id] = totals.get(user_id, 0) + amount
+        ids = [row.id for row in rows]
+        deleted = self.conn.execute(
+            delete(BalanceLedger).where(BalanceLedger.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted != len(ids):
+            # Some rows were folded by someone else meanwhile: retry the batch
+            self.conn.rollback()
+            return None
+        # Same user_id order as payments, so compaction and payments cannot deadlock
+        for user_id in sorted(totals):
+            self.conn.execute(
+                update(User)
+                .where(User.user_id == user_id)
+                .values(balance=User.balance + totals[user_id])
+                .execution_options(synchronize_session=False)
+            )
+        self.conn.commit()
+        return len(rows)
+
+
+class LedgerCompactor:
+    """
+    Background thread that compacts the ledger every `interval` seconds.
+    Every pre-fork worker starts one, but only the holder of the "ledger"
+    JobLock compacts, so the workers never race on the same rows / locks.
+    """
+
+    def __init__(self, interval: float, batch_size: int = COMPACT_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = JobLock("ledger")
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def run_once(self) -> int:
+        try:
+            return Ledger().compact(self.batch_size)
+        finally:
+            store.database_instance.Session.remove()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                if self.lock.acquire():
+                    self.run_once()
+            except Exception as e:
+                logging.error(f"ledger compactor run failed: {e}")
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="ledger-compactor", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.lock.release()
+
+
+def start_from_env():
+    """
+    Start a compactor every LEDGER_COMPACT_INTERVAL seconds (default 10, 0
+    disables), LEDGER_COMPACT_BATCH_SIZE rows per transaction.
+    Returns the compactor, or None when disabled.
+    """
+    interval = float(os.environ.get("LEDGER_COMPACT_INTERVAL", 10))
+    if interval <= 0:
+        return None
+    compactor = LedgerCompactor(
+        interval, batch_size=int(os.environ.get("LEDGER_COMPACT_BATCH_SIZE", COMPACT_BATCH_SIZE))
+    )
+    compactor.start()
+    return compactor
@@ -0,0 +1,253 @@
+import os
+import json
+import atexit
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from flask import g, request, Response
+
+# Under the pre-fork server each worker writes its metrics to METRICS_DIR/<pid>.json
+# every FLUSH_INTERVAL seconds (background thread); a scrape served by any worker
+# adds up the files of all workers. Without METRICS_DIR the metrics cover this process only.
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "bookstore_http_requests_total": ("counter", "HTTP requests by method, route and status code"),
+    "bookstore_http_errors_total": ("counter", "HTTP responses with status >= 400 by route and status code"),
+    "bookstore_http_request_duration_seconds": ("histogram", "HTTP request latency by method and route"),
+    "bookstore_blob_store_duration_seconds": ("histogram", "Blob store (MongoDB) call latency by operation"),
+    "bookstore_orders_created_total": ("counter", "Orders created"),
+    "bookstore_payments_total": ("counter", "Orders paid"),
+    "bookstore_orders_canceled_total": ("counter", "Orders canceled, by buyer or by the timeout sweep"),
+    "bookstore_coupons_collected_total": ("counter", "Coupons collected"),
+    "bookstore_db_pool_size": ("gauge", "SQLAlchemy pool size per worker"),
+    "bookstore_db_pool_checked_out": ("gauge", "SQLAlchemy pool connections checked out per worker"),
+    "bookstore_db_pool_overflow": ("gauge", "SQLAlchemy pool overflow connections per worker"),
+}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> value, labels is a sorted tuple of (key, value)
+        self.counters = {}
+        # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+        self.engine = None
+        self.flusher = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+                    break
+            else:
+                h[len(LATENCY_BUCKETS)] += 1
+            h[-1] += seconds
+
+    def pool_gauges(self) -> list:
+        pool = self.engine.pool if self.engine is not None else None
+        if pool is None:
+            return []
+        labels = (("pid", str(os.getpid())),)
+        gauges = []
+        for name, attr in (
+            ("bookstore_db_pool_size", "size"),
+            ("bookstore_db_pool_checked_out", "checkedout"),
+            ("bookstore_db_pool_overflow", "overflow"),
+        ):
+            fn = getattr(pool, attr, None)
+            if fn is not None:
+                gauges.append([name, labels, fn()])
+        return gauges
+
+    def dump(self) -> dict:
+        with self.lock:
+            return {
+                "counters": [[n, l, v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, l, list(h)] for (n, l), h in self.histograms.items()],
+                "gauges": self.pool_gauges(),
+            }
+
+    def flush(self):
+        directory = os.environ.get("METRICS_DIR")
+        if not directory:
+            return
+        path = os.path.join(directory, "{}.json".format(os.getpid()))
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.dump(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error(f"metrics flush failed: {e}")
+
+    def start_flusher(self):
+        if not os.environ.get("METRICS_DIR") or (self.flusher is not None and self.flusher.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                self.flush()
+
+        self.flusher = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    def collect(self) -> dict:
+        """This process' metrics plus the last flushed metrics of every other worker"""
+        counters = {}
+        histograms = {}
+        gauges = []
+        dumps = [self.dump()]
+        directory = os.environ.get("METRICS_DIR")
+        if directory and os.path.isdir(directory):
+            own = "{}.json".format(os.getpid())
+            for name in os.listdir(directory):
+                if not name.endswith(".json") or name == own:
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                # Counters of exited workers still count, their pool gauges do not
+                if not _pid_alive(int(name[:-len(".json")])):
+                    data["gauges"] = []
+                dumps.append(data)
+        for data in dumps:
+            for n, l, v in data["counters"]:
+                key = (n, tuple(tuple(p) for p in l))
+                counters[key] = counters.get(key, 0) + v
+            for n, l, h in data["histograms"]:
+                key = (n, tuple(tuple(p) for p in l))
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], h)]
+                else:
+                    histograms[key] = list(h)
+            for n, l, v in data["gauges"]:
+                gauges.append((n, tuple(tuple(p) for p in l), v))
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        data = self.collect()
+        by_name = {}
+        for (n, l), v in data["counters"].items():
+            by_name.setdefault(n, []).append(_sample(n, l, v))
+        for n, l, v in data["gauges"]:
+            by_name.setdefault(n, []).append(_sample(n, l, v))
+        for (n, l), h in data["histograms"].items():
+            lines = by_name.setdefault(n, [])
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, h):
+                cumulative += count
+                lines.append(_sample(n + "_bucket", l + (("le", repr(bound)),), cumulative))
+            cumulative += h[len(LATENCY_BUCKETS)]
+            lines.append(_sample(n + "_bucket", l + (("le", "+Inf"),), cumulative))
+            lines.append(_sample(n + "_sum", l, h[-1]))
+            lines.append(_sample(n + "_count", l, cumulative))
+
+        out = []
+        for n in sorted(by_name):
+            kind, text = HELP.get(n, ("untyped", n))
+            out.append("# HELP {} {}".format(n, text))
+            out.append("# TYPE {} {}".format(n, kind))
+            out.extend(sorted(by_name[n]))
+        return "\n".join(out) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+def _sample(name: str, labels, value) -> str:
+    if labels:
+        text = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+        return "{}{{{}}} {}".format(name, text, value)
+    return "{} {}".format(name, value)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+metrics = Metrics()
+
+
+def inc(name: str, value: float = 1, **labels):
+    metrics.inc(name, value, **labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    metrics.observe(name, seconds, **labels)
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """Observe the duration of the enclosed block into histogram `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(name, time.perf_counter() - start, **labels)
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.get("metrics_start")
+    if start is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    if route == "/metrics":
+        return response
+    status = str(response.status_code)
+    metrics.inc("bookstore_http_requests_total", method=request.method, route=route, status=status)
+    if response.status_code >= 400:
+        metrics.inc("bookstore_http_errors_total", route=route, status=status)
+    metrics.observe("bookstore_http_request_duration_seconds", time.perf_counter() - start,
+                    method=request.method, route=route)
+    return response
+
+
+def reset_dir(directory: str):
+    """Create the shared metrics directory and drop files left by a previous run"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".json") or name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+
+
+def metrics_view():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, engine):
+    metrics.engine = engine
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    metrics.start_flusher()
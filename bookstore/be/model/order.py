@@ -1,8 +1,25 @@
 import time
+import json
+import base64
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, func, update
 from sqlalchemy.exc import SQLAlchemyError
 from be.model import db_conn
+from be.model import metrics
 from be.model.db_schema import Order as OrderModel, OrderDetail, StoreBook
 
+# Orders canceled per transaction by the timeout sweeper
+TIMEOUT_BATCH_SIZE = 500
+
+def encode_order_cursor(created_at: datetime, order_id: str) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else "", order_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_order_cursor(cursor: str) -> (datetime, str):
+    created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    return datetime.fromisoformat(created_at), order_id
+
 class Order(db_conn.DBConn):
     def __init__(self):
         db_conn.DBConn.__init__(self)
@@ -43,33 +60,85 @@ class Order(db_conn.DBConn):
 
     def list_orders(self, buyer_id: str, limit: int = 20, skip: int = 0):
         try:
-            orders_query = self.conn.query(OrderModel).filter_by(user_id=buyer_id).order_by(OrderModel.created_at.desc())
-            orders = orders_query.offset(skip).limit(limit).all()
-            
-            result = []
-            for o in orders:
-                items = []
-                for detail in o.details:
-                    items.append({
-                        "book_id": detail.book_id,
-                        "count": detail.count,
-                        "price": detail.price
-                        # Title/Author would require join with Book, let's skip for perf or add if needed
-                    })
-                
-                result.append({
-                    "order_id": o.order_id,
-                    "buyer_id": o.user_id,
-                    "store_id": o.store_id,
-                    "status": o.status,
-                    "total_price": o.total_price,
-                    "created_time": o.created_at.timestamp() if o.created_at else 0,
-                    "items": items
-                })
-            return result
+            orders = self._order_rows(buyer_id).offset(skip).limit(limit).all()
+            return self._build_order_list(orders)
         except SQLAlchemyError as e:
             return []
 
+    def list_orders_page(self, buyer_id: str, limit: int = 20, cursor: str = None, compact: bool = False):
+        """
+        Keyset pagination on (created_at, order_id): the cursor is the position
+        of the last order on the previous page, so deep pages cost the same as
+        the first one (no OFFSET scan). compact=True omits the items.
+        Returns (ok, msg, orders, next_cursor); next_cursor is "" on the last page.
+        """
+        try:
+            query = self._order_rows(buyer_id)
+            if cursor:
+                try:
+                    created_at, order_id = decode_order_cursor(cursor)
+                except (ValueError, TypeError):
+                    return False, "invalid cursor", [], ""
+                query = query.filter(
+                    or_(
+                        OrderModel.created_at < created_at,
+                        and_(OrderModel.created_at == created_at, OrderModel.order_id < order_id)
+                    )
+                )
+            # Fetch one extra row to know whether there is a next page
+            orders = query.limit(limit + 1).all()
+            next_cursor = ""
+            if len(orders) > limit:
+                orders = orders[:limit]
+                last = orders[-1]
+                next_cursor = encode_order_cursor(last.created_at, last.order_id)
+            return True, "ok", self._build_order_list(orders, with_items=not compact), next_cursor
+        except SQLAlchemyError as e:
+            return False, str(e), [], ""
+
+    def _order_rows(self, buyer_id: str):
+        return self.conn.query(
+            OrderModel.order_id,
+            OrderModel.user_id,
+            OrderModel.store_id,
+            OrderModel.status,
+            OrderModel.total_price,
+            OrderModel.created_at
+        ).filter(OrderModel.user_id == buyer_id).order_by(
+            OrderModel.created_at.desc(), OrderModel.order_id.desc()
+        )
+
+    def _build_order_list(self, orders, with_items: bool = True):
+        # Details for the whole page are loaded with one IN query instead of
+        # one lazy load per order
+        items_by_order = {}
+        if with_items and orders:
+            details = self.conn.query(
+                OrderDetail.order_id, OrderDetail.book_id, OrderDetail.count, OrderDetail.price
+            ).filter(OrderDetail.order_id.in_([o.order_id for o in orders])).all()
+            for detail in details:
+                items_by_order.setdefault(detail.order_id, []).append({
+                    "book_id": detail.book_id,
+                    "count": detail.count,
+                    "price": detail.price
+                    # Title/Author would require join with Book, let's skip for perf or add if needed
+                })
+
+        result = []
+        for o in orders:
+            order = {
+                "order_id": o.order_id,
+                "buyer_id": o.user_id,
+                "store_id": o.store_id,
+                "status": o.status,
+                "total_price": o.total_price,
+                "created_time": o.created_at.timestamp() if o.created_at else 0
+            }
+            if with_items:
+                order["items"] = items_by_order.get(o.order_id, [])
+            result.append(order)
+        return result
+
     def cancel_order(self, buyer_id: str, order_id: str):
         try:
             order = self.conn.query(OrderModel).filter_by(order_id=order_id).first()
@@ -89,35 +158,102 @@ class Order(db_conn.DBConn):
 
             order.status = "canceled"
             self.conn.commit()
+            metrics.inc("bookstore_orders_canceled_total", reason="buyer")
             return True, "ok"
         except SQLAlchemyError as e:
             self.conn.rollback()
             return False, str(e)
 
-    def cancel_timeout_orders(self, timeout_seconds: int = 1800):
-        # Implementation for timeout cancellation
-        from datetime import datetime, timedelta
-        
-        try:
-            cutoff_time = datetime.now() - timedelta(seconds=timeout_seconds)
-            # Find unpaid orders created before cutoff_time
-            orders_to_cancel = self.conn.query(OrderModel).filter(
-                OrderModel.status == "unpaid",
-                OrderModel.created_at < cutoff_time
-            ).all()
-            
-            # Extract IDs to avoid session conflict during iteration and commit
-            cancel_list = [(o.user_id, o.order_id) for o in orders_to_cancel]
-
-            count = 0
-            for uid, oid in cancel_list:
-                # Use self.cancel_order logic to ensure stock is restored
-                # Note: cancel_order commits transaction, so we do it one by one
-                ok, msg = self.cancel_order(uid, oid)
-                if ok:
-                    count += 1
-            
-            return count
-        except Exception as e:
-            return 0
+    def cancel_timeout_orders(self, timeout_seconds: int = 1800, batch_size: int = TIMEOUT_BATCH_SIZE,
+                              cursor: str = None, max_batches: int = None, progress=None) -> int:
+        """
+        Cancel unpaid orders older than timeout_seconds, batch_size orders per
+        transaction, and return how many were canceled.
+        Orders are swept in (created_at, order_id) order; progress(canceled, cursor)
+        is called after every committed batch, and passing that cursor back in
+        resumes an interrupted sweep where it stopped.
+        """
+        cutoff_time = datetime.now() - timedelta(seconds=timeout_seconds)
+        if cursor:
+            try:
+                cursor = decode_order_cursor(cursor)
+            except (ValueError, TypeError):
+                logging.error(f"invalid timeout sweep cursor: {cursor}")
+                return 0
+
+        count = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            try:
+                canceled, next_cursor = self._cancel_timeout_batch(cutoff_time, batch_size, cursor)
+            except SQLAlchemyError as e:
+                self.conn.rollback()
+                logging.error(f"timeout sweep failed: {e}")
+                break
+            if next_cursor is None:
+                break
+            batches += 1
+            if canceled is None:
+                # Some orders changed status between the select and the update
+                # (paid / canceled concurrently): the batch was rolled back, retry it
+                continue
+            count += canceled
+            metrics.inc("bookstore_orders_canceled_total", canceled, reason="timeout")
+            cursor = next_cursor
+            encoded = encode_order_cursor(*cursor)
+            logging.info(f"timeout sweep: canceled {count} orders, cursor {encoded}")
+            if progress is not None:
+                progress(count, encoded)
+        return count
+
+    def _cancel_timeout_batch(self, cutoff_time: datetime, batch_size: int, cursor):
+        """
+        Cancel one batch of timed-out orders after cursor in a single transaction:
+        one conditional UPDATE flips the statuses and one UPDATE ... FROM an
+        aggregated (store_id, book_id, SUM(count)) subquery restores the stock.
+        Returns (canceled, next_cursor); next_cursor is None when nothing is left,
+        canceled is None when the batch was rolled back because of a concurrent change.
+        """
+        query = self.conn.query(OrderModel.order_id, OrderModel.created_at).filter(
+            OrderModel.status == "unpaid",
+            OrderModel.created_at < cutoff_time
+        )
+        if cursor is not None:
+            last_created_at, last_order_id = cursor
+            query = query.filter(or_(
+                OrderModel.created_at > last_created_at,
+                and_(OrderModel.created_at == last_created_at, OrderModel.order_id > last_order_id)
+            ))
+        # Concurrent sweepers (one per worker) skip each other's batches
+        rows = query.order_by(OrderModel.created_at, OrderModel.order_id) \
+            .limit(batch_size).with_for_update(skip_locked=True).all()
+        if not rows:
+            self.conn.rollback()
+            return 0, None
+
+        order_ids = [r.order_id for r in rows]
+        flipped = self.conn.execute(
+            update(OrderModel)
+            .where(OrderModel.order_id.in_(order_ids), OrderModel.status == "unpaid")
+            .values(status="canceled")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if flipped != len(order_ids):
+            self.conn.rollback()
+            return None, (rows[-1].created_at, rows[-1].order_id)
 
+        restock = self.conn.query(
+            OrderModel.store_id.label("store_id"),
+            OrderDetail.book_id.label("book_id"),
+            func.sum(OrderDetail.count).label("count")
+        ).join(OrderDetail, OrderDetail.order_id == OrderModel.order_id) \
+            .filter(OrderModel.order_id.in_(order_ids)) \
+            .group_by(OrderModel.store_id, OrderDetail.book_id).subquery()
+        self.conn.execute(
+            update(StoreBook)
+            .where(StoreBook.store_id == restock.c.store_id, StoreBook.book_id == restock.c.book_id)
+            .values(stock_level=StoreBook.stock_level + restock.c.count)
+            .execution_options(synchronize_session=False)
+        )
+        self.conn.commit()
+        return flipped, (rows[-1].created_at, rows[-1].order_id)
@@ -0,0 +1,71 @@
+import os
+import logging
+import threading
+from be.model import store
+from be.model.order import Order, TIMEOUT_BATCH_SIZE
+
+
+class TimeoutCancelScheduler:
+    """
+    Background thread that runs the timeout sweep every `interval` seconds.
+    Every worker may run one: the sweep batches lock their orders with
+    SKIP LOCKED and only flip orders that are still unpaid, so concurrent
+    sweepers never cancel or restock the same order twice.
+    """
+
+    def __init__(self, interval: float, timeout_seconds: int = 1800, batch_size: int = TIMEOUT_BATCH_SIZE):
+        self.interval = interval
+        self.timeout_seconds = timeout_seconds
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.total_canceled = 0
+
+    def run_once(self) -> int:
+        try:
+            n = Order().cancel_timeout_orders(timeout_seconds=self.timeout_seconds, batch_size=self.batch_size)
+        finally:
+            # The sweep ran on this thread's scoped session; do not keep it open between runs
+            store.database_instance.Session.remove()
+        self.total_canceled += n
+        if n:
+            logging.info(f"timeout scheduler canceled {n} orders")
+        return n
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"timeout scheduler run failed: {e}")
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="timeout-sweeper", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+
+def start_from_env():
+    """
+    Start a scheduler when ORDER_TIMEOUT_SWEEP_INTERVAL (seconds) is set,
+    configured by ORDER_TIMEOUT_SECONDS / ORDER_TIMEOUT_BATCH_SIZE.
+    Returns the scheduler, or None when disabled.
+    """
+    interval = float(os.environ.get("ORDER_TIMEOUT_SWEEP_INTERVAL", 0))
+    if interval <= 0:
+        return None
+    scheduler = TimeoutCancelScheduler(
+        interval,
+        timeout_seconds=int(os.environ.get("ORDER_TIMEOUT_SECONDS", 1800)),
+        batch_size=int(os.environ.get("ORDER_TIMEOUT_BATCH_SIZE", TIMEOUT_BATCH_SIZE)),
+    )
+    scheduler.start()
+    return scheduler
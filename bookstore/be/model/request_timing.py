@@ -0,0 +1,172 @@
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+# Fraction of requests that are timed (1.0 = all, 0 = off)
+SAMPLE_RATE = float(os.environ.get("REQUEST_TIMING_SAMPLE_RATE", 1.0))
+# A request issuing more SQL statements than this is flagged as a likely N+1
+QUERY_THRESHOLD = int(os.environ.get("REQUEST_TIMING_QUERY_THRESHOLD", 20))
+
+
+class RequestTiming:
+    """
+    Per-request breakdown: time in auth (check_token), SQL (statement count and
+    time, from engine events) and the Mongo blob store, plus how often each
+    SQL statement was issued so that N+1 patterns can be named.
+    """
+    __slots__ = ("start", "sections", "sql_count", "statements")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sections = {"auth": 0.0, "db": 0.0, "mongo": 0.0}
+        self.sql_count = 0
+        self.statements = {}
+
+    def add(self, section: str, seconds: float):
+        self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+
+class EndpointStats:
+    """Per-endpoint aggregates of the sampled requests (per process)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint: str, total: float, timing: RequestTiming, n_plus_one: bool):
+        with self.lock:
+            e = self.endpoints.get(endpoint)
+            if e is None:
+                e = self.endpoints[endpoint] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "auth_ms": 0.0,
+                    "db_ms": 0.0, "mongo_ms": 0.0, "sql_count": 0, "max_sql_count": 0, "n_plus_one": 0,
+                }
+            ms = total * 1000
+            e["count"] += 1
+            e["total_ms"] += ms
+            e["max_ms"] = max(e["max_ms"], ms)
+            e["auth_ms"] += timing.sections["auth"] * 1000
+            e["db_ms"] += timing.sections["db"] * 1000
+            e["mongo_ms"] += timing.sections["mongo"] * 1000
+            e["sql_count"] += timing.sql_count
+            e["max_sql_count"] = max(e["max_sql_count"], timing.sql_count)
+            if n_plus_one:
+                e["n_plus_one"] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            result = {}
+            for endpoint, e in self.endpoints.items():
+                n = e["count"]
+                result[endpoint] = {
+                    "count": n,
+                    "avg_ms": e["total_ms"] / n,
+                    "max_ms": e["max_ms"],
+                    "avg_auth_ms": e["auth_ms"] / n,
+                    "avg_db_ms": e["db_ms"] / n,
+                    "avg_mongo_ms": e["mongo_ms"] / n,
+                    "avg_sql_count": e["sql_count"] / n,
+                    "max_sql_count": e["max_sql_count"],
+                    "n_plus_one": e["n_plus_one"],
+                }
+            return result
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def current() -> RequestTiming:
+    """Timing of the current request, or None when outside a sampled request"""
+    if not has_request_context():
+        return None
+    return g.get("request_timing")
+
+
+@contextmanager
+def timed(section: str):
+    """Attribute the enclosed block to a section (auth / mongo) of the current request"""
+    timing = current()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(section, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current() is not None:
+        conn.info.setdefault("request_timing_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current()
+    if timing is None:
+        return
+    starts = conn.info.get("request_timing_start")
+    if not starts:
+        return
+    timing.add("db", time.perf_counter() - starts.pop())
+    timing.sql_count += 1
+    timing.statements[statement] = timing.statements.get(statement, 0) + 1
+
+
+def _handle_error(context):
+    # after_cursor_execute does not fire for a failed statement
+    conn = context.connection
+    if conn is not None and conn.info.get("request_timing_start"):
+        conn.info["request_timing_start"].pop()
+
+
+def _before_request():
+    if SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE:
+        g.request_timing = RequestTiming()
+
+
+def _after_request(response):
+    timing = current()
+    if timing is None:
+        return response
+    total = time.perf_counter() - timing.start
+    endpoint = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    n_plus_one = timing.sql_count > QUERY_THRESHOLD
+    if n_plus_one:
+        statement, repeats = max(timing.statements.items(), key=lambda kv: kv[1])
+        logging.warning(
+            f"Possible N+1 on {request.method} {endpoint}: {timing.sql_count} SQL statements, "
+            f"{repeats}x {' '.join(statement.split())[:200]}"
+        )
+    endpoint_stats.record(endpoint, total, timing, n_plus_one)
+    response.headers["Server-Timing"] = (
+        'total;dur={:.2f}, auth;dur={:.2f}, db;dur={:.2f};desc="{} queries", mongo;dur={:.2f}'.format(
+            total * 1000,
+            timing.sections["auth"] * 1000,
+            timing.sections["db"] * 1000,
+            timing.sql_count,
+            timing.sections["mongo"] * 1000,
+        )
+    )
+    return response
+
+
+def init_app(app, engine):
+    """Install the timing hooks on a Flask app and the SQL event listeners on its engine"""
+    if SAMPLE_RATE <= 0:
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -6,6 +6,37 @@ from be.model import db_conn
 from be.model.db_schema import Store as StoreModel, StoreBook, Book, Order, OrderDetail
 from be.model.blob_store import get_blob_store
 
+# Upper bound on the number of books accepted by one add_books call
+MAX_BOOKS_PER_BATCH = 1000
+
+
+def book_catalog_row(book_id: str, book_info: dict) -> dict:
+    """
+    Column values of the global catalog (book table) row for a seller-supplied book_info
+    """
+    price = book_info.get("price", 0)
+    if isinstance(price, str):
+        try:
+            price = int(price)
+        except:
+            price = 0
+    return {
+        "id": book_id,
+        "title": book_info.get("title", "Untitled"),
+        "author": book_info.get("author"),
+        "publisher": book_info.get("publisher"),
+        "original_title": book_info.get("original_title"),
+        "translator": book_info.get("translator"),
+        "pub_year": book_info.get("pub_year"),
+        "pages": book_info.get("pages"),
+        "price": price,
+        "currency_unit": book_info.get("currency_unit"),
+        "binding": book_info.get("binding"),
+        "isbn": book_info.get("isbn"),
+        "tags": json.dumps(book_info.get("tags", [])) if isinstance(book_info.get("tags"), list) else book_info.get("tags", "")
+    }
+
+
 class Seller(db_conn.DBConn):
     def __init__(self):
         db_conn.DBConn.__init__(self)
@@ -31,29 +62,8 @@ class Seller(db_conn.DBConn):
             # 1. Ensure Book exists in global catalog (SQL)
             book = self.conn.query(Book).filter_by(id=book_id).first()
             if not book:
-                price = book_info.get("price", 0)
-                if isinstance(price, str):
-                    try:
-                        price = int(price)
-                    except:
-                        price = 0
-                        
                 # Core data -> SQL
-                new_book = Book(
-                    id=book_id,
-                    title=book_info.get("title", "Untitled"),
-                    author=book_info.get("author"),
-                    publisher=book_info.get("publisher"),
-                    original_title=book_info.get("original_title"),
-                    translator=book_info.get("translator"),
-                    pub_year=book_info.get("pub_year"),
-                    pages=book_info.get("pages"),
-                    price=price,
-                    currency_unit=book_info.get("currency_unit"),
-                    binding=book_info.get("binding"),
-                    isbn=book_info.get("isbn"),
-                    tags=json.dumps(book_info.get("tags", [])) if isinstance(book_info.get("tags"), list) else book_info.get("tags", "")
-                )
+                new_book = Book(**book_catalog_row(book_id, book_info))
                 self.conn.add(new_book)
                 self.conn.flush()
                 
@@ -85,6 +95,106 @@ class Seller(db_conn.DBConn):
             return 530, "{}".format(str(e))
         return 200, "ok"
 
+    def add_books(self, user_id: str, store_id: str, books: list):
+        """
+        Batch version of add_book. books: [{"book_info": {...}, "stock_level": n}, ...]
+        Ownership is validated once; catalog rows, store inventory rows and blobs
+        are written with one bulk statement each and committed together.
+        Returns (code, msg, results) with a per-item {"id", "code", "message"}.
+        """
+        try:
+            if not self.user_id_exist(user_id):
+                return error.error_non_exist_user_id(user_id) + ([],)
+            store = self.conn.query(StoreModel).filter_by(store_id=store_id).first()
+            if store is None:
+                return error.error_non_exist_store_id(store_id) + ([],)
+            if store.user_id != user_id:
+                return error.error_authorization_fail() + ([],)
+            if len(books) > MAX_BOOKS_PER_BATCH:
+                return 530, "too many books in one batch (max {})".format(MAX_BOOKS_PER_BATCH), []
+
+            results = []
+            accepted = {}
+            for item in books:
+                book_info = item.get("book_info") if isinstance(item, dict) else None
+                if not isinstance(book_info, dict) or "id" not in book_info:
+                    results.append({"id": None, "code": 530, "message": "invalid book_info"})
+                    continue
+                book_id = book_info["id"]
+                if book_id in accepted:
+                    results.append({"id": book_id, "code": 516, "message": error.error_exist_book_id(book_id)[1]})
+                    continue
+                try:
+                    stock_level = int(item.get("stock_level", 0))
+                except (TypeError, ValueError):
+                    results.append({"id": book_id, "code": 530, "message": "invalid stock level"})
+                    continue
+                accepted[book_id] = (book_info, stock_level)
+                results.append({"id": book_id, "code": 200, "message": "ok"})
+
+            if accepted:
+                ids = list(accepted.keys())
+                in_store = {r.book_id for r in self.conn.query(StoreBook.book_id).filter(
+                    StoreBook.store_id == store_id, StoreBook.book_id.in_(ids))}
+                for r in results:
+                    if r["code"] == 200 and r["id"] in in_store:
+                        r["code"], r["message"] = error.error_exist_book_id(r["id"])
+                        del accepted[r["id"]]
+
+            if accepted:
+                ids = list(accepted.keys())
+                in_catalog = {r.id for r in self.conn.query(Book.id).filter(Book.id.in_(ids))}
+                new_books = [bid for bid in ids if bid not in in_catalog]
+                if new_books:
+                    # ON CONFLICT DO NOTHING: another seller may add the same book concurrently;
+                    # only the rows inserted here get their blob written below
+                    new_books = [row.id for row in self.conn.execute(
+                        self.insert_stmt(Book.__table__)
+                        .on_conflict_do_nothing(index_elements=["id"])
+                        .returning(Book.id),
+                        [book_catalog_row(bid, accepted[bid][0]) for bid in new_books]
+                    )]
+                # A concurrent add_book / add_books of the same book into this store
+                # may win after the in_store probe: report those items as 516
+                inserted = {row.book_id for row in self.conn.execute(
+                    self.insert_stmt(StoreBook.__table__)
+                    .on_conflict_do_nothing(index_elements=["store_id", "book_id"])
+                    .returning(StoreBook.book_id),
+                    [
+                        {
+                            "store_id": store_id,
+                            "book_id": bid,
+                            "stock_level": stock_level,
+                            "price": book_info.get("price", 0)
+                        }
+                        for bid, (book_info, stock_level) in accepted.items()
+                    ]
+                )}
+                for r in results:
+                    if r["code"] == 200 and r["id"] not in inserted:
+                        r["code"], r["message"] = error.error_exist_book_id(r["id"])
+                self.conn.commit()
+
+                # Blob data -> NoSQL (MongoDB), one bulk_write for the whole batch
+                if new_books:
+                    get_blob_store().put_book_blobs([
+                        {
+                            "book_id": bid,
+                            "content": accepted[bid][0].get("content", ""),
+                            "book_intro": accepted[bid][0].get("book_intro", ""),
+                            "author_intro": accepted[bid][0].get("author_intro", "")
+                        }
+                        for bid in new_books
+                    ])
+            return 200, "ok", results
+
+        except SQLAlchemyError as e:
+            self.conn.rollback()
+            return 528, "{}".format(str(e)), []
+        except Exception as e:
+            self.conn.rollback()
+            return 530, "{}".format(str(e)), []
+
     def add_stock_level(
         self, user_id: str, store_id: str, book_id: str, add_stock_level: int
     ):
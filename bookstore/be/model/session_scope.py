@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+# A session holding a transaction (and so a pooled connection) longer than
+# this many seconds is reported as a leak; 0 disables the detector
+LEAK_SECONDS = float(os.environ.get("SESSION_LEAK_SECONDS", 30))
+
+
+class SessionLeakDetector:
+    """
+    Tracks every session transaction from begin to end (session events on the
+    session factory) and, from a background thread, logs the ones that have
+    stayed open longer than `threshold` seconds with the thread and request
+    that opened them. Each open transaction is reported once.
+    """
+
+    def __init__(self, session_factory, threshold: float = LEAK_SECONDS):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        # id(session) -> {"began": ..., "thread": ..., "where": ..., "reported": ...}
+        self.open = {}
+        self.thread = None
+        self.stop_event = threading.Event()
+        event.listen(session_factory, "after_begin", self._after_begin)
+        event.listen(session_factory, "after_transaction_end", self._after_transaction_end)
+
+    def _after_begin(self, session, transaction, connection):
+        key = id(session)
+        with self.lock:
+            if key in self.open:
+                return
+            where = "{} {}".format(request.method, request.path) if has_request_context() else None
+            self.open[key] = {
+                "began": time.monotonic(),
+                "thread": threading.current_thread().name,
+                "where": where,
+                "reported": False,
+            }
+
+    def _after_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            with self.lock:
+                self.open.pop(id(session), None)
+
+    def leaks(self) -> list:
+        """Open transactions older than the threshold: [(age_seconds, thread, where)]"""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                (now - s["began"], s["thread"], s["where"])
+                for s in self.open.values()
+                if now - s["began"] > self.threshold
+            ]
+
+    def check(self) -> int:
+        now = time.monotonic()
+        reported = 0
+        with self.lock:
+            for s in self.open.values():
+                age = now - s["began"]
+                if age > self.threshold and not s["reported"]:
+                    s["reported"] = True
+                    reported += 1
+                    logging.warning(
+                        f"Session leak: transaction open for {age:.1f}s on thread {s['thread']}"
+                        + (f" ({s['where']})" if s["where"] else "")
+                    )
+        return reported
+
+    def _loop(self):
+        while not self.stop_event.wait(max(1.0, self.threshold / 2)):
+            self.check()
+
+    def start(self):
+        if self.threshold <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._loop, name="session-leak-detector", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def init_app(app, database):
+    """
+    Request-scoped unit of work on database.Session (the scoped_session every
+    DBConn model uses): at teardown the request's session is committed when
+    the response succeeded, rolled back on an exception or an error status,
+    and always removed, so its identity map is dropped and its connection goes
+    back to the pool whatever path the view took.
+    """
+    Session = database.Session
+
+    def _after_request(response):
+        g.session_failed = response.status_code >= 400
+        return response
+
+    def _teardown(exc):
+        try:
+            if Session.registry.has():
+                session = Session.registry()
+                if exc is not None or g.get("session_failed", True):
+                    session.rollback()
+                elif session.in_transaction():
+                    session.commit()
+        except Exception as e:
+            logging.error(f"request session teardown failed: {e}")
+        finally:
+            Session.remove()
+
+    app.after_request(_after_request)
+    app.teardown_request(_teardown)
+
+    if database.leak_detector is None:
+        database.leak_detector = SessionLeakDetector(database.session_factory)
+        database.leak_detector.start()
+    return database.leak_detector
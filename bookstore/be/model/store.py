@@ -1,11 +1,78 @@
 import logging
 import os
 import threading
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from be.model.db_schema import init_db_schema
+from be.model.fulltext import create_fulltext_backend, install_sqlite_functions
 from be.model.blob_store import get_blob_store # Ensure Blob Store is initialized
 
+
+def _env(name: str, default, cast=str):
+    value = os.environ.get(name)
+    return default if value in (None, "") else cast(value)
+
+
+def engine_options(db_url: str) -> dict:
+    """
+    create_engine keyword arguments from the environment:
+      PostgreSQL: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (s),
+                  DB_POOL_RECYCLE (s), DB_POOL_PRE_PING (0/1)
+      SQLite:     SQLITE_BUSY_TIMEOUT (ms) as the driver's lock wait; the
+                  DB_POOL_* settings only when set explicitly
+    """
+    if db_url.startswith("sqlite"):
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": _env("SQLITE_BUSY_TIMEOUT", 5000, int) / 1000.0,
+            }
+        }
+        for name, key, cast in (
+            ("DB_POOL_SIZE", "pool_size", int),
+            ("DB_MAX_OVERFLOW", "max_overflow", int),
+            ("DB_POOL_TIMEOUT", "pool_timeout", float),
+        ):
+            if os.environ.get(name):
+                options[key] = cast(os.environ[name])
+        return options
+    return {
+        "pool_size": _env("DB_POOL_SIZE", 10, int),
+        "max_overflow": _env("DB_MAX_OVERFLOW", 20, int),
+        "pool_timeout": _env("DB_POOL_TIMEOUT", 30, float),
+        "pool_recycle": _env("DB_POOL_RECYCLE", 1800, int),
+        "pool_pre_ping": _env("DB_POOL_PRE_PING", 1, int) != 0,
+    }
+
+
+def sqlite_pragmas() -> dict:
+    """
+    PRAGMAs applied to every new SQLite connection. WAL lets readers run
+    alongside the single writer, synchronous=NORMAL is durable in WAL mode
+    except for the last transactions on power loss, and busy_timeout makes
+    concurrent writers wait instead of failing with "database is locked".
+    """
+    return {
+        "journal_mode": _env("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": _env("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": _env("SQLITE_BUSY_TIMEOUT", 5000, int),
+        "mmap_size": _env("SQLITE_MMAP_SIZE", 256 * 1024 * 1024, int),
+        # negative: KiB rather than pages
+        "cache_size": _env("SQLITE_CACHE_SIZE", -64 * 1024, int),
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute("PRAGMA {}={}".format(name, value))
+        finally:
+            cursor.close()
+
+
 class Store:
     def __init__(self, db_path):
         # Priority: 
@@ -25,24 +92,46 @@ class Store:
         else:
             logging.info(f"Using PostgreSQL database at {self.db_url}")
 
-        # Create engine
-        connect_args = {}
-        if self.db_url.startswith("sqlite"):
-            connect_args = {"check_same_thread": False}
-            
-        self.engine = create_engine(self.db_url, connect_args=connect_args, echo=False)
+        # Create engine (pool sizing / SQLite pragmas from the environment)
+        self.engine = create_engine(self.db_url, echo=False, **engine_options(self.db_url))
+        if self.engine.dialect.name == "sqlite":
+            install_sqlite_pragmas(self.engine, sqlite_pragmas())
+            # book_short_grams() used by the full-text index triggers
+            install_sqlite_functions(self.engine)
+        self.settings = self.effective_settings()
+        logging.info(f"Database engine settings: {self.settings}")
         
         # Create tables (Safe to call, will skip if exist)
         self.init_tables()
+
+        # Full-text search index for book search (FTS5 / tsvector, LIKE as fallback)
+        self.fulltext = create_fulltext_backend(self.engine)
         
         # Session factory
         self.session_factory = sessionmaker(bind=self.engine)
         self.Session = scoped_session(self.session_factory)
+        # Set by session_scope.init_app when serving requests
+        self.leak_detector = None
         
         # Initialize Blob Store (NoSQL) connection
         # This is lightweight, just establishing the client
         get_blob_store() 
 
+    def effective_settings(self) -> dict:
+        """Pool and PRAGMA values as the database reports them, for the startup log"""
+        pool = self.engine.pool
+        settings = {"dialect": self.engine.dialect.name, "pool": type(pool).__name__}
+        if hasattr(pool, "size"):
+            settings["pool_size"] = pool.size()
+        for attr in ("_max_overflow", "_timeout", "_recycle", "_pre_ping"):
+            if hasattr(pool, attr):
+                settings[attr.lstrip("_")] = getattr(pool, attr)
+        if self.engine.dialect.name == "sqlite":
+            with self.engine.connect() as c:
+                for name in sqlite_pragmas():
+                    settings[name] = c.exec_driver_sql("PRAGMA {}".format(name)).scalar()
+        return settings
+
     def init_tables(self):
         try:
             init_db_schema(self.engine)
@@ -58,8 +147,29 @@ init_completed_event = threading.Event()
 def init_database(db_path):
     global database_instance
     database_instance = Store(db_path)
+    # Cached coupon facts belong to the previous database (coupon ids restart)
+    from be.model import coupon
+    coupon.reset_caches()
+
+def reset_caches():
+    """
+    Forget what this process cached from the database and the blob store after
+    they were replaced underneath it (bench snapshot restore), and through the
+    "all" generation what the other pre-fork workers cached.
+    """
+    from be.model import coupon, generation, blob_store
+    from be.model.token_cache import get_token_cache
+    generation.bump_all()
+    get_token_cache().clear()
+    if blob_store.blob_store_instance is not None:
+        blob_store.blob_store_instance.cache.clear()
+    coupon.reset_caches()
 
 def get_db_conn():
     # Kept for compatibility name, but returns a Session
     global database_instance
     return database_instance.get_db_session()
+
+def get_fulltext_backend():
+    global database_instance
+    return database_instance.fulltext
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from be.model import generation
+
+
+class TokenCache:
+    """
+    进程内的 token 校验缓存 (LRU + TTL)。
+    key 为 (user_id, token)，value 为 token 的过期时间、缓存项自身的过期时间和
+    写入时该用户的 generation。命中时 check_token 不再查询 user 表，也不再做
+    jwt_decode；pre-fork 模式下其他 worker 的登出 / 改密 / 注销会改变 generation
+    (见 be.model.generation)，使这里的缓存项失效。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Time spent on full verification (DB + JWT) for cache misses
+        self.verify_count = 0
+        self.verify_time = 0.0
+
+    def get(self, user_id: str, token: str) -> bool:
+        """
+        返回 True 表示缓存中有一个仍然有效的校验结果
+        """
+        if self.max_size <= 0:
+            return False
+        key = (user_id, token)
+        now = time.time()
+        gen = generation.current("token", user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False
+            token_expiry, entry_expiry, entry_gen = entry
+            if now >= token_expiry or now >= entry_expiry or gen != entry_gen:
+                del self.entries[key]
+                self.misses += 1
+                return False
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def generation(self, user_id: str) -> int:
+        """
+        在校验 token 之前读取，再传给 put：校验期间发生的失效不会被缓存掩盖
+        """
+        return generation.current("token", user_id)
+
+    def put(self, user_id: str, token: str, token_expiry: float, gen: int = None):
+        if self.max_size <= 0:
+            return
+        if gen is None:
+            gen = self.generation(user_id)
+        key = (user_id, token)
+        with self.lock:
+            self.entries[key] = (token_expiry, time.time() + self.ttl, gen)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str, token: str = None):
+        """
+        token 为 None 时清除该用户的所有缓存项 (如修改密码、注销)。
+        同时增加该用户的 generation，其他 worker 中该用户的缓存项也一并失效。
+        """
+        generation.bump("token", user_id)
+        with self.lock:
+            if token is not None:
+                if self.entries.pop((user_id, token), None) is not None:
+                    self.invalidations += 1
+                return
+            keys = [k for k in self.entries if k[0] == user_id]
+            for k in keys:
+                del self.entries[k]
+            self.invalidations += len(keys)
+
+    def record_verify(self, elapsed: float):
+        with self.lock:
+            self.verify_count += 1
+            self.verify_time += elapsed
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "verify_count": self.verify_count,
+                "verify_avg_ms": self.verify_time * 1000 / self.verify_count if self.verify_count else 0.0,
+            }
+
+
+token_cache_instance = TokenCache(
+    max_size=int(os.environ.get("TOKEN_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", 60)),
+)
+
+
+def get_token_cache():
+    return token_cache_instance
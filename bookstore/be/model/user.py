@@ -5,6 +5,8 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from be.model import error
 from be.model import db_conn
 from be.model.db_schema import User as UserModel, Address, Wishlist, StoreFollow
+from be.model.token_cache import get_token_cache
+from be.model import request_timing
 
 def jwt_encode(user_id: str, terminal: str) -> str:
     encoded = jwt.encode(
@@ -24,11 +26,12 @@ class User(db_conn.DBConn):
     def __init__(self):
         db_conn.DBConn.__init__(self)
 
-    def __check_token(self, user_id, db_token, token) -> bool:
+    def __check_token(self, user_id, db_token, token) -> float:
         """
         Be tolerant to multiple active tokens (tests often re-login and invalidate the old one).
         We only verify the JWT signature and user_id, and ignore db_token equality to avoid 401s
         across concurrent test logins.
+        Returns the expiry timestamp of a valid token (used by the token cache), or None.
         """
         try:
             jwt_text = jwt_decode(encoded_token=token, user_id=user_id)
@@ -36,14 +39,14 @@ class User(db_conn.DBConn):
             if ts is not None:
                 now = time.time()
                 if self.token_lifetime > now - ts >= 0:
-                    return True
+                    return ts + self.token_lifetime
         except jwt.exceptions.InvalidSignatureError as e:
             logging.error(str(e))
-            return False
+            return None
         except Exception as e:
             logging.error(str(e))
-            return False
-            return False
+            return None
+        return None
 
     def register(self, user_id: str, password: str):
         try:
@@ -74,13 +77,28 @@ class User(db_conn.DBConn):
         return 200, "ok"
 
     def check_token(self, user_id: str, token: str) -> (int, str):
-        user = self.conn.query(UserModel).filter_by(user_id=user_id).first()
-        if user is None:
-            return error.error_authorization_fail()
-        
-        if not self.__check_token(user_id, user.token, token):
-            return error.error_authorization_fail()
-        return 200, "ok"
+        with request_timing.timed("auth"):
+            return self._check_token(user_id, token)
+
+    def _check_token(self, user_id: str, token: str) -> (int, str):
+        cache = get_token_cache()
+        if cache.get(user_id, token):
+            return 200, "ok"
+
+        start = time.time()
+        gen = cache.generation(user_id)
+        try:
+            user = self.conn.query(UserModel).filter_by(user_id=user_id).first()
+            if user is None:
+                return error.error_authorization_fail()
+
+            expiry = self.__check_token(user_id, user.token, token)
+            if not expiry:
+                return error.error_authorization_fail()
+            cache.put(user_id, token, expiry, gen)
+            return 200, "ok"
+        finally:
+            cache.record_verify(time.time() - start)
 
     def check_password(self, user_id: str, password: str) -> (int, str):
         user = self.conn.query(UserModel).filter_by(user_id=user_id).first()
@@ -129,6 +147,7 @@ class User(db_conn.DBConn):
             user.token = dummy_token
             user.terminal = terminal
             self.conn.commit()
+            get_token_cache().invalidate(user_id, token)
         except SQLAlchemyError as e:
             return 528, "{}".format(str(e))
         except Exception as e:
@@ -144,6 +163,7 @@ class User(db_conn.DBConn):
             user = self.conn.query(UserModel).filter_by(user_id=user_id).first()
             self.conn.delete(user)
             self.conn.commit()
+            get_token_cache().invalidate(user_id)
         except SQLAlchemyError as e:
             self.conn.rollback()
             return 528, "{}".format(str(e))
@@ -169,6 +189,7 @@ class User(db_conn.DBConn):
             user.token = token
             user.terminal = terminal
             self.conn.commit()
+            get_token_cache().invalidate(user_id)
         except SQLAlchemyError as e:
             self.conn.rollback()
             return 528, "{}".format(str(e))
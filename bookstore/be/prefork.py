@@ -0,0 +1,31 @@
+from gunicorn.app.base import BaseApplication
+from be.model.blob_store import reset_blob_store
+
+
+def post_fork(server, worker):
+    # Never reuse a Mongo client that may have been created in the master
+    reset_blob_store()
+
+
+class PreforkServer(BaseApplication):
+    """
+    Runs the Flask app under gunicorn's pre-fork master/worker model.
+    The app factory is called in each worker (preload_app is off), so the
+    SQLAlchemy engine and Mongo client are created after fork.
+    """
+
+    def __init__(self, app_factory, options: dict = None):
+        self.app_factory = app_factory
+        self.options = options or {}
+        BaseApplication.__init__(self)
+
+    def load_config(self):
+        self.cfg.set("worker_class", "gthread")
+        self.cfg.set("preload_app", False)
+        self.cfg.set("post_fork", post_fork)
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.app_factory()
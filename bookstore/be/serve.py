@@ -1,21 +1,45 @@
+import argparse
 import logging
 import os
+import signal
+import tempfile
+import threading
 from flask import Flask
 from flask import Blueprint
-from flask import request
+from flask import jsonify
+from werkzeug.serving import make_server
 from be.view import auth
 from be.view import seller
 from be.view import buyer
+from be.view import book
+from be.model import store
+from be.model import order_sweeper
+from be.model import ledger
+from be.model import coupon
+from be.model import request_timing
+from be.model import metrics
+from be.model import session_scope
 from be.model.store import init_database, init_completed_event
 
 bp_shutdown = Blueprint("shutdown", __name__)
 
+# Set by be_run: the dev server instance, or the pid of the pre-fork master
+# (inherited by the workers across fork)
+dev_server = None
+prefork_master_pid = None
+
 
 def shutdown_server():
-    func = request.environ.get("werkzeug.server.shutdown")
-    if func is None:
-        raise RuntimeError("Not running with the Werkzeug Server")
-    func()
+    if dev_server is not None:
+        # shutdown() blocks until serve_forever() returns, so do not wait on it
+        # from inside the request being served
+        threading.Thread(target=dev_server.shutdown, daemon=True).start()
+    elif prefork_master_pid is not None:
+        # SIGTERM asks the master for a graceful stop: workers finish their
+        # in-flight requests before exiting
+        os.kill(prefork_master_pid, signal.SIGTERM)
+    else:
+        raise RuntimeError("Server was not started by be_run")
 
 
 @bp_shutdown.route("/shutdown")
@@ -24,11 +48,23 @@ def be_shutdown():
     return "Server shutting down..."
 
 
-def be_run():
+@bp_shutdown.route("/reset_caches", methods=["POST"])
+def be_reset_caches():
+    # The database was replaced underneath the server (bench snapshot restore)
+    store.reset_caches()
+    return jsonify({"message": "ok"}), 200
+
+
+@bp_shutdown.route("/timing")
+def be_timing():
+    # Per-endpoint timing aggregates of this worker process
+    return jsonify({"message": "ok", "endpoints": request_timing.endpoint_stats.snapshot()}), 200
+
+
+def init_logging():
     this_path = os.path.dirname(__file__)
     parent_path = os.path.dirname(this_path)
     log_file = os.path.join(parent_path, "app.log")
-    init_database(parent_path)
 
     logging.basicConfig(filename=log_file, level=logging.ERROR)
     handler = logging.StreamHandler()
@@ -38,10 +74,117 @@ def be_run():
     handler.setFormatter(formatter)
     logging.getLogger().addHandler(handler)
 
+
+def create_app():
+    """
+    Build the Flask app and initialize the database / blob store connections.
+    Under the pre-fork server this runs in each worker after fork, so workers
+    never share the engine pool or the Mongo client sockets.
+    """
+    this_path = os.path.dirname(__file__)
+    parent_path = os.path.dirname(this_path)
+    init_database(parent_path)
+    init_logging()
+    # Optional periodic timeout cancellation (ORDER_TIMEOUT_SWEEP_INTERVAL)
+    order_sweeper.start_from_env()
+    # Periodic compaction of the seller balance ledger (LEDGER_COMPACT_INTERVAL),
+    # run by one worker at a time under the pre-fork server (JOB_LOCK_DIR)
+    ledger.start_from_env()
+    # Periodic marking of expired user coupons (COUPON_EXPIRY_INTERVAL), one worker at a time
+    coupon.start_expiry_from_env()
+
     app = Flask(__name__)
     app.register_blueprint(bp_shutdown)
     app.register_blueprint(auth.bp_auth)
     app.register_blueprint(seller.bp_seller)
     app.register_blueprint(buyer.bp_buyer)
+    app.register_blueprint(book.bp_book)
+    # Commit / rollback and remove the request's scoped session at teardown
+    session_scope.init_app(app, store.database_instance)
+    # Per-request timing: Server-Timing header, SQL statement counts, N+1 warnings
+    request_timing.init_app(app, store.database_instance.engine)
+    # Prometheus /metrics: request counts / latency, pool gauges, domain counters
+    metrics.init_app(app, store.database_instance.engine)
+    return app
+
+
+def be_run(
+    mode: str = "dev",
+    host: str = "127.0.0.1",
+    port: int = 5000,
+    workers: int = None,
+    threads: int = 4,
+    graceful_timeout: int = 30,
+):
+    """
+    mode:
+      "dev"     - single process, threaded Werkzeug server (tests, local dev)
+      "prefork" - pre-fork multi-worker server (gunicorn), one process per core
+    """
+    global dev_server, prefork_master_pid
+
+    if mode == "prefork":
+        from be.prefork import PreforkServer
+
+        # Create the schema once in the master so that workers do not race on
+        # CREATE TABLE, then close the master's connections before forking
+        init_database(os.path.dirname(os.path.dirname(__file__)))
+        store.database_instance.engine.dispose()
+
+        prefork_master_pid = os.getpid()
+        # Workers flush their metrics into one directory so that /metrics
+        # served by any worker covers all of them
+        if not os.environ.get("METRICS_DIR"):
+            os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="bookstore-metrics-")
+        metrics.reset_dir(os.environ["METRICS_DIR"])
+        # Token / blob / wallet cache invalidations are published to the other workers
+        # through per-key generation files (be.model.generation)
+        if not os.environ.get("CACHE_GENERATION_DIR"):
+            os.environ["CACHE_GENERATION_DIR"] = tempfile.mkdtemp(prefix="bookstore-cache-gen-")
+        # Background jobs that must run in one process only take a lock file
+        # here (be.model.job_lock)
+        if not os.environ.get("JOB_LOCK_DIR"):
+            os.environ["JOB_LOCK_DIR"] = tempfile.mkdtemp(prefix="bookstore-jobs-")
+        options = {
+            "bind": "{}:{}".format(host, port),
+            "workers": workers or os.cpu_count() or 1,
+            "threads": threads,
+            "graceful_timeout": graceful_timeout,
+        }
+        PreforkServer(create_app, options).run()
+        return
+
+    if mode != "dev":
+        raise ValueError("unknown serving mode {}".format(mode))
+
+    app = create_app()
+    dev_server = make_server(host, port, app, threaded=True)
     init_completed_event.set()
-    app.run()
+    try:
+        dev_server.serve_forever()
+    finally:
+        dev_server.server_close()
+        dev_server = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bookstore backend")
+    parser.add_argument("--mode", choices=["dev", "prefork"], default=os.environ.get("BE_MODE", "dev"))
+    parser.add_argument("--host", default=os.environ.get("BE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("BE_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (prefork mode), default: cpu count")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker (prefork mode)")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds workers get to finish requests on shutdown")
+    args = parser.parse_args(argv)
+    be_run(
+        mode=args.mode,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        graceful_timeout=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from flask import Blueprint
 from flask import request
 from flask import jsonify
 from be.model.user import User
+from be.model.token_cache import get_token_cache
 
 bp_auth = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -75,3 +76,8 @@ def change_password():
     if code != 200:
         return jsonify({"message": msg}), code
     return jsonify({"message": "ok"}), 200
+
+
+@bp_auth.route("/token_cache", methods=["GET"])
+def token_cache_stats():
+    return jsonify({"message": "ok", "stats": get_token_cache().stats()}), 200
@@ -20,10 +20,11 @@ def search_book():
 
     if store_id:
         books = book_model.search_in_store(store_id, keyword, limit, skip)
+        total = None
     else:
-        books = book_model.search_complex(keyword, limit, skip)
+        books, total = book_model.search_complex(keyword, limit, skip)
         
-    return jsonify({"message": "ok", "count": len(books), "books": books}), 200
+    return jsonify({"message": "ok", "count": len(books), "total": total, "books": books}), 200
 
 @bp_book.route("/book", methods=["GET"])
 def get_book_info():
@@ -91,6 +91,18 @@ def list_orders():
     skip = int(request.args.get("skip", 0))
 
     om = Order()
+    # Passing cursor (empty for the first page) switches to keyset pagination
+    if "cursor" in request.args:
+        compact = request.args.get("compact", "0") in ("1", "true")
+        ok, msg, orders, next_cursor = om.list_orders_page(
+            user_id, limit=limit, cursor=request.args.get("cursor"), compact=compact
+        )
+        if not ok:
+            if msg == "invalid cursor":
+                return jsonify({"message": msg}), 400
+            return jsonify({"message": msg}), 500
+        return jsonify({"message": "ok", "orders": orders, "next_cursor": next_cursor}), 200
+
     orders = om.list_orders(user_id, limit=limit, skip=skip)
     return jsonify({"message": "ok", "orders": orders}), 200
 
@@ -226,6 +238,26 @@ def update_cart():
         return jsonify({"message": msg}), code
     return jsonify({"message": "ok"}), 200
 
+@bp_buyer.route("/cart", methods=["PUT"])
+def sync_cart():
+    token = request.headers.get("token", "")
+    body = request.get_json()
+    user_id = body.get("user_id")
+    items = body.get("items", [])         # [{"store_id", "book_id", "count"}], count <= 0 removes
+    replace = body.get("replace", False)   # True: items is the whole cart
+
+    if not check_token(user_id, token):
+        return jsonify({"message": "authorization fail"}), 401
+    # Only a JSON boolean: a string such as "false" must not empty the cart
+    if not isinstance(replace, bool):
+        return jsonify({"message": "replace must be a boolean"}), 400
+
+    cart = Cart()
+    code, msg, data = cart.apply_diff(user_id, items, replace)
+    if code != 200:
+        return jsonify({"message": msg}), code
+    return jsonify({"message": "ok", "cart": data}), 200
+
 @bp_buyer.route("/cart", methods=["DELETE"])
 def remove_cart_item():
     token = request.headers.get("token", "")
@@ -243,6 +275,24 @@ def remove_cart_item():
         return jsonify({"message": msg}), code
     return jsonify({"message": "ok"}), 200
 
+@bp_buyer.route("/checkout", methods=["POST"])
+def checkout():
+    token = request.headers.get("token", "")
+    body = request.get_json()
+    user_id = body.get("user_id")
+    coupons = body.get("coupons") or {} # Optional: {store_id: user_coupon_id}
+
+    if not check_token(user_id, token):
+        return jsonify({"message": "authorization fail"}), 401
+    if not isinstance(coupons, dict):
+        return jsonify({"message": "coupons must be an object {store_id: user_coupon_id}"}), 400
+
+    bm = Buyer()
+    ok, msg, orders = bm.checkout(user_id, coupons)
+    if not ok:
+        return jsonify({"message": msg}), 500
+    return jsonify({"message": "ok", "orders": orders}), 200
+
 @bp_buyer.route("/cart", methods=["GET"])
 def get_cart():
     token = request.headers.get("token", "")
@@ -66,6 +66,28 @@ def add_book():
     return jsonify({"message": "ok"}), 200
 
 
+@bp_seller.route("/add_books", methods=["POST"])
+def add_books():
+    body = request.get_json()
+    token = request.headers.get("token", "")
+
+    user_id = body.get("user_id")
+    store_id = body.get("store_id")
+    books = body.get("books")
+
+    if not check_token(user_id, token):
+        return jsonify({"message": "authorization fail"}), 401
+
+    if not isinstance(books, list):
+        return jsonify({"message": "invalid books"}), 500
+
+    sm = Seller()
+    code, msg, results = sm.add_books(user_id, store_id, books)
+    if code != 200:
+        return jsonify({"message": msg}), code
+    return jsonify({"message": "ok", "results": results}), 200
+
+
 @bp_seller.route("/add_stock_level", methods=["POST"])
 def add_stock_level():
     body = request.get_json()
@@ -130,6 +152,7 @@ def create_coupon():
     threshold = int(body.get("threshold", 0))
     discount = int(body.get("discount", 0))
     stock = int(body.get("stock", 0))
+    buckets = body.get("buckets") # Optional: stock buckets for flash sales
     end_time_str = body.get("end_time") # Format: "YYYY-MM-DD HH:MM:SS"
 
     if not check_token(user_id, token):
@@ -139,9 +162,15 @@ def create_coupon():
         end_time = datetime.strptime(end_time_str, "%Y-%m-%d %H:%M:%S")
     except ValueError:
         return jsonify({"message": "invalid date format"}), 400
+    try:
+        buckets = int(buckets) if buckets else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "buckets must be an integer"}), 400
 
     cm = CouponManager()
-    code, msg, coupon_id = cm.create_coupon(user_id, store_id, name, threshold, discount, stock, end_time)
+    code, msg, coupon_id = cm.create_coupon(
+        user_id, store_id, name, threshold, discount, stock, end_time, buckets=buckets
+    )
     if code != 200:
         return jsonify({"message": msg}), code
     return jsonify({"message": "ok", "coupon_id": coupon_id}), 200
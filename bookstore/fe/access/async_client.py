@@ -0,0 +1,103 @@
+"""
+asyncio 版本的客户端（可选依赖 aiohttp）：一个事件循环就能维持大量并发请求，
+供压测的开环模式等场景使用。接口与 fe.access.buyer.Buyer 保持一致，返回值相同。
+
+    async with AsyncClient(conf.URL) as client:
+        buyer = await client.login_buyer(user_id, password)
+        code, order_id = await buyer.new_order(store_id, [(book_id, 1)])
+"""
+from urllib.parse import urljoin
+from fe import conf
+from fe.access.transport import default_pool_size
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+
+class AsyncClient:
+    """
+    Owns one aiohttp.ClientSession (a keep-alive connection pool of
+    pool_size connections) shared by every AsyncBuyer it creates.
+    """
+
+    def __init__(self, url_prefix: str = None, pool_size: int = None, timeout: float = 30):
+        if aiohttp is None:
+            raise RuntimeError("AsyncClient requires aiohttp: pip install aiohttp")
+        self.url_prefix = url_prefix or conf.URL
+        self.pool_size = pool_size or default_pool_size()
+        self.timeout = timeout
+        self.session = None
+
+    async def open(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def post(self, path: str, json: dict, token: str = None) -> (int, dict):
+        headers = {"token": token} if token else None
+        async with self.session.post(urljoin(self.url_prefix, path), json=json, headers=headers) as r:
+            try:
+                body = await r.json(content_type=None)
+            except ValueError:
+                body = {}
+            return r.status, body or {}
+
+    async def get(self, path: str, params: dict = None, token: str = None) -> (int, dict):
+        headers = {"token": token} if token else None
+        async with self.session.get(urljoin(self.url_prefix, path), params=params, headers=headers) as r:
+            try:
+                body = await r.json(content_type=None)
+            except ValueError:
+                body = {}
+            return r.status, body or {}
+
+    async def login(self, user_id: str, password: str, terminal: str = "my terminal") -> (int, str):
+        code, body = await self.post(
+            "auth/login", {"user_id": user_id, "password": password, "terminal": terminal}
+        )
+        return code, body.get("token")
+
+    async def login_buyer(self, user_id: str, password: str) -> "AsyncBuyer":
+        code, token = await self.login(user_id, password)
+        assert code == 200
+        return AsyncBuyer(self, user_id, password, token)
+
+
+class AsyncBuyer:
+    def __init__(self, client: AsyncClient, user_id: str, password: str, token: str):
+        self.client = client
+        self.user_id = user_id
+        self.password = password
+        self.token = token
+
+    async def new_order(self, store_id: str, book_id_and_count: [(str, int)]) -> (int, str):
+        books = [{"id": book_id, "count": count} for book_id, count in book_id_and_count]
+        json = {"user_id": self.user_id, "store_id": store_id, "books": books}
+        code, body = await self.client.post("buyer/new_order", json, self.token)
+        return code, body.get("order_id")
+
+    async def payment(self, order_id: str) -> int:
+        json = {"user_id": self.user_id, "password": self.password, "order_id": order_id}
+        code, _ = await self.client.post("buyer/payment", json, self.token)
+        return code
+
+    async def add_funds(self, add_value: int) -> int:
+        json = {"user_id": self.user_id, "password": self.password, "add_value": add_value}
+        code, _ = await self.client.post("buyer/add_funds", json, self.token)
+        return code
@@ -95,3 +95,47 @@ class BookDB:
             # print(tags)
 
         return books
+
+    def iter_book_pages(self, size: int, limit: int = None, with_pictures: bool = True):
+        """
+        逐页读取书籍（按 id 的 keyset 分页，整个过程只用一个连接），每页 size 本，
+        最多 limit 本。with_pictures=False 时不读取图片列。
+        """
+        conn = sqlite.connect(self.book_db)
+        columns = (
+            "id, title, author, publisher, original_title, translator, pub_year, pages, "
+            "price, currency_unit, binding, isbn, author_intro, book_intro, content, tags"
+        )
+        if with_pictures:
+            columns += ", picture"
+        last_id = ""
+        remaining = limit
+        try:
+            while remaining is None or remaining > 0:
+                n = size if remaining is None else min(size, remaining)
+                rows = conn.execute(
+                    "SELECT {} FROM book WHERE id > ? ORDER BY id LIMIT ?".format(columns),
+                    (last_id, n),
+                ).fetchall()
+                if not rows:
+                    break
+                books = []
+                for row in rows:
+                    book = Book()
+                    (book.id, book.title, book.author, book.publisher, book.original_title,
+                     book.translator, book.pub_year, book.pages, book.price, book.currency_unit,
+                     book.binding, book.isbn, book.author_intro, book.book_intro, book.content) = row[:15]
+                    for tag in (row[15] or "").split("\n"):
+                        if tag.strip() != "":
+                            book.tags.append(tag)
+                    if with_pictures and row[16] is not None:
+                        # 同一张图片只编码一次
+                        encode_str = base64.b64encode(row[16]).decode("utf-8")
+                        book.pictures = [encode_str] * random.randint(0, 9)
+                    books.append(book)
+                yield books
+                last_id = rows[-1][0]
+                if remaining is not None:
+                    remaining -= len(rows)
+        finally:
+            conn.close()
@@ -1,17 +1,18 @@
-import requests
 import simplejson
 from urllib.parse import urljoin
+from fe.access.transport import get_session
 from fe.access.auth import Auth
 
 
 class Buyer:
-    def __init__(self, url_prefix, user_id, password):
+    def __init__(self, url_prefix, user_id, password, session=None):
         self.url_prefix = urljoin(url_prefix, "buyer/")
+        self.session = session or get_session()
         self.user_id = user_id
         self.password = password
         self.token = ""
         self.terminal = "my terminal"
-        self.auth = Auth(url_prefix)
+        self.auth = Auth(url_prefix, self.session)
         code, self.token = self.auth.login(self.user_id, self.password, self.terminal)
         assert code == 200
 
@@ -23,7 +24,7 @@ class Buyer:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "new_order")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         response_json = r.json()
         return r.status_code, response_json.get("order_id")
 
@@ -35,7 +36,7 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "payment")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def add_funds(self, add_value: str) -> int:
@@ -46,7 +47,7 @@ class Buyer:
         }
         url = urljoin(self.url_prefix, "add_funds")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     # --- Extensions for compatibility with legacy tests ---
@@ -55,7 +56,7 @@ class Buyer:
         url = urljoin(self.url_prefix, "cancel_order")
         headers = {"token": self.token}
         json = {"user_id": self.user_id, "order_id": order_id}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         try:
             return r.status_code
         except Exception:
@@ -72,8 +73,85 @@ class Buyer:
         params = {"q": keyword, "limit": limit, "skip": skip}
         if store_id:
             params["store_id"] = store_id
-        r = requests.get(url, params=params)
+        r = self.session.get(url, params=params)
         if r.status_code != 200:
             return r.status_code, []
         data = r.json()
         return r.status_code, data.get("books", [])
+
+    def get_book_info(self, book_id: str) -> (int, dict):
+        # /book/book sits next to /buyer/ under the same base URL
+        url = urljoin(self.url_prefix, "../book/book")
+        r = self.session.get(url, params={"book_id": book_id})
+        if r.status_code != 200:
+            return r.status_code, None
+        return r.status_code, r.json().get("book")
+
+    def list_orders(self, limit: int = 20, cursor: str = None) -> (int, list, str):
+        """Keyset-paginated order list: pass the returned cursor to get the next page"""
+        url = urljoin(self.url_prefix, "list_orders")
+        headers = {"token": self.token}
+        params = {"user_id": self.user_id, "limit": limit, "cursor": cursor or ""}
+        r = self.session.get(url, headers=headers, params=params)
+        if r.status_code != 200:
+            return r.status_code, [], None
+        data = r.json()
+        return r.status_code, data.get("orders", []), data.get("next_cursor")
+
+    def add_to_cart(self, store_id: str, book_id: str, count: int, action: str = "add") -> int:
+        json = {"user_id": self.user_id, "store_id": store_id, "book_id": book_id, "count": count, "action": action}
+        url = urljoin(self.url_prefix, "cart")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code
+
+    def remove_from_cart(self, store_id: str, book_id: str) -> int:
+        json = {"user_id": self.user_id, "store_id": store_id, "book_id": book_id}
+        url = urljoin(self.url_prefix, "cart")
+        headers = {"token": self.token}
+        r = self.session.delete(url, headers=headers, json=json)
+        return r.status_code
+
+    def get_cart(self) -> (int, list):
+        url = urljoin(self.url_prefix, "cart")
+        headers = {"token": self.token}
+        r = self.session.get(url, headers=headers, params={"user_id": self.user_id})
+        if r.status_code != 200:
+            return r.status_code, []
+        return r.status_code, r.json().get("cart", [])
+
+    def sync_cart(self, items: list, replace: bool = False) -> (int, list):
+        """items: [{"store_id", "book_id", "count"}]; returns the resulting cart"""
+        json = {"user_id": self.user_id, "items": items, "replace": replace}
+        url = urljoin(self.url_prefix, "cart")
+        headers = {"token": self.token}
+        r = self.session.put(url, headers=headers, json=json)
+        if r.status_code != 200:
+            return r.status_code, []
+        return r.status_code, r.json().get("cart", [])
+
+    def checkout(self, coupons: dict = None) -> (int, list):
+        """coupons: {store_id: user_coupon_id}; returns the orders created, one per store"""
+        json = {"user_id": self.user_id, "coupons": coupons or {}}
+        url = urljoin(self.url_prefix, "checkout")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code, r.json().get("orders", [])
+
+    def collect_coupon(self, coupon_id: int) -> int:
+        json = {"user_id": self.user_id, "coupon_id": coupon_id}
+        url = urljoin(self.url_prefix, "coupon")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code
+
+    def get_coupons(self, store_id: str = None) -> (int, list):
+        url = urljoin(self.url_prefix, "coupon")
+        headers = {"token": self.token}
+        params = {"user_id": self.user_id}
+        if store_id:
+            params["store_id"] = store_id
+        r = self.session.get(url, headers=headers, params=params)
+        if r.status_code != 200:
+            return r.status_code, []
+        return r.status_code, r.json().get("coupons", [])
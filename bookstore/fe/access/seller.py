@@ -1,16 +1,17 @@
-import requests
 from urllib.parse import urljoin
+from fe.access.transport import get_session
 from fe.access import book
 from fe.access.auth import Auth
 
 
 class Seller:
-    def __init__(self, url_prefix, seller_id: str, password: str):
+    def __init__(self, url_prefix, seller_id: str, password: str, session=None):
         self.url_prefix = urljoin(url_prefix, "seller/")
+        self.session = session or get_session()
         self.seller_id = seller_id
         self.password = password
         self.terminal = "my terminal"
-        self.auth = Auth(url_prefix)
+        self.auth = Auth(url_prefix, self.session)
         code, self.token = self.auth.login(self.seller_id, self.password, self.terminal)
         assert code == 200
 
@@ -22,7 +23,7 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "create_store")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
     def add_book(self, store_id: str, stock_level: int, book_info: book.Book) -> int:
@@ -35,9 +36,23 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "add_book")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
 
+    def add_books(self, store_id: str, books: [(int, book.Book)]) -> (int, list):
+        json = {
+            "user_id": self.seller_id,
+            "store_id": store_id,
+            "books": [
+                {"book_info": book_info.__dict__, "stock_level": stock_level}
+                for stock_level, book_info in books
+            ],
+        }
+        url = urljoin(self.url_prefix, "add_books")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code, r.json().get("results", [])
+
     def add_stock_level(
         self, seller_id: str, store_id: str, book_id: str, add_stock_num: int
     ) -> int:
@@ -50,5 +65,24 @@ class Seller:
         # print(simplejson.dumps(json))
         url = urljoin(self.url_prefix, "add_stock_level")
         headers = {"token": self.token}
-        r = requests.post(url, headers=headers, json=json)
+        r = self.session.post(url, headers=headers, json=json)
         return r.status_code
+
+    def create_coupon(self, store_id: str, name: str, threshold: int, discount: int,
+                      stock: int, end_time: str, buckets: int = None) -> (int, int):
+        """end_time: "YYYY-MM-DD HH:MM:SS", buckets: stock buckets (flash sale)"""
+        json = {
+            "user_id": self.seller_id,
+            "store_id": store_id,
+            "name": name,
+            "threshold": threshold,
+            "discount": discount,
+            "stock": stock,
+            "end_time": end_time,
+        }
+        if buckets:
+            json["buckets"] = buckets
+        url = urljoin(self.url_prefix, "create_coupon")
+        headers = {"token": self.token}
+        r = self.session.post(url, headers=headers, json=json)
+        return r.status_code, r.json().get("coupon_id")
@@ -0,0 +1,52 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from fe import conf
+
+# 所有 access 客户端共用一个 requests.Session：keep-alive 复用 TCP 连接，
+# 而不是每个请求都新建连接
+_session = None
+_lock = threading.Lock()
+
+
+def default_pool_size() -> int:
+    # 每个并发会话至少一个常驻连接
+    if conf.HTTP_Pool_Size:
+        return conf.HTTP_Pool_Size
+    return max(10, conf.Session * 2)
+
+
+def make_session(pool_size: int = None) -> requests.Session:
+    """
+    A requests.Session whose connection pool keeps up to pool_size idle
+    keep-alive connections per host. Safe to share between threads: the
+    server sets no cookies, and urllib3's pool is thread-safe.
+    """
+    pool_size = pool_size or default_pool_size()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def set_session(session: requests.Session = None):
+    """
+    Replace the shared session (e.g. a differently sized pool, or a custom
+    transport in tests). None closes the current one; a new default session
+    is created on next use.
+    """
+    global _session
+    with _lock:
+        old, _session = _session, session
+    if old is not None and old is not session:
+        old.close()
@@ -0,0 +1,197 @@
+"""
+压测数据直接加载：不经过 HTTP，直接批量写入后端数据库（以及 MongoDB 中的大文本），
+生成的用户 / 店铺 / 图书与 Workload.gen_database 通过 HTTP 生成的完全一致。
+
+需要与后端使用同一个数据库：SQLite 时为 bookstore/be_final.db，或设置 POSTGRES_URL。
+
+SQLite 下还可以把准备好的数据库保存为快照，下次直接恢复：
+    DirectLoader(wl).prepare("fe/data/bench_snapshot.db")
+快照旁边的 .json 文件记录 workload 的用户名、店铺和图书编号等信息。
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import requests
+from urllib.parse import urljoin
+from datetime import datetime, timedelta
+from be.model import store
+from be.model.db_conn import DBConn
+from be.model.db_schema import User, Store as StoreModel, StoreBook, Book, Coupon, CouponStockBucket
+from be.model.coupon import split_stock
+from be.model.seller import book_catalog_row
+from be.model.blob_store import get_blob_store
+from be.model.user import jwt_encode
+from fe import conf
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class DirectLoader:
+    def __init__(self, wl, page_size: int = 1000, load_blobs: bool = True):
+        self.wl = wl
+        self.page_size = page_size
+        self.load_blobs = load_blobs
+        if store.database_instance is None:
+            store.init_database(BACKEND_ROOT)
+        self.engine = store.database_instance.engine
+
+    def prepare(self, snapshot: str = None):
+        """Restore the snapshot if it exists, otherwise load the data (and save the snapshot)."""
+        if snapshot and os.path.exists(snapshot):
+            self.restore(snapshot)
+            return
+        self.load()
+        if snapshot:
+            self.snapshot(snapshot)
+
+    def load(self):
+        wl = self.wl
+        start = time.time()
+        insert_stmt = DBConn().insert_stmt
+        terminal = "terminal_{}".format(time.time())
+
+        users = []
+        stores = []
+        for i in range(1, wl.seller_num + 1):
+            user_id, password = wl.to_seller_id_and_password(i)
+            users.append(self._user_row(user_id, password, 0, terminal))
+            for j in range(1, wl.store_num_per_user + 1):
+                store_id = wl.to_store_id(i, j)
+                stores.append({"store_id": store_id, "user_id": user_id})
+                wl.store_ids.append(store_id)
+                wl.book_ids[store_id] = []
+        for k in range(1, wl.buyer_num + 1):
+            user_id, password = wl.to_buyer_id_and_password(k)
+            users.append(self._user_row(user_id, password, wl.user_funds, terminal))
+            wl.buyer_ids.append(user_id)
+
+        with self.engine.begin() as c:
+            c.execute(User.__table__.insert(), users)
+            c.execute(StoreModel.__table__.insert(), stores)
+
+        blob_store = get_blob_store() if self.load_blobs else None
+        loaded = 0
+        for books in wl.book_db.iter_book_pages(self.page_size, wl.book_num_per_store, with_pictures=False):
+            catalog = []
+            inventory = []
+            blobs = []
+            for bk in books:
+                info = bk.__dict__
+                catalog.append(book_catalog_row(bk.id, info))
+                for store_id in wl.store_ids:
+                    inventory.append({
+                        "store_id": store_id,
+                        "book_id": bk.id,
+                        "stock_level": wl.stock_level,
+                        "price": bk.price or 0,
+                    })
+                    wl.book_ids[store_id].append(bk.id)
+                if len(wl.keywords) < 1000 and bk.title:
+                    wl.keywords.append(bk.title.strip()[:4])
+                blobs.append({
+                    "book_id": bk.id,
+                    "content": bk.content or "",
+                    "book_intro": bk.book_intro or "",
+                    "author_intro": bk.author_intro or "",
+                })
+            with self.engine.begin() as c:
+                # 图书目录是全局的，之前的压测可能已经写入过
+                c.execute(insert_stmt(Book.__table__).on_conflict_do_nothing(index_elements=["id"]), catalog)
+                c.execute(StoreBook.__table__.insert(), inventory)
+            if blob_store is not None:
+                blob_store.put_book_blobs(blobs)
+            loaded += len(books)
+            logging.info(f"直接加载: 已写入 {loaded}/{wl.book_num_per_store} 本书 x {len(wl.store_ids)} 个店铺")
+
+        if wl.profile is not None and "coupon" in wl.profile.mix:
+            end_time = datetime.now() + timedelta(days=1)
+            split = split_stock(conf.Coupon_Stock, conf.Coupon_Buckets)
+            with self.engine.begin() as c:
+                for store_id in wl.store_ids:
+                    result = c.execute(Coupon.__table__.insert().values(
+                        store_id=store_id, name="bench_coupon", threshold=0, discount=1,
+                        stock=conf.Coupon_Stock if len(split) == 1 else 0, end_time=end_time,
+                    ))
+                    coupon_id = result.inserted_primary_key[0]
+                    if len(split) > 1:
+                        c.execute(CouponStockBucket.__table__.insert(), [
+                            {"coupon_id": coupon_id, "bucket": i, "stock": n} for i, n in enumerate(split)
+                        ])
+                    wl.coupon_ids.append(coupon_id)
+
+        logging.info(
+            f"直接加载完成: {len(wl.store_ids)}个店铺, {loaded}本书/店铺, {len(wl.buyer_ids)}个买家, "
+            f"耗时 {time.time() - start:.2f} 秒"
+        )
+
+    @staticmethod
+    def _user_row(user_id: str, password: str, balance: int, terminal: str) -> dict:
+        token = jwt_encode(user_id, terminal)
+        if isinstance(token, bytes):
+            token = token.decode("utf-8")
+        return {"user_id": user_id, "password": password, "balance": balance, "token": token, "terminal": terminal}
+
+    def _sqlite_file(self) -> str:
+        if self.engine.dialect.name != "sqlite":
+            raise ValueError("snapshot/restore is only supported on SQLite, use pg_dump / pg_restore for PostgreSQL")
+        return self.engine.url.database
+
+    def snapshot(self, path: str):
+        """Copy the backend database to path (SQLite online backup) and save the workload metadata."""
+        src = sqlite3.connect(self._sqlite_file())
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        wl = self.wl
+        meta = {
+            "uuid": wl.uuid,
+            "seller_num": wl.seller_num,
+            "store_num_per_user": wl.store_num_per_user,
+            "buyer_num": wl.buyer_num,
+            "store_ids": wl.store_ids,
+            "book_ids": wl.book_ids,
+            "buyer_ids": wl.buyer_ids,
+            "keywords": wl.keywords,
+            "coupon_ids": wl.coupon_ids,
+        }
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        logging.info(f"压测数据快照已保存到: {path}")
+
+    def restore(self, path: str):
+        """Overwrite the backend database with the snapshot and restore the workload metadata."""
+        start = time.time()
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        # Release pooled connections so the backup does not wait on them
+        self.engine.dispose()
+        src = sqlite3.connect(path)
+        dst = sqlite3.connect(self._sqlite_file())
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        # Restored users / books / coupons reuse keys that the caches know from
+        # the replaced data: in this process and in the running server
+        store.reset_caches()
+        self._reset_server_caches()
+        wl = self.wl
+        for key, value in meta.items():
+            setattr(wl, key, value)
+        logging.info(f"已从快照恢复压测数据: {path}, 耗时 {time.time() - start:.2f} 秒")
+
+    @staticmethod
+    def _reset_server_caches():
+        try:
+            r = requests.post(urljoin(conf.URL, "reset_caches"), timeout=10)
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if not ok:
+            logging.warning("could not reset the server caches: restart the server before running the bench")
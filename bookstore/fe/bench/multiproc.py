@@ -0,0 +1,112 @@
+"""
+多进程压测驱动：把会话分到 N 个工作进程中执行，避免客户端自身
+（JSON 编码、requests 开销、统计加锁）在一个 CPU 核上先于服务端饱和。
+
+测试数据在主进程中生成一次，工作进程通过 fork 继承 workload（包括已登录买家的 token，
+不会重新登录），各自统计，结束后把直方图发回主进程合并。所有进程在同一个屏障处同时开始；
+主进程设置 stop 事件即可让所有会话在当前请求完成后停止。
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from fe.access import transport
+from fe.bench.workload import Workload
+from fe.bench.stats import BenchStats
+
+# Seconds the processes wait for each other at the start barrier: a worker
+# that died before reaching it must not hang the whole run
+START_TIMEOUT = 120
+
+
+def _rebind_clients(wl: Workload):
+    # requests.Session 的连接池不能跨进程共享：每个进程建立自己的连接池，
+    # 买家客户端保留 token，只换连接池
+    transport.set_session(transport.make_session())
+    session = transport.get_session()
+    for buyer in wl.buyers.values():
+        buyer.session = session
+        buyer.auth.session = session
+
+
+def _worker(index, wl, session_factory, n_sessions, start_barrier, stop_event, results):
+    stats = BenchStats()
+    try:
+        _rebind_clients(wl)
+        wl.stats = stats
+        sessions = [session_factory(wl) for _ in range(n_sessions)]
+        for ss in sessions:
+            ss.stop_event = stop_event
+        start_barrier.wait(START_TIMEOUT)
+        logging.info(f"进程 {index} (pid {os.getpid()}) 启动 {n_sessions} 个会话")
+        for ss in sessions:
+            ss.start()
+        for ss in sessions:
+            ss.join()
+    except Exception as e:
+        logging.error(f"压测进程 {index} 失败: {e}")
+        start_barrier.abort()
+    finally:
+        results.put((index, wl.stats))
+
+
+def run_sessions(wl: Workload, session_factory, processes: int, timeout: float = None) -> BenchStats:
+    """
+    Run wl.session sessions (built by session_factory(wl)) sharded across
+    `processes` worker processes and merge their stats into wl.stats.
+    timeout: seconds after the coordinated start at which all sessions are told to stop.
+    """
+    ctx = multiprocessing.get_context("fork")
+    processes = max(1, min(processes, wl.session))
+    shards = [wl.session // processes + (1 if i < wl.session % processes else 0) for i in range(processes)]
+
+    start_barrier = ctx.Barrier(processes + 1)
+    stop_event = ctx.Event()
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(
+            target=_worker,
+            args=(i, wl, session_factory, shards[i], start_barrier, stop_event, results),
+            name="bench-{}".format(i),
+        )
+        for i in range(processes)
+    ]
+    for p in workers:
+        p.start()
+
+    try:
+        start_barrier.wait(START_TIMEOUT)
+        logging.info(f"{processes} 个压测进程同时开始，会话分配: {shards}")
+    except threading.BrokenBarrierError:
+        # A worker failed or died before the start: release the ones still
+        # waiting, they report empty stats without running their sessions
+        logging.error("压测进程未能全部就绪")
+        start_barrier.abort()
+        stop_event.set()
+
+    deadline = time.time() + timeout if timeout else None
+    received = 0
+    try:
+        while received < processes:
+            wait = 1.0 if deadline is None else max(0.1, min(1.0, deadline - time.time()))
+            try:
+                index, stats = results.get(timeout=wait)
+            except Exception:
+                if deadline is not None and time.time() >= deadline:
+                    stop_event.set()
+                if not any(p.is_alive() for p in workers) and results.empty():
+                    break
+                continue
+            wl.stats.merge(stats)
+            received += 1
+    except KeyboardInterrupt:
+        stop_event.set()
+        raise
+    finally:
+        stop_event.set()
+        for p in workers:
+            p.join()
+    if received < processes:
+        logging.error(f"只收到 {received}/{processes} 个进程的统计结果")
+    return wl.stats
@@ -0,0 +1,136 @@
+"""
+开环（恒定到达率）压测模式
+
+闭环模式下每个会话发完一个请求才发下一个，服务端变慢时发送速率也跟着降低，
+测到的延迟偏乐观（coordinated omission）。开环模式按目标速率预先排定每个请求的
+到达时间，由工作线程池执行，延迟从“计划开始时间”算起，排队时间也计入延迟。
+"""
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fe.bench.workload import Workload, Payment
+from fe.bench.stats import BenchStats
+
+
+class OpenLoopRunner:
+    """
+    Issues new_order (+ payment of the created order) transactions at
+    `rate` arrivals per second for `duration` seconds.
+    arrival: "poisson" (exponential inter-arrival times) or "fixed".
+    Arrivals that find more than max_outstanding transactions still in
+    flight are dropped and counted, so an overloaded server cannot grow
+    the backlog without bound.
+    """
+
+    def __init__(self, workload: Workload, workers: int = 64, arrival: str = "poisson",
+                 max_outstanding: int = None):
+        if arrival not in ("poisson", "fixed"):
+            raise ValueError("unknown arrival process {}".format(arrival))
+        self.workload = workload
+        self.workers = workers
+        self.arrival = arrival
+        self.max_outstanding = max_outstanding or workers * 10
+        self.lock = threading.Lock()
+
+    def _interval(self, rate: float) -> float:
+        if self.arrival == "poisson":
+            return random.expovariate(rate)
+        return 1.0 / rate
+
+    def _transaction(self, intended_start: float, stats: BenchStats, outstanding: list):
+        try:
+            new_order = self.workload.get_new_order()
+            ok, order_id = new_order.run()
+            after = time.time()
+            with self.lock:
+                stats.record("new_order", after - intended_start, ok, after)
+            if ok:
+                before = time.time()
+                ok = Payment(new_order.buyer, order_id).run()
+                after = time.time()
+                with self.lock:
+                    stats.record("payment", after - before, ok, after)
+        except Exception as e:
+            after = time.time()
+            with self.lock:
+                stats.record("new_order", after - intended_start, False, after)
+            logging.error(f"开环请求失败: {e}")
+        finally:
+            with self.lock:
+                outstanding[0] -= 1
+
+    def run(self, rate: float, duration: float) -> dict:
+        """
+        Run one constant-rate step. Returns the step summary:
+        target rate, achieved throughput, dropped arrivals and the BenchStats.
+        """
+        stats = BenchStats()
+        outstanding = [0]
+        dropped = 0
+        issued = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            start = time.time()
+            intended = start
+            end = start + duration
+            while True:
+                intended += self._interval(rate)
+                if intended >= end:
+                    break
+                delay = intended - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                with self.lock:
+                    if outstanding[0] >= self.max_outstanding:
+                        dropped += 1
+                        continue
+                    outstanding[0] += 1
+                issued += 1
+                pool.submit(self._transaction, intended, stats, outstanding)
+
+        summary = stats.summary()
+        elapsed = max(stats.duration(), duration)
+        completed = summary["operations"].get("new_order", {}).get("count", 0)
+        result = {
+            "rate": rate,
+            "issued": issued,
+            "dropped": dropped,
+            "achieved": completed / elapsed if elapsed > 0 else 0.0,
+            "stats": stats,
+        }
+        no = summary["operations"].get("new_order")
+        logging.info(
+            "开环 rate={}/s: issued={} dropped={} achieved={:.1f}/s p50={:.4f}s p99={:.4f}s".format(
+                rate, issued, dropped, result["achieved"],
+                no["p50"] if no else 0, no["p99"] if no else 0,
+            )
+        )
+        return result
+
+    def ramp(self, start_rate: float, step: float, max_rate: float, step_duration: float,
+             p99_slo: float = 1.0, min_efficiency: float = 0.9) -> list:
+        """
+        Increase the rate by `step` every step_duration seconds until max_rate,
+        stopping at the saturation knee: the first step whose achieved
+        throughput falls below min_efficiency * target, drops arrivals, or
+        whose new_order p99 exceeds p99_slo seconds. Returns all step results;
+        the knee step (if any) is marked with "saturated": True.
+        """
+        results = []
+        rate = start_rate
+        while rate <= max_rate:
+            result = self.run(rate, step_duration)
+            no = result["stats"].summary()["operations"].get("new_order")
+            p99 = no["p99"] if no else 0.0
+            result["saturated"] = (
+                result["dropped"] > 0
+                or result["achieved"] < min_efficiency * rate
+                or p99 > p99_slo
+            )
+            results.append(result)
+            if result["saturated"]:
+                logging.info(f"开环: 在 {rate}/s 达到饱和点 (achieved={result['achieved']:.1f}/s, p99={p99:.4f}s)")
+                break
+            rate += step
+        return results
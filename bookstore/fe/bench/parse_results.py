@@ -10,6 +10,7 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 import re
+import json
 from datetime import datetime
 
 def parse_log_file(log_file):
@@ -77,9 +78,40 @@ def parse_log_file(log_file):
     return results if results else None
 
 
-def generate_report(results, output_file):
+def load_stats(log_file):
+    """读取 run_bench 写出的 {log}_stats.json（延迟分位数），不存在时返回 None"""
+    stats_file = log_file[:-len('.log')] + '_stats.json'
+    if not os.path.exists(stats_file):
+        return None
+    with open(stats_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_percentiles(f, stats):
+    """写出每个操作的延迟分位数"""
+    f.write("-" * 60 + "\n")
+    f.write(f"延迟分位数（秒），测试时长 {stats['duration']:.2f} 秒\n")
+    f.write("-" * 60 + "\n")
+    f.write(f"{'操作':<12}{'总数':>8}{'成功':>8}{'吞吐/s':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'p999':>9}{'max':>9}\n")
+    for op, row in stats['operations'].items():
+        f.write(
+            f"{op:<12}{row['count']:>8}{row['ok']:>8}{row['throughput']:>10.1f}"
+            f"{row['p50']:>9.4f}{row['p90']:>9.4f}{row['p99']:>9.4f}{row['p999']:>9.4f}{row['max']:>9.4f}\n"
+        )
+    f.write("\n")
+
+
+def generate_report(results, output_file, stats=None):
     """生成性能测试报告"""
     if not results:
+        if stats:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write("=" * 60 + "\n")
+                f.write("性能测试结果报告\n")
+                f.write("=" * 60 + "\n\n")
+                write_percentiles(f, stats)
+            print(f"报告已生成: {output_file}")
+            return
         print("没有找到有效的性能测试结果")
         return
     
@@ -120,6 +152,8 @@ def generate_report(results, output_file):
         f.write(f"  - 成功率: {success_rate_p:.2f}%\n")
         f.write(f"  - 平均延迟: {final['p_latency']:.4f} 秒\n")
         f.write(f"\n")
+        if stats:
+            write_percentiles(f, stats)
         f.write("=" * 60 + "\n")
         f.write("详细数据（每次采样）\n")
         f.write("=" * 60 + "\n")
@@ -156,10 +190,11 @@ def main():
     print(f"解析日志文件: {latest_log}")
     
     results = parse_log_file(latest_log)
+    stats = load_stats(latest_log)
     
-    if results:
+    if results or stats:
         output_file = latest_log.replace('.log', '_parsed_results.txt')
-        generate_report(results, output_file)
+        generate_report(results, output_file, stats)
     else:
         print("未能从日志中解析出性能测试结果")
         print("请确保日志文件包含格式为 'TPS_C=XXX, NO=OK:XXX ...' 的行")
@@ -0,0 +1,103 @@
+"""
+混合负载配置：每种操作的权重、思考时间和访问倾斜度（Zipf）
+
+    profile = get_profile("browse-heavy")
+    op = profile.choose()          # 按权重选择下一个操作
+"""
+import bisect
+import random
+
+# 压测支持的操作
+OPERATIONS = (
+    "checkout",     # 下单 + 付款
+    "search",       # /book/search
+    "book_detail",  # /book/book
+    "cart",         # 加入购物车 + 查看购物车
+    "coupon",       # 领取优惠券
+    "list_orders",  # 订单列表（第一页）
+    "cancel",       # 下单后取消
+)
+
+
+class Profile:
+    """
+    mix:        operation -> relative weight
+    think_time: mean pause (seconds, exponential) between operations of a session
+    skew:       Zipf exponent over books and stores; 0 is uniform, ~1 is
+                typical catalogue popularity, higher concentrates on a few hot keys
+    """
+
+    def __init__(self, name: str, mix: dict, think_time: float = 0.0, skew: float = 0.0, description: str = ""):
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ValueError("unknown operations in profile {}: {}".format(name, sorted(unknown)))
+        self.name = name
+        self.mix = {op: w for op, w in mix.items() if w > 0}
+        if not self.mix:
+            raise ValueError("profile {} has no operation with a positive weight".format(name))
+        self.think_time = think_time
+        self.skew = skew
+        self.description = description
+        self.operations = list(self.mix)
+        self.cum_weights = []
+        total = 0
+        for op in self.operations:
+            total += self.mix[op]
+            self.cum_weights.append(total)
+
+    def choose(self) -> str:
+        return random.choices(self.operations, cum_weights=self.cum_weights)[0]
+
+    def think(self) -> float:
+        return random.expovariate(1.0 / self.think_time) if self.think_time > 0 else 0.0
+
+
+class ZipfSampler:
+    """Draws ranks 0..n-1 with P(k) proportional to 1 / (k + 1) ** s"""
+
+    def __init__(self, n: int, s: float):
+        self.n = n
+        self.cum = []
+        total = 0.0
+        for k in range(n):
+            total += 1.0 / (k + 1) ** s
+            self.cum.append(total)
+        self.total = total
+
+    def sample(self) -> int:
+        return min(bisect.bisect_left(self.cum, random.random() * self.total), self.n - 1)
+
+
+PROFILES = {
+    "checkout-heavy": Profile(
+        "checkout-heavy",
+        {"checkout": 50, "search": 15, "book_detail": 15, "list_orders": 10, "cart": 5, "cancel": 5},
+        description="下单付款为主，对应促销后的结算高峰",
+    ),
+    "browse-heavy": Profile(
+        "browse-heavy",
+        {"search": 45, "book_detail": 35, "cart": 8, "list_orders": 5, "checkout": 5, "coupon": 2},
+        think_time=0.01,
+        skew=1.0,
+        description="日常流量：以搜索和图书详情为主，热门图书更常被访问",
+    ),
+    "flash-sale": Profile(
+        "flash-sale",
+        {"coupon": 50, "checkout": 30, "book_detail": 15, "search": 5},
+        skew=1.5,
+        description="秒杀：大量买家同时抢少数店铺的优惠券并下单",
+    ),
+    "coupon-stampede": Profile(
+        "coupon-stampede",
+        {"coupon": 100},
+        skew=3.0,
+        description="优惠券开抢瞬间：所有会话不停地抢几乎同一张券，库存很快抢光",
+    ),
+}
+
+
+def get_profile(name: str) -> Profile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError("unknown profile {}, choose from {}".format(name, sorted(PROFILES)))
@@ -7,10 +7,18 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 from fe.bench.workload import Workload
-from fe.bench.session import Session
+from fe.bench.session import Session, MixedSession
+from fe.bench.profiles import PROFILES, get_profile
+from fe.bench.open_loop import OpenLoopRunner
+from fe.bench.multiproc import run_sessions
 
 
-def run_bench():
+def run_bench(output_prefix: str = None, processes: int = 1):
+    """
+    output_prefix: 若给出，将汇总结果写入 {prefix}_stats.json / _stats.csv / _series.csv
+    processes: 大于 1 时把会话分到多个进程中执行（见 fe/bench/multiproc.py）
+    返回合并后的 BenchStats
+    """
     import logging
     
     wl = Workload()
@@ -24,32 +32,147 @@ def run_bench():
     logging.info(f"总请求数: {wl.session * wl.procedure_per_session}")
     logging.info("=" * 60)
 
-    sessions = []
-    for i in range(0, wl.session):
-        logging.info(f"创建会话 {i+1}/{wl.session}...")
-        logging.info("注意：生成订单请求需要多次登录，可能需要一些时间...")
-        ss = Session(wl)
-        sessions.append(ss)
-        logging.info(f"会话 {i+1} 创建完成！")
-
-    logging.info("启动所有会话...")
-    for i, ss in enumerate(sessions):
-        logging.info(f"启动会话 {i+1}/{len(sessions)}")
-        ss.start()
-
-    logging.info("等待所有会话完成...")
-    for i, ss in enumerate(sessions):
-        ss.join()
-        logging.info(f"会话 {i+1}/{len(sessions)} 已完成")
+    if processes > 1:
+        run_sessions(wl, Session, processes)
+    else:
+        sessions = []
+        for i in range(0, wl.session):
+            logging.info(f"创建会话 {i+1}/{wl.session}...")
+            ss = Session(wl)
+            sessions.append(ss)
+            logging.info(f"会话 {i+1} 创建完成！")
+
+        logging.info("启动所有会话...")
+        for i, ss in enumerate(sessions):
+            logging.info(f"启动会话 {i+1}/{len(sessions)}")
+            ss.start()
+
+        logging.info("等待所有会话完成...")
+        for i, ss in enumerate(sessions):
+            ss.join()
+            logging.info(f"会话 {i+1}/{len(sessions)} 已完成")
     
     logging.info("=" * 60)
     logging.info("性能测试完成！")
     logging.info("=" * 60)
 
+    wl.stats.log_summary()
+    if output_prefix:
+        wl.stats.write_json(output_prefix + "_stats.json")
+        wl.stats.write_csv(output_prefix + "_stats.csv")
+        wl.stats.write_series_csv(output_prefix + "_series.csv")
+        logging.info(f"延迟分位数与吞吐量已保存到: {output_prefix}_stats.json / _stats.csv / _series.csv")
+    return wl.stats
+
+
+def run_mixed(profile_name: str, output_prefix: str = None, processes: int = 1):
+    """
+    混合负载：按预设配置（PROFILES）中的操作权重、思考时间和 Zipf 倾斜度发请求，
+    结果按操作分别统计。返回合并后的 BenchStats
+    """
+    import logging
+
+    profile = get_profile(profile_name)
+    wl = Workload(profile=profile)
+    wl.gen_database()
+
+    logging.info("=" * 60)
+    logging.info(f"开始混合负载测试: {profile.name} - {profile.description}")
+    logging.info(f"操作权重: {profile.mix}, 思考时间: {profile.think_time}s, Zipf 倾斜度: {profile.skew}")
+    logging.info("=" * 60)
+
+    if processes > 1:
+        run_sessions(wl, MixedSession, processes)
+    else:
+        sessions = [MixedSession(wl) for _ in range(wl.session)]
+        for ss in sessions:
+            ss.start()
+        for ss in sessions:
+            ss.join()
+
+    wl.stats.log_summary()
+    if output_prefix:
+        wl.stats.write_json(output_prefix + "_stats.json")
+        wl.stats.write_csv(output_prefix + "_stats.csv")
+        wl.stats.write_series_csv(output_prefix + "_series.csv")
+        logging.info(f"按操作统计的结果已保存到: {output_prefix}_stats.json / _stats.csv")
+    return wl.stats
+
+
+def run_open_loop(
+    rate: float,
+    duration: float,
+    arrival: str = "poisson",
+    workers: int = 64,
+    ramp_step: float = None,
+    ramp_max: float = None,
+    p99_slo: float = 1.0,
+    output_prefix: str = None,
+):
+    """
+    开环模式：按 rate 次/秒的到达率发起下单+付款，持续 duration 秒。
+    给出 ramp_step / ramp_max 时从 rate 开始逐级加压，每级 duration 秒，直到饱和点。
+    返回每一级的结果列表
+    """
+    import json
+    import logging
+
+    wl = Workload()
+    wl.gen_database()
+
+    runner = OpenLoopRunner(wl, workers=workers, arrival=arrival)
+    if ramp_step:
+        results = runner.ramp(rate, ramp_step, ramp_max or rate, duration, p99_slo=p99_slo)
+    else:
+        results = [runner.run(rate, duration)]
+
+    for r in results:
+        wl.stats.merge(r["stats"])
+    wl.stats.log_summary()
+    if output_prefix:
+        wl.stats.write_json(output_prefix + "_stats.json")
+        wl.stats.write_csv(output_prefix + "_stats.csv")
+        wl.stats.write_series_csv(output_prefix + "_series.csv")
+        steps = []
+        for r in results:
+            ops = r["stats"].summary()["operations"]
+            steps.append({
+                "rate": r["rate"],
+                "issued": r["issued"],
+                "dropped": r["dropped"],
+                "achieved": r["achieved"],
+                "saturated": r.get("saturated", False),
+                "operations": ops,
+            })
+        with open(output_prefix + "_ramp.json", "w", encoding="utf-8") as f:
+            json.dump(steps, f, indent=2)
+        logging.info(f"开环结果已保存到: {output_prefix}_stats.json / _ramp.json")
+    return results
+
 
 if __name__ == "__main__":
+    import argparse
     import logging
     from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="bookstore benchmark")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: 每会话一个线程连续发请求; open: 恒定到达率")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                        help="closed 模式下使用的混合负载配置，不设置则只做下单+付款")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="closed 模式下把 Session 个会话分到多少个进程中执行，1 为单进程多线程")
+    parser.add_argument("--load", choices=["http", "direct"], default=None,
+                        help="测试数据加载方式，默认取 conf.Load_Mode")
+    parser.add_argument("--snapshot", default=None, help="direct 加载时使用的 SQLite 快照文件")
+    parser.add_argument("--rate", type=float, default=100, help="open 模式的到达率（次/秒），加压时为起始速率")
+    parser.add_argument("--duration", type=float, default=30, help="open 模式每一级的持续时间（秒）")
+    parser.add_argument("--arrival", choices=["poisson", "fixed"], default="poisson")
+    parser.add_argument("--workers", type=int, default=64, help="open 模式的工作线程数")
+    parser.add_argument("--ramp-step", type=float, default=None, help="每级增加的速率，不设置则不加压")
+    parser.add_argument("--ramp-max", type=float, default=None, help="加压的最大速率")
+    parser.add_argument("--p99-slo", type=float, default=1.0, help="p99 超过该值（秒）视为饱和")
+    args = parser.parse_args()
     
     # 配置日志：同时输出到控制台和文件
     log_dir = os.path.dirname(os.path.abspath(__file__))
@@ -69,5 +192,20 @@ if __name__ == "__main__":
     )
     
     logging.info(f"日志文件: {log_file}")
-    run_bench()
+    from fe import conf
+    if args.load:
+        conf.Load_Mode = args.load
+    if args.snapshot:
+        conf.Load_Mode = "direct"
+        conf.Snapshot_File = args.snapshot
+    if args.mode == "open":
+        run_open_loop(
+            args.rate, args.duration, arrival=args.arrival, workers=args.workers,
+            ramp_step=args.ramp_step, ramp_max=args.ramp_max, p99_slo=args.p99_slo,
+            output_prefix=log_file[:-len(".log")],
+        )
+    elif args.profile:
+        run_mixed(args.profile, output_prefix=log_file[:-len(".log")], processes=args.processes)
+    else:
+        run_bench(output_prefix=log_file[:-len(".log")], processes=args.processes)
     logging.info(f"测试完成，日志已保存到: {log_file}")
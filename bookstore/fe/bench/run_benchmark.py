@@ -153,7 +153,7 @@ def main():
         # 运行性能测试
         # 注意：这里需要修改 workload.py 来收集结果
         # 暂时先运行测试，结果会输出到日志
-        run_bench()
+        run_bench(output_prefix=log_file[:-len(".log")])
         
         benchmark_result.end_time = datetime.now()
         
@@ -1,6 +1,7 @@
 from fe.bench.workload import Workload
 from fe.bench.workload import NewOrder
 from fe.bench.workload import Payment
+from fe.bench.stats import BenchStats
 import time
 import threading
 import logging
@@ -10,7 +11,8 @@ class Session(threading.Thread):
     def __init__(self, wl: Workload):
         threading.Thread.__init__(self)
         self.workload = wl
-        self.new_order_request = []
+        self.total_requests = wl.procedure_per_session
+        self.new_order_request = None
         self.payment_request = []
         self.payment_i = 0
         self.new_order_i = 0
@@ -19,30 +21,31 @@ class Session(threading.Thread):
         self.time_new_order = 0
         self.time_payment = 0
         self.thread = None
+        # 本会话的延迟直方图，结束后合并到 workload
+        self.stats = BenchStats()
+        # 多进程模式下由驱动设置，置位后会话在当前请求完成后停止
+        self.stop_event = None
         self.gen_procedure()
 
     def gen_procedure(self):
-        total = self.workload.procedure_per_session
-        logging.info(f"正在生成 {total} 个订单请求（每个请求需要登录）...")
-        for i in range(0, total):
-            new_order = self.workload.get_new_order()
-            self.new_order_request.append(new_order)
-            # 每生成100个请求显示一次进度
-            if (i + 1) % 100 == 0 or (i + 1) == total:
-                logging.info(f"已生成 {i + 1}/{total} 个订单请求 ({(i+1)*100//total}%)")
-        logging.info(f"订单请求生成完成！共 {len(self.new_order_request)} 个")
+        # 惰性请求流：执行时才逐个生成，买家来自 workload 中已登录的客户端池
+        self.new_order_request = self.workload.iter_new_orders(self.total_requests)
 
     def run(self):
-        logging.info(f"会话 {self.name} 开始执行，共 {len(self.new_order_request)} 个订单请求")
+        logging.info(f"会话 {self.name} 开始执行，共 {self.total_requests} 个订单请求")
         self.run_gut()
+        self.workload.merge_stats(self.stats)
         logging.info(f"会话 {self.name} 执行完成")
 
     def run_gut(self):
-        total_requests = len(self.new_order_request)
+        total_requests = self.total_requests
         for idx, new_order in enumerate(self.new_order_request, 1):
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
             before = time.time()
             ok, order_id = new_order.run()
             after = time.time()
+            self.stats.record("new_order", after - before, ok, after)
             self.time_new_order = self.time_new_order + after - before
             self.new_order_i = self.new_order_i + 1
             if ok:
@@ -53,14 +56,13 @@ class Session(threading.Thread):
             if self.new_order_i % 10 == 0:
                 logging.info(f"会话 {self.name}: 已处理订单 {self.new_order_i}/{total_requests} ({self.new_order_i*100//total_requests}%)")
             
-            if self.new_order_i % 100 ==0 or self.new_order_i == len(
-                self.new_order_request
-            ):
+            if self.new_order_i % 100 ==0 or self.new_order_i == total_requests:
                 # 先处理付款
                 for payment in self.payment_request:
                     before = time.time()
                     ok = payment.run()
                     after = time.time()
+                    self.stats.record("payment", after - before, ok, after)
                     self.time_payment = self.time_payment + after - before
                     self.payment_i = self.payment_i + 1
                     if ok:
@@ -76,3 +78,53 @@ class Session(threading.Thread):
                     self.time_new_order,
                     self.time_payment,
                 )
+
+
+class MixedSession(threading.Thread):
+    """
+    按 workload.profile 的权重混合执行各种操作，每个操作单独记录延迟；
+    checkout 成功后立即付款（付款单独记为 payment）
+    """
+
+    def __init__(self, wl: Workload, total: int = None):
+        threading.Thread.__init__(self)
+        self.workload = wl
+        self.profile = wl.profile
+        self.total_requests = total or wl.procedure_per_session
+        self.stats = BenchStats()
+        self.stop_event = None
+
+    def run(self):
+        logging.info(f"会话 {self.name} 开始执行 {self.profile.name} 负载，共 {self.total_requests} 个操作")
+        for i in range(1, self.total_requests + 1):
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
+            op = self.profile.choose()
+            self.run_operation(op)
+            if i % 100 == 0:
+                logging.info(f"会话 {self.name}: 已完成 {i}/{self.total_requests} 个操作")
+            pause = self.profile.think()
+            if pause:
+                time.sleep(pause)
+        self.workload.merge_stats(self.stats)
+        logging.info(f"会话 {self.name} 执行完成")
+
+    def run_operation(self, op: str):
+        procedure = self.workload.get_operation(op)
+        before = time.time()
+        try:
+            result = procedure.run()
+        except Exception as e:
+            logging.error(f"{op} 请求失败: {e}")
+            result = False
+        after = time.time()
+        if op == "checkout":
+            ok, order_id = result if result else (False, None)
+            self.stats.record(op, after - before, ok, after)
+            if ok:
+                before = time.time()
+                ok = Payment(procedure.buyer, order_id).run()
+                after = time.time()
+                self.stats.record("payment", after - before, ok, after)
+        else:
+            self.stats.record(op, after - before, bool(result), after)
@@ -0,0 +1,222 @@
+"""
+性能测试统计：按操作记录延迟直方图（HDR 风格）和按时间片的吞吐量
+
+每个会话持有自己的 BenchStats（无锁），结束后合并到 Workload 汇总。
+"""
+import csv
+import json
+import math
+import time
+import logging
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram over integer microseconds, in the style of HdrHistogram:
+    each power of two is split into 2**SUB_BUCKET_BITS linear sub-buckets, so a
+    recorded value is reported with < 1% relative error whatever its magnitude.
+    Buckets are kept in a sparse dict, which makes merging and pickling cheap.
+    """
+    SUB_BUCKET_BITS = 8
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, us: int) -> int:
+        if us < cls.SUB_BUCKET_COUNT:
+            return us
+        shift = us.bit_length() - cls.SUB_BUCKET_BITS
+        return (shift << cls.SUB_BUCKET_BITS) + (us >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        # Highest value that falls into the bucket
+        shift = index >> cls.SUB_BUCKET_BITS
+        if shift == 0:
+            return index
+        mantissa = index & (cls.SUB_BUCKET_COUNT - 1)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        us = max(0, int(round(seconds * 1e6)))
+        index = self._index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += us
+        self.max_us = max(self.max_us, us)
+        self.min_us = us if self.min_us is None else min(self.min_us, us)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, p: float) -> float:
+        """Latency in seconds at percentile p (0-100)"""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(p / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def mean(self) -> float:
+        return self.total_us / self.count / 1e6 if self.count else 0.0
+
+    def max(self) -> float:
+        return self.max_us / 1e6
+
+    def min(self) -> float:
+        return (self.min_us or 0) / 1e6
+
+
+class BenchStats:
+    """
+    Per-operation latency histograms (ok and failed requests together) plus
+    completions per `interval` seconds for a throughput time series.
+    Time slots are aligned to the epoch so stats from different sessions merge.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.histograms = {}
+        self.ok = {}
+        self.failed = {}
+        # slot -> {op: [ok, total]}
+        self.series = {}
+        self.start_time = None
+        self.end_time = None
+
+    def record(self, op: str, latency: float, ok: bool = True, finished_at: float = None):
+        if finished_at is None:
+            finished_at = time.time()
+        if self.start_time is None or finished_at - latency < self.start_time:
+            self.start_time = finished_at - latency
+        if self.end_time is None or finished_at > self.end_time:
+            self.end_time = finished_at
+
+        hist = self.histograms.get(op)
+        if hist is None:
+            hist = self.histograms[op] = LatencyHistogram()
+            self.ok[op] = 0
+            self.failed[op] = 0
+        hist.record(latency)
+        if ok:
+            self.ok[op] += 1
+        else:
+            self.failed[op] += 1
+
+        slot = self.series.setdefault(int(finished_at // self.interval), {})
+        cell = slot.setdefault(op, [0, 0])
+        cell[0] += 1 if ok else 0
+        cell[1] += 1
+
+    def merge(self, other: "BenchStats"):
+        for op, hist in other.histograms.items():
+            if op not in self.histograms:
+                self.histograms[op] = LatencyHistogram()
+                self.ok[op] = 0
+                self.failed[op] = 0
+            self.histograms[op].merge(hist)
+            self.ok[op] += other.ok[op]
+            self.failed[op] += other.failed[op]
+        for slot_no, slot in other.series.items():
+            mine = self.series.setdefault(slot_no, {})
+            for op, (n_ok, n_total) in slot.items():
+                cell = mine.setdefault(op, [0, 0])
+                cell[0] += n_ok
+                cell[1] += n_total
+        if other.start_time is not None:
+            self.start_time = other.start_time if self.start_time is None else min(self.start_time, other.start_time)
+            self.end_time = other.end_time if self.end_time is None else max(self.end_time, other.end_time)
+
+    def duration(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return self.end_time - self.start_time
+
+    def summary(self) -> dict:
+        duration = self.duration()
+        operations = {}
+        for op, hist in sorted(self.histograms.items()):
+            row = {
+                "count": hist.count,
+                "ok": self.ok[op],
+                "failed": self.failed[op],
+                "throughput": self.ok[op] / duration if duration > 0 else 0.0,
+                "mean": hist.mean(),
+                "min": hist.min(),
+                "max": hist.max(),
+            }
+            for p in PERCENTILES:
+                row[percentile_key(p)] = hist.percentile(p)
+            operations[op] = row
+
+        series = []
+        if self.series:
+            first = min(self.series)
+            for slot_no in sorted(self.series):
+                series.append({
+                    "t": (slot_no - first) * self.interval,
+                    "ops": {op: {"ok": c[0], "total": c[1]} for op, c in sorted(self.series[slot_no].items())},
+                })
+        return {
+            "duration": duration,
+            "interval": self.interval,
+            "operations": operations,
+            "series": series,
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_csv(self, path: str):
+        """One row per operation with counts, throughput and latency percentiles (seconds)"""
+        columns = ["count", "ok", "failed", "throughput", "mean", "min"] + \
+            [percentile_key(p) for p in PERCENTILES] + ["max"]
+        summary = self.summary()
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["operation"] + columns)
+            for op, row in summary["operations"].items():
+                writer.writerow([op] + [row[c] for c in columns])
+
+    def write_series_csv(self, path: str):
+        """Completions per interval: one row per (time, operation)"""
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["t", "operation", "ok", "total"])
+            for point in self.summary()["series"]:
+                for op, c in point["ops"].items():
+                    writer.writerow([point["t"], op, c["ok"], c["total"]])
+
+    def log_summary(self):
+        for op, row in self.summary()["operations"].items():
+            logging.info(
+                "{}: count={} ok={} failed={} throughput={:.1f}/s mean={:.4f}s "
+                "p50={:.4f}s p90={:.4f}s p99={:.4f}s p999={:.4f}s max={:.4f}s".format(
+                    op, row["count"], row["ok"], row["failed"], row["throughput"], row["mean"],
+                    row["p50"], row["p90"], row["p99"], row["p999"], row["max"],
+                )
+            )
+
+
+def percentile_key(p: float) -> str:
+    # 50 -> "p50", 99.9 -> "p999"
+    return "p" + ("{:g}".format(p)).replace(".", "")
@@ -2,10 +2,13 @@ import logging
 import uuid
 import random
 import threading
+from datetime import datetime, timedelta
 from fe.access import book
 from fe.access.new_seller import register_new_seller
 from fe.access.new_buyer import register_new_buyer
 from fe.access.buyer import Buyer
+from fe.bench.stats import BenchStats
+from fe.bench.profiles import Profile, ZipfSampler
 from fe import conf
 
 
@@ -30,11 +33,85 @@ class Payment:
         return code == 200
 
 
+class SearchBook:
+    def __init__(self, buyer: Buyer, keyword):
+        self.buyer = buyer
+        self.keyword = keyword
+
+    def run(self) -> bool:
+        code, _ = self.buyer.search_book(self.keyword, page=1, limit=10)
+        return code == 200
+
+
+class GetBook:
+    def __init__(self, buyer: Buyer, book_id):
+        self.buyer = buyer
+        self.book_id = book_id
+
+    def run(self) -> bool:
+        code, _ = self.buyer.get_book_info(self.book_id)
+        return code == 200
+
+
+class CartOps:
+    def __init__(self, buyer: Buyer, store_id, book_id):
+        self.buyer = buyer
+        self.store_id = store_id
+        self.book_id = book_id
+
+    def run(self) -> bool:
+        # 加入购物车后查看购物车
+        if self.buyer.add_to_cart(self.store_id, self.book_id, 1) != 200:
+            return False
+        code, _ = self.buyer.get_cart()
+        return code == 200
+
+
+class CollectCoupon:
+    def __init__(self, buyer: Buyer, coupon_id):
+        self.buyer = buyer
+        self.coupon_id = coupon_id
+
+    def run(self) -> bool:
+        # 抢完（400）也是正常的业务结果，只有其它状态码算失败
+        return self.buyer.collect_coupon(self.coupon_id) in (200, 400)
+
+
+class ListOrders:
+    def __init__(self, buyer: Buyer):
+        self.buyer = buyer
+
+    def run(self) -> bool:
+        code, _, _ = self.buyer.list_orders(limit=20)
+        return code == 200
+
+
+class CancelOrder:
+    def __init__(self, new_order: NewOrder):
+        self.buyer = new_order.buyer
+        self.new_order = new_order
+
+    def run(self) -> bool:
+        # 下单后立即取消
+        ok, order_id = self.new_order.run()
+        if not ok:
+            return False
+        return self.buyer.cancel_order(order_id) == 200
+
+
 class Workload:
-    def __init__(self):
+    def __init__(self, profile: Profile = None):
         self.uuid = str(uuid.uuid1())
+        # 混合负载配置，None 表示只做下单+付款
+        self.profile = profile
+        self.keywords = []
+        self.coupon_ids = []
+        self.store_sampler = None
+        self.book_samplers = {}
         self.book_ids = {}
         self.buyer_ids = []
+        # 已登录的买家客户端池：编号 -> Buyer，每个买家只登录一次，所有请求复用其 token
+        self.buyers = {}
         self.store_ids = []
         self.book_db = book.BookDB(conf.Use_Large_DB)
         self.row_count = self.book_db.get_book_count()
@@ -63,6 +140,8 @@ class Workload:
         self.n_payment_past = 0
         self.n_new_order_ok_past = 0
         self.n_payment_ok_past = 0
+        # 所有会话合并后的延迟直方图 / 吞吐量时间序列
+        self.stats = BenchStats()
 
     def to_seller_id_and_password(self, no: int) -> (str, str):
         return "seller_{}_{}".format(no, self.uuid), "password_seller_{}_{}".format(
@@ -78,6 +157,11 @@ class Workload:
         return "store_s_{}_{}_{}".format(seller_no, i, self.uuid)
 
     def gen_database(self):
+        if conf.Load_Mode == "direct":
+            # 不经过 HTTP，直接批量写入后端数据库（可选快照 / 恢复）
+            from fe.bench.loader import DirectLoader
+            DirectLoader(self).prepare(conf.Snapshot_File)
+            return
         logging.info("开始加载测试数据...")
         logging.info(f"配置: {self.seller_num}个卖家, {self.store_num_per_user}个店铺/卖家, {self.book_num_per_store}本书/店铺")
         
@@ -106,19 +190,28 @@ class Workload:
                     if len(books) == 0:
                         break
                     
+                    # 每批书籍一次 add_books 请求
+                    code, results = seller.add_books(store_id, [(self.stock_level, bk) for bk in books])
+                    assert code == 200
+                    assert all(r["code"] == 200 for r in results)
                     for bk in books:
-                        code = seller.add_book(store_id, self.stock_level, bk)
-                        assert code == 200
                         self.book_ids[store_id].append(bk.id)
-                        books_added += 1
-                        
-                        # 每添加100本书显示一次进度
-                        if books_added % 100 == 0:
-                            logging.info(f"店铺 {store_id}: 已添加 {books_added}/{self.book_num_per_store} 本书...")
+                        if len(self.keywords) < 1000 and bk.title:
+                            self.keywords.append(bk.title.strip()[:4])
+                    books_added += len(books)
+                    logging.info(f"店铺 {store_id}: 已添加 {books_added}/{self.book_num_per_store} 本书...")
                     
                     row_no = row_no + len(books)
                 
                 logging.info(f"店铺 {store_id}: 完成！共添加 {books_added} 本书")
+
+                if self.profile is not None and "coupon" in self.profile.mix:
+                    end_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+                    code, coupon_id = seller.create_coupon(
+                        store_id, "bench_coupon", 0, 1, conf.Coupon_Stock, end_time, buckets=conf.Coupon_Buckets
+                    )
+                    assert code == 200
+                    self.coupon_ids.append(coupon_id)
         
         logging.info("卖家数据加载完成！")
         
@@ -129,35 +222,89 @@ class Workload:
             buyer = register_new_buyer(user_id, password)
             buyer.add_funds(self.user_funds)
             self.buyer_ids.append(user_id)
+            self.buyers[k] = buyer
             if k % 5 == 0 or k == self.buyer_num:
                 logging.info(f"已注册买家 {k}/{self.buyer_num}...")
         
         logging.info("买家数据加载完成！")
         logging.info(f"测试数据准备完成: {len(self.store_ids)}个店铺, {len(self.buyer_ids)}个买家")
 
+    def get_buyer(self, no: int) -> Buyer:
+        """从客户端池取已登录的买家，不在池中时登录一次并放入池中"""
+        buyer = self.buyers.get(no)
+        if buyer is None:
+            with self.lock:
+                buyer = self.buyers.get(no)
+                if buyer is None:
+                    buyer_id, buyer_password = self.to_buyer_id_and_password(no)
+                    buyer = Buyer(url_prefix=conf.URL, user_id=buyer_id, password=buyer_password)
+                    self.buyers[no] = buyer
+        return buyer
+
+    def pick_store_no(self) -> int:
+        if self.profile is None or self.profile.skew <= 0:
+            return int(random.uniform(0, len(self.store_ids) - 1))
+        if self.store_sampler is None:
+            self.store_sampler = ZipfSampler(len(self.store_ids), self.profile.skew)
+        return self.store_sampler.sample()
+
+    def pick_book_id(self, store_id: str) -> str:
+        book_ids = self.book_ids[store_id]
+        if self.profile is None or self.profile.skew <= 0:
+            return book_ids[int(random.uniform(0, len(book_ids) - 1))]
+        sampler = self.book_samplers.get(store_id)
+        if sampler is None:
+            sampler = self.book_samplers[store_id] = ZipfSampler(len(book_ids), self.profile.skew)
+        return book_ids[sampler.sample()]
+
     def get_new_order(self) -> NewOrder:
         n = random.randint(1, self.buyer_num)
-        buyer_id, buyer_password = self.to_buyer_id_and_password(n)
-        store_no = int(random.uniform(0, len(self.store_ids) - 1))
-        store_id = self.store_ids[store_no]
+        store_id = self.store_ids[self.pick_store_no()]
         books = random.randint(1, 10)
         book_id_and_count = []
         book_temp = []
         for i in range(0, books):
-            book_no = int(random.uniform(0, len(self.book_ids[store_id]) - 1))
-            book_id = self.book_ids[store_id][book_no]
+            book_id = self.pick_book_id(store_id)
             if book_id in book_temp:
                 continue
             else:
                 book_temp.append(book_id)
                 count = random.randint(1, 10)
                 book_id_and_count.append((book_id, count))
-        # 注意：Buyer 的 __init__ 会立即进行 HTTP 登录请求
-        # 如果后端响应慢，这里可能会卡住
-        b = Buyer(url_prefix=conf.URL, user_id=buyer_id, password=buyer_password)
-        new_ord = NewOrder(b, store_id, book_id_and_count)
+        # 复用池中已登录的买家，不再每个请求登录一次
+        new_ord = NewOrder(self.get_buyer(n), store_id, book_id_and_count)
         return new_ord
 
+    def get_operation(self, op: str):
+        """按操作名生成一个请求（checkout 返回 NewOrder，付款由会话在下单成功后发起）"""
+        if op == "checkout":
+            return self.get_new_order()
+        if op == "cancel":
+            return CancelOrder(self.get_new_order())
+        buyer = self.get_buyer(random.randint(1, self.buyer_num))
+        store_no = self.pick_store_no()
+        store_id = self.store_ids[store_no]
+        if op == "search":
+            return SearchBook(buyer, random.choice(self.keywords))
+        if op == "book_detail":
+            return GetBook(buyer, self.pick_book_id(store_id))
+        if op == "cart":
+            return CartOps(buyer, store_id, self.pick_book_id(store_id))
+        if op == "coupon":
+            return CollectCoupon(buyer, self.coupon_ids[store_no])
+        if op == "list_orders":
+            return ListOrders(buyer)
+        raise ValueError("unknown operation {}".format(op))
+
+    def iter_new_orders(self, total: int):
+        """按需逐个生成下单请求，启动时间和内存不随请求数增长"""
+        for _ in range(total):
+            yield self.get_new_order()
+
+    def merge_stats(self, stats: BenchStats):
+        with self.lock:
+            self.stats.merge(stats)
+
     def update_stat(
         self,
         n_new_order,
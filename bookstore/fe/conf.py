@@ -9,3 +9,13 @@ Default_Stock_Level = 1000000
 Default_User_Funds = 10000000
 Data_Batch_Size = 100
 Use_Large_DB = True
+# HTTP 连接池大小（每个主机的 keep-alive 连接数），0 表示按 Session 数自动计算
+HTTP_Pool_Size = 0
+# 混合负载（含 coupon 操作）时每个店铺创建的优惠券库存
+Coupon_Stock = 100
+# 优惠券库存拆分的行数（秒杀时分散行锁），1 表示不拆分
+Coupon_Buckets = 1
+# 压测数据加载方式："http" 通过接口逐个注册/建店/上架；"direct" 直接批量写入后端数据库（见 fe/bench/loader.py）
+Load_Mode = "http"
+# direct 模式下的 SQLite 快照文件：存在则直接恢复，不存在则加载后保存。None 表示不使用快照
+Snapshot_File = None
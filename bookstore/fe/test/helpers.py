@@ -0,0 +1,49 @@
+import re
+from contextlib import contextmanager
+from sqlalchemy import event
+from be.model import store
+from be.model.ledger import Ledger
+
+
+def balance(user_id: str) -> int:
+    """Exact balance of user_id (user.balance + not yet compacted ledger credits)"""
+    try:
+        return Ledger().balance(user_id)
+    finally:
+        # Read on the test thread's scoped session; do not keep it open
+        store.database_instance.Session.remove()
+
+
+@contextmanager
+def count_statements():
+    """Collect the SQL statements run on the backend engine inside the block"""
+    statements = []
+
+    def before(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = store.database_instance.engine
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+
+
+def parse_server_timing(header: str) -> dict:
+    """Server-Timing metrics: {name: dur, name + "_desc": desc}"""
+    metrics = {}
+    for part in header.split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        for p in params:
+            if p.startswith("dur="):
+                metrics[name] = float(p[4:])
+            if p.startswith("desc="):
+                metrics[name + "_desc"] = p[5:].strip('"')
+    return metrics
+
+
+def server_timing_queries(response) -> int:
+    """SQL statements the request ran, from its Server-Timing header"""
+    desc = parse_server_timing(response.headers["Server-Timing"])["db_desc"]
+    return int(re.match(r"(\d+) queries", desc).group(1))
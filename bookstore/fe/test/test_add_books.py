@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import event
+
+from fe import conf
+from be.model import store
+from be.model.db_schema import StoreBook
+from fe.access.new_seller import register_new_seller
+from fe.access import book
+import uuid
+
+
+class TestAddBooks:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.seller_id = "test_add_books_batch_seller_id_{}".format(str(uuid.uuid1()))
+        self.store_id = "test_add_books_batch_store_id_{}".format(str(uuid.uuid1()))
+        self.password = self.seller_id
+        self.seller = register_new_seller(self.seller_id, self.password)
+
+        code = self.seller.create_store(self.store_id)
+        assert code == 200
+        book_db = book.BookDB(conf.Use_Large_DB)
+        self.books = book_db.get_book_info(0, 3)
+        yield
+
+    def test_ok(self):
+        code, results = self.seller.add_books(self.store_id, [(5, b) for b in self.books])
+        assert code == 200
+        assert [r["id"] for r in results] == [b.id for b in self.books]
+        assert all(r["code"] == 200 for r in results)
+
+    def test_partial_exist_book_id(self):
+        assert self.seller.add_book(self.store_id, 0, self.books[0]) == 200
+        code, results = self.seller.add_books(self.store_id, [(5, b) for b in self.books])
+        assert code == 200
+        assert results[0]["code"] != 200
+        assert all(r["code"] == 200 for r in results[1:])
+
+    def test_duplicate_in_batch(self):
+        code, results = self.seller.add_books(self.store_id, [(1, self.books[0]), (1, self.books[0])])
+        assert code == 200
+        assert results[0]["code"] == 200
+        assert results[1]["code"] != 200
+
+    def test_concurrent_add_book_after_probe(self):
+        # Another request adds books[1] to the store right after the in_store probe
+        engine = store.database_instance.engine
+        raced = []
+
+        def add_concurrently(conn, cursor, statement, parameters, context, executemany):
+            if not raced and statement.lstrip().upper().startswith("SELECT") and "FROM store_book" in statement:
+                raced.append(True)
+                with engine.begin() as c:
+                    c.execute(StoreBook.__table__.insert().values(
+                        store_id=self.store_id, book_id=self.books[1].id, stock_level=0, price=0
+                    ))
+
+        event.listen(engine, "after_cursor_execute", add_concurrently)
+        try:
+            code, results = self.seller.add_books(self.store_id, [(5, b) for b in self.books])
+        finally:
+            event.remove(engine, "after_cursor_execute", add_concurrently)
+        assert raced
+        assert code == 200
+        assert [r["code"] for r in results] == [200, 516, 200]
+
+    def test_error_non_exist_store_id(self):
+        code, _ = self.seller.add_books(self.store_id + "x", [(5, b) for b in self.books])
+        assert code != 200
+
+    def test_error_not_store_owner(self):
+        other_id = "test_add_books_batch_other_{}".format(str(uuid.uuid1()))
+        other = register_new_seller(other_id, other_id)
+        code, _ = other.add_books(self.store_id, [(5, b) for b in self.books])
+        assert code != 200
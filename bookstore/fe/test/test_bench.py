@@ -6,3 +6,137 @@ def test_bench():
         run_bench()
     except Exception as e:
         assert 200 == 100, "test_bench过程出现异常"
+
+
+def test_buyer_pool_logs_in_once():
+    import types
+    import uuid
+    from unittest.mock import patch
+    from fe.access.auth import Auth
+    from fe.access.new_buyer import register_new_buyer
+    from fe.bench.workload import Workload
+
+    wl = Workload()
+    wl.uuid = str(uuid.uuid1())
+    wl.buyer_num = 2
+    wl.store_ids = ["s"]
+    wl.book_ids = {"s": ["b1", "b2", "b3"]}
+    for k in range(1, wl.buyer_num + 1):
+        register_new_buyer(*wl.to_buyer_id_and_password(k))
+
+    with patch.object(Auth, "login", autospec=True, side_effect=Auth.login) as login:
+        stream = wl.iter_new_orders(50)
+        assert isinstance(stream, types.GeneratorType)
+        orders = list(stream)
+    assert len(orders) == 50
+    assert login.call_count <= wl.buyer_num
+    assert len({id(o.buyer) for o in orders}) <= wl.buyer_num
+
+
+def test_open_loop_fixed_rate():
+    from fe.bench.run import run_open_loop
+
+    results = run_open_loop(20, 1, arrival="fixed", workers=8)
+    assert len(results) == 1
+    r = results[0]
+    assert r["issued"] + r["dropped"] in (19, 20)
+    ops = r["stats"].summary()["operations"]
+    assert ops["new_order"]["count"] == r["issued"]
+    # latency is measured from the intended start, never negative
+    assert ops["new_order"]["min"] >= 0
+
+
+def test_mixed_profiles():
+    import pytest
+    from unittest.mock import patch
+    from fe.bench import profiles
+    from fe.bench.run import run_mixed
+
+    with pytest.raises(ValueError):
+        profiles.Profile("bad", {"no_such_op": 1})
+    with pytest.raises(ValueError):
+        profiles.get_profile("no_such_profile")
+
+    sampler = profiles.ZipfSampler(10, 1.5)
+    draws = [sampler.sample() for _ in range(2000)]
+    assert all(0 <= d < 10 for d in draws)
+    assert draws.count(0) > draws.count(9) * 5
+
+    # every operation at least once: a uniform mix over all of them
+    mix = {op: 1 for op in profiles.OPERATIONS}
+    profile = profiles.Profile("all", mix, skew=1.0)
+    with patch.dict(profiles.PROFILES, {"all": profile}), \
+            patch("fe.conf.Request_Per_Session", 60):
+        stats = run_mixed("all")
+    ops = stats.summary()["operations"]
+    for op in profiles.OPERATIONS:
+        assert ops[op]["count"] > 0, op
+        assert ops[op]["failed"] == 0, op
+
+
+def test_multiprocess_driver():
+    from unittest.mock import patch
+    from fe.bench.run import run_bench
+
+    with patch("fe.conf.Session", 3), patch("fe.conf.Request_Per_Session", 20):
+        stats = run_bench(processes=2)
+    ops = stats.summary()["operations"]
+    # 3 sessions x 20 orders, recorded in two processes and merged
+    assert ops["new_order"]["count"] == 60
+    assert ops["payment"]["count"] == ops["new_order"]["ok"]
+
+
+def test_multiprocess_driver_worker_dies_before_start():
+    import os
+    import time
+    from unittest.mock import patch
+    from fe.bench import multiproc
+    from fe.bench.workload import Workload
+
+    def crash(wl):
+        # as if the worker process were killed before the start barrier
+        os._exit(1)
+
+    wl = Workload()
+    wl.session = 2
+    start = time.time()
+    with patch.object(multiproc, "START_TIMEOUT", 2):
+        stats = multiproc.run_sessions(wl, crash, processes=2)
+    assert time.time() - start < 30
+    assert stats.summary()["operations"] == {}
+
+
+def test_direct_loader_and_snapshot(tmp_path):
+    from unittest.mock import patch
+    from fe.bench.workload import Workload
+    from fe.bench.loader import DirectLoader
+    from fe.bench.profiles import get_profile
+
+    with patch("fe.conf.Load_Mode", "direct"):
+        wl = Workload(profile=get_profile("flash-sale"))
+        wl.gen_database()
+    assert len(wl.store_ids) == wl.seller_num * wl.store_num_per_user
+    assert len(wl.coupon_ids) == len(wl.store_ids)
+    for store_id in wl.store_ids:
+        assert len(wl.book_ids[store_id]) == wl.book_num_per_store
+
+    # the loaded data is usable over HTTP: buyers log in, order, pay and collect coupons
+    new_order = wl.get_new_order()
+    ok, order_id = new_order.run()
+    assert ok
+    buyer = new_order.buyer
+    assert buyer.payment(order_id) == 200
+    assert buyer.collect_coupon(wl.coupon_ids[0]) == 200
+
+    snapshot = str(tmp_path / "bench.db")
+    DirectLoader(wl, load_blobs=False).snapshot(snapshot)
+    restored = Workload()
+    DirectLoader(restored, load_blobs=False).restore(snapshot)
+    # The running server forgot what it cached from the replaced database
+    from be.model.coupon import coupon_cache
+    from be.model.token_cache import get_token_cache
+    assert get_token_cache().stats()["size"] == 0
+    assert coupon_cache.get(wl.coupon_ids[0]) is None
+    assert restored.store_ids == wl.store_ids
+    assert restored.book_ids == wl.book_ids
+    assert restored.get_buyer(2).add_funds(1) == 200
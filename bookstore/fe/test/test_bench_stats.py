@@ -0,0 +1,60 @@
+import csv
+import json
+from fe.bench.stats import BenchStats, LatencyHistogram
+
+
+def test_histogram_percentiles():
+    hist = LatencyHistogram()
+    # 1ms .. 1000ms
+    for ms in range(1, 1001):
+        hist.record(ms / 1000.0)
+    assert hist.count == 1000
+    assert abs(hist.percentile(50) - 0.5) <= 0.5 * 0.008
+    assert abs(hist.percentile(99) - 0.99) <= 0.99 * 0.008
+    assert abs(hist.percentile(99.9) - 0.999) <= 0.999 * 0.008
+    assert hist.max() == 1.0
+    assert hist.min() == 0.001
+    assert abs(hist.mean() - 0.5005) < 1e-6
+
+
+def test_tail_is_not_hidden_by_mean():
+    hist = LatencyHistogram()
+    for _ in range(990):
+        hist.record(0.01)
+    for _ in range(10):
+        hist.record(2.0)
+    assert hist.mean() < 0.05
+    assert hist.percentile(50) < 0.0101
+    assert hist.percentile(99.9) >= 1.99
+
+
+def test_merge_sessions(tmp_path):
+    a = BenchStats()
+    b = BenchStats()
+    for i in range(100):
+        a.record("new_order", 0.01, True, 1000.5)
+        b.record("new_order", 0.03, i % 2 == 0, 1001.5)
+    b.record("payment", 0.02, True, 1001.5)
+
+    merged = BenchStats()
+    merged.merge(a)
+    merged.merge(b)
+    summary = merged.summary()
+    no = summary["operations"]["new_order"]
+    assert no["count"] == 200
+    assert no["ok"] == 150
+    assert no["failed"] == 50
+    assert abs(no["p50"] - 0.01) <= 0.01 * 0.008
+    assert abs(no["p90"] - 0.03) <= 0.03 * 0.008
+    assert summary["operations"]["payment"]["count"] == 1
+    assert [p["t"] for p in summary["series"]] == [0, 1]
+    assert summary["series"][1]["ops"]["new_order"] == {"ok": 50, "total": 100}
+
+    merged.write_json(str(tmp_path / "s.json"))
+    with open(tmp_path / "s.json") as f:
+        assert json.load(f)["operations"]["new_order"]["count"] == 200
+    merged.write_csv(str(tmp_path / "s.csv"))
+    with open(tmp_path / "s.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["operation"] for r in rows] == ["new_order", "payment"]
+    assert "p999" in rows[0]
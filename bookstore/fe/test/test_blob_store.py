@@ -1,6 +1,7 @@
 import pytest
 import uuid
-from be.model.blob_store import get_blob_store
+from unittest.mock import patch
+from be.model.blob_store import get_blob_store, BlobStore, BlobCache
 
 class TestBlobStore:
     def test_mongo_connection(self):
@@ -66,4 +67,66 @@ class TestBlobStore:
         res = store.get_book_blob("non_exist_id_xxxxx")
         # 应该返回空对象结构
         assert res["content"] == ""
-        assert res["book_intro"] == ""
\ No newline at end of file
+        assert res["book_intro"] == ""
+
+class TestBlobCache:
+    def test_read_through_and_invalidate(self):
+        store = BlobStore()
+        doc = {"book_id": "b", "content": "c", "book_intro": "bi", "author_intro": "ai"}
+        with patch("pymongo.collection.Collection.find_one", return_value=doc) as find_one:
+            assert store.get_book_blob("b")["content"] == "c"
+            assert store.get_book_blob("b")["content"] == "c"
+            # projection of already cached fields is served from the cache too
+            res = store.get_book_blob("b", fields=["book_intro"])
+            assert res == {"book_id": "b", "book_intro": "bi"}
+            assert find_one.call_count == 1
+
+        with patch("pymongo.collection.Collection.update_one"):
+            store.put_book_blob("b", "c2", "bi", "ai")
+        doc2 = dict(doc, content="c2")
+        with patch("pymongo.collection.Collection.find_one", return_value=doc2) as find_one:
+            assert store.get_book_blob("b")["content"] == "c2"
+            assert find_one.call_count == 1
+
+    def test_negative_cache(self):
+        store = BlobStore()
+        with patch("pymongo.collection.Collection.find_one", return_value=None) as find_one:
+            assert store.get_book_blob("missing")["content"] == ""
+            assert store.get_book_blob("missing")["content"] == ""
+            assert find_one.call_count == 1
+        assert store.cache.stats()["negative_hits"] == 1
+
+    def test_projection_miss_fetches_more_fields(self):
+        store = BlobStore()
+        with patch("pymongo.collection.Collection.find_one", return_value={"book_id": "p", "book_intro": "bi"}):
+            store.get_book_blob("p", fields=["book_intro"])
+        doc = {"book_id": "p", "content": "c", "book_intro": "bi", "author_intro": "ai"}
+        with patch("pymongo.collection.Collection.find_one", return_value=doc) as find_one:
+            # only book_intro is cached, so a full read goes to MongoDB
+            assert store.get_book_blob("p")["content"] == "c"
+            assert store.get_book_blob("p")["content"] == "c"
+            assert find_one.call_count == 1
+
+    def test_size_bounded_eviction(self):
+        cache = BlobCache(max_bytes=100, ttl=60, negative_ttl=60)
+        cache.put("a", frozenset(["content"]), {"content": "x" * 40})
+        cache.put("b", frozenset(["content"]), {"content": "x" * 40})
+        cache.put("c", frozenset(["content"]), {"content": "x" * 40})
+        assert cache.get("a", frozenset(["content"])) == (False, None)
+        assert cache.get("c", frozenset(["content"]))[0]
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["size_bytes"] <= 100
+
+    def test_invalidate_other_worker(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+        worker_a = BlobCache(max_bytes=1000, ttl=60, negative_ttl=60)
+        worker_b = BlobCache(max_bytes=1000, ttl=60, negative_ttl=60)
+        worker_a.put("a", frozenset(["content"]), {"content": "old"})
+        worker_a.put("n", frozenset(["content"]), None)
+        assert worker_a.get("a", frozenset(["content"])) == (True, {"content": "old"})
+        # put_book_blob served by the other worker
+        worker_b.invalidate("a")
+        worker_b.invalidate("n")
+        assert worker_a.get("a", frozenset(["content"])) == (False, None)
+        assert worker_a.get("n", frozenset(["content"])) == (False, None)
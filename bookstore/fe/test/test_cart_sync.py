@@ -0,0 +1,64 @@
+import uuid
+import pytest
+from fe.access.new_buyer import register_new_buyer
+from fe.test.gen_book_data import GenBook
+
+
+class TestCartSync:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.buyer = register_new_buyer("test_cart_sync_buyer_{}".format(uuid.uuid1()), "p")
+        self.store_id = "test_cart_sync_store_{}".format(uuid.uuid1())
+        gen_book = GenBook("test_cart_sync_seller_{}".format(uuid.uuid1()), self.store_id)
+        ok, _ = gen_book.gen(non_exist_book_id=False, low_stock_level=False, max_book_count=5)
+        assert ok
+        self.book_ids = [bk.id for bk, _ in gen_book.buy_book_info_list]
+        yield
+
+    def item(self, book_id, count):
+        return {"store_id": self.store_id, "book_id": book_id, "count": count}
+
+    def test_partial_diff(self):
+        first = self.book_ids[0]
+        code, cart = self.buyer.sync_cart([self.item(b, 2) for b in self.book_ids])
+        assert code == 200
+        assert sorted((c["book_id"], c["count"]) for c in cart) == sorted((b, 2) for b in self.book_ids)
+
+        # Update one line, remove another, leave the rest alone
+        changes = [self.item(first, 5)]
+        if len(self.book_ids) > 1:
+            changes.append(self.item(self.book_ids[1], 0))
+        code, cart = self.buyer.sync_cart(changes)
+        assert code == 200
+        counts = {c["book_id"]: c["count"] for c in cart}
+        assert counts[first] == 5
+        assert len(counts) == max(1, len(self.book_ids) - 1)
+
+        code, stored = self.buyer.get_cart()
+        assert sorted(stored, key=lambda c: c["book_id"]) == sorted(cart, key=lambda c: c["book_id"])
+
+    def test_replace(self):
+        assert self.buyer.sync_cart([self.item(b, 1) for b in self.book_ids])[0] == 200
+        code, cart = self.buyer.sync_cart([self.item(self.book_ids[-1], 3)], replace=True)
+        assert code == 200
+        assert cart == [self.item(self.book_ids[-1], 3)]
+        code, cart = self.buyer.sync_cart([], replace=True)
+        assert code == 200
+        assert cart == []
+
+    def test_unknown_book_rejects_whole_diff(self):
+        code, _ = self.buyer.sync_cart([self.item(self.book_ids[0], 1), self.item("no_such_book_x", 1)])
+        assert code == 515
+        code, cart = self.buyer.get_cart()
+        assert cart == []
+
+    def test_invalid_item(self):
+        code, _ = self.buyer.sync_cart([self.item(self.book_ids[0], "many")])
+        assert code == 400
+
+    def test_replace_must_be_boolean(self):
+        assert self.buyer.sync_cart([self.item(b, 1) for b in self.book_ids])[0] == 200
+        code, _ = self.buyer.sync_cart([self.item(self.book_ids[0], 2)], replace="false")
+        assert code == 400
+        code, cart = self.buyer.get_cart()
+        assert sorted(c["book_id"] for c in cart) == sorted(self.book_ids)
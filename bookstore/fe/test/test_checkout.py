@@ -0,0 +1,84 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fe.access.new_buyer import register_new_buyer
+from fe.test.gen_book_data import GenBook
+from be.model import store
+from be.model.db_schema import StoreBook
+
+
+class TestCheckout:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.buyer_id = "test_checkout_buyer_{}".format(uuid.uuid1())
+        self.buyer = register_new_buyer(self.buyer_id, self.buyer_id)
+        self.stores = []
+        for i in range(2):
+            seller_id = "test_checkout_seller_{}_{}".format(i, uuid.uuid1())
+            store_id = "test_checkout_store_{}_{}".format(i, uuid.uuid1())
+            gen_book = GenBook(seller_id, store_id)
+            ok, _ = gen_book.gen(non_exist_book_id=False, low_stock_level=False, max_book_count=3)
+            assert ok
+            self.stores.append((gen_book, store_id))
+            for bk, _ in gen_book.buy_book_info_list:
+                assert self.buyer.add_to_cart(store_id, bk.id, 1) == 200
+        yield
+
+    def stock(self, store_id, book_id):
+        with store.database_instance.engine.connect() as c:
+            return c.execute(StoreBook.__table__.select().where(
+                StoreBook.store_id == store_id, StoreBook.book_id == book_id
+            )).first().stock_level
+
+    def test_ok(self):
+        code, orders = self.buyer.checkout()
+        assert code == 200
+        assert sorted(o["store_id"] for o in orders) == sorted(s for _, s in self.stores)
+        code, cart = self.buyer.get_cart()
+        assert code == 200
+        assert cart == []
+        for order in orders:
+            assert self.buyer.add_funds(order["total_price"]) == 200
+            assert self.buyer.payment(order["order_id"]) == 200
+
+    def test_empty_cart(self):
+        assert self.buyer.checkout()[0] == 200
+        code, orders = self.buyer.checkout()
+        assert code != 200
+        assert orders == []
+
+    def test_atomic_on_low_stock(self):
+        gen_book, store_id = self.stores[1]
+        book = gen_book.buy_book_info_list[0][0]
+        assert self.buyer.add_to_cart(store_id, book.id, 10 ** 6, action="update") == 200
+        other_store = self.stores[0][1]
+        other_book = self.stores[0][0].buy_book_info_list[0][0]
+        before = self.stock(other_store, other_book.id)
+
+        code, orders = self.buyer.checkout()
+        assert code != 200
+        # Nothing was ordered: the other store's stock and the cart are unchanged
+        assert self.stock(other_store, other_book.id) == before
+        code, cart = self.buyer.get_cart()
+        assert len(cart) == sum(len(g.buy_book_info_list) for g, _ in self.stores)
+
+    def test_store_coupon(self):
+        gen_book, store_id = self.stores[0]
+        end_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        code, coupon_id = gen_book.seller.create_coupon(store_id, "checkout", 0, 1, 5, end_time)
+        assert code == 200
+        assert self.buyer.collect_coupon(coupon_id) == 200
+        code, wallet = self.buyer.get_coupons(store_id)
+        assert code == 200 and len(wallet) == 1
+
+        code, orders = self.buyer.checkout({store_id: wallet[0]["id"]})
+        assert code == 200
+        code, wallet = self.buyer.get_coupons(store_id)
+        assert wallet == []
+
+    def test_coupons_not_an_object(self):
+        code, orders = self.buyer.checkout(["not", "a", "mapping"])
+        assert code == 400
+        assert orders == []
+        code, cart = self.buyer.get_cart()
+        assert len(cart) == sum(len(g.buy_book_info_list) for g, _ in self.stores)
@@ -0,0 +1,154 @@
+import uuid
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from urllib.parse import urljoin
+import pytest
+import requests
+from be.model import store, coupon, error
+from be.model.coupon import CouponManager, split_stock
+from be.model.db_schema import CouponStockBucket
+from fe.access.new_buyer import register_new_buyer
+from fe.access.new_seller import register_new_seller
+from fe.test.helpers import server_timing_queries
+
+
+@pytest.fixture
+def shop():
+    seller_id = "test_flash_seller_{}".format(uuid.uuid1())
+    store_id = "test_flash_store_{}".format(uuid.uuid1())
+    seller = register_new_seller(seller_id, seller_id)
+    assert seller.create_store(store_id) == 200
+    buyers = [register_new_buyer("test_flash_buyer_{}".format(uuid.uuid1()), "p") for _ in range(12)]
+    yield seller, store_id, buyers
+    store.database_instance.Session.remove()
+
+
+def create(seller, store_id, stock, buckets):
+    end_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    code, coupon_id = seller.create_coupon(store_id, "flash", 0, 1, stock, end_time, buckets=buckets)
+    assert code == 200
+    return coupon_id
+
+
+def collected(buyers, store_id) -> int:
+    total = 0
+    for b in buyers:
+        code, wallet = b.get_coupons(store_id)
+        assert code == 200
+        total += len(wallet)
+    return total
+
+
+def bucket_stock(coupon_id) -> list:
+    with store.database_instance.engine.connect() as c:
+        rows = c.execute(CouponStockBucket.__table__.select().where(CouponStockBucket.coupon_id == coupon_id)).all()
+    return sorted(r.stock for r in rows)
+
+
+def test_split_stock():
+    assert split_stock(10, 4) == [3, 3, 2, 2]
+    assert split_stock(2, 8) == [1, 1]
+    assert split_stock(0, 8) == [0]
+
+
+def test_buckets_must_be_an_integer(shop):
+    seller, store_id, _ = shop
+    end_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    code, coupon_id = seller.create_coupon(store_id, "flash", 0, 1, 5, end_time, buckets="many")
+    assert code == 400
+    assert coupon_id is None
+
+
+def test_bucketed_stampede(shop):
+    seller, store_id, buyers = shop
+    coupon_id = create(seller, store_id, 10, 4)
+    assert bucket_stock(coupon_id) == [2, 2, 3, 3]
+
+    codes = []
+    threads = [threading.Thread(target=lambda b=b: codes.append(b.collect_coupon(coupon_id))) for b in buyers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(codes) == [200] * 10 + [400] * 2
+    assert collected(buyers, store_id) == 10
+    assert coupon.coupon_cache.is_sold_out(coupon_id)
+
+
+def test_sold_out_short_circuit(shop):
+    seller, store_id, buyers = shop
+    coupon_id = create(seller, store_id, 1, 1)
+    assert buyers[0].collect_coupon(coupon_id) == 200
+    assert buyers[1].collect_coupon(coupon_id) == 400
+    # Warm buyers[2]'s token cache entry
+    assert buyers[2].get_coupons(store_id)[0] == 200
+
+    r = requests.post(
+        urljoin(buyers[2].url_prefix, "coupon"),
+        headers={"token": buyers[2].token},
+        json={"user_id": buyers[2].user_id, "coupon_id": coupon_id},
+    )
+    assert r.status_code == 400
+    # The token is cached; only the user lookup, the coupon tables are not touched
+    assert server_timing_queries(r) == 1
+    # The user is validated before the sold-out cache answers
+    assert CouponManager().collect_coupon("test_flash_no_such_user", coupon_id) == error.error_non_exist_user_id(
+        "test_flash_no_such_user")
+
+
+def test_write_behind(shop):
+    seller, store_id, buyers = shop
+    coupon_id = create(seller, store_id, 5, 2)
+    with patch.object(coupon, "COUPON_WRITE_BEHIND", True):
+        for b in buyers[:6]:
+            b.collect_coupon(coupon_id)
+    coupon.user_coupon_writer.flush()
+    assert collected(buyers[:6], store_id) == 5
+
+
+def test_write_behind_failed_row_gives_stock_back(shop):
+    seller, store_id, buyers = shop
+    coupon_id = create(seller, store_id, 4, 2)
+    cm = CouponManager()
+    claims = [cm._claim(coupon_id, 2) for _ in range(2)]
+    cm.conn.commit()
+    store.database_instance.Session.remove()
+    assert sum(bucket_stock(coupon_id)) == 2
+
+    # user_id NULL fails the batch insert and then its own row
+    coupon.UserCouponWriter(retries=1).write([(buyers[0].user_id, coupon_id, claims[0]), (None, coupon_id, claims[1])])
+    assert collected(buyers[:1], store_id) == 1
+    assert sum(bucket_stock(coupon_id)) == 3
+
+
+def test_write_behind_full_queue_inserts_synchronously(shop):
+    seller, store_id, buyers = shop
+    coupon_id = create(seller, store_id, 5, 1)
+    with patch.object(coupon, "COUPON_WRITE_BEHIND", True), \
+            patch.object(coupon.user_coupon_writer, "put", return_value=False):
+        assert buyers[0].collect_coupon(coupon_id) == 200
+    # No flush: the row was written by the request itself
+    assert collected(buyers[:1], store_id) == 1
+
+
+def test_sold_out_mark_dropped_in_other_workers(monkeypatch, tmp_path):
+    # Two caches stand in for two pre-fork workers sharing the generation directory
+    monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+    worker_a, worker_b = coupon.CouponCache(), coupon.CouponCache()
+    worker_a.mark_sold_out(1)
+    worker_b.mark_sold_out(1)
+    worker_a.unmark_sold_out(1)
+    assert not worker_b.is_sold_out(1)
+    worker_b.mark_sold_out(1)
+    assert worker_b.is_sold_out(1)
+
+
+def test_writer_registers_one_atexit_flush():
+    with patch.object(coupon.atexit, "register") as register:
+        writer = coupon.UserCouponWriter()
+        writer._ensure_started()
+        # As in a forked worker: the thread is started again
+        writer.pid = None
+        writer._ensure_started()
+    assert register.call_count == 1
@@ -0,0 +1,97 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from be.model import store
+from be.model.coupon import CouponManager, CouponExpiryJob, WalletCache, wallet_cache
+from be.model.db_schema import UserCoupon
+from fe.access.new_buyer import register_new_buyer
+from fe.access.new_seller import register_new_seller
+from fe.test.helpers import count_statements
+
+
+@pytest.fixture
+def wallet():
+    seller_id = "test_wallet_seller_{}".format(uuid.uuid1())
+    store_ids = ["test_wallet_store_{}".format(uuid.uuid1()) for _ in range(2)]
+    seller = register_new_seller(seller_id, seller_id)
+    for store_id in store_ids:
+        assert seller.create_store(store_id) == 200
+    buyer = register_new_buyer("test_wallet_user_{}".format(uuid.uuid1()), "p")
+
+    # The last coupon expires right after it is collected
+    now = datetime.now()
+    coupon_ids = []
+    for i, end_time in enumerate([now + timedelta(days=1)] * 4 + [now + timedelta(seconds=2)]):
+        code, coupon_id = seller.create_coupon(
+            store_ids[i % 2], "c{}".format(i), i, 1, 10, end_time.strftime("%Y-%m-%d %H:%M:%S"))
+        assert code == 200
+        assert buyer.collect_coupon(coupon_id) == 200
+        coupon_ids.append(coupon_id)
+    time.sleep(max(0.0, (now + timedelta(seconds=3) - datetime.now()).total_seconds()))
+    yield buyer.user_id, store_ids, coupon_ids
+    wallet_cache.invalidate(buyer.user_id)
+    store.database_instance.Session.remove()
+
+
+def test_wallet_single_query_and_cache(wallet):
+    user_id, store_ids, coupon_ids = wallet
+    cm = CouponManager()
+    with count_statements() as statements:
+        code, _, coupons = cm.get_available_coupons(user_id)
+    assert code == 200
+    assert sorted(c["coupon_id"] for c in coupons) == coupon_ids[:4]
+    assert len(statements) == 1
+
+    # Served from the cache, store filter applied on the cached wallet
+    with count_statements() as statements:
+        code, _, coupons = cm.get_available_coupons(user_id, store_ids[0])
+    assert len(statements) == 0
+    assert sorted(c["coupon_id"] for c in coupons) == [coupon_ids[0], coupon_ids[2]]
+
+    # Collecting invalidates the wallet
+    assert cm.collect_coupon(user_id, coupon_ids[1])[0] == 200
+    with count_statements() as statements:
+        code, _, coupons = cm.get_available_coupons(user_id)
+    assert len(statements) == 1
+    assert len(coupons) == 5
+
+
+def test_expire_coupons(wallet):
+    user_id, store_ids, coupon_ids = wallet
+    cm = CouponManager()
+    assert cm.expire_coupons(batch_size=1) >= 1
+    with store.database_instance.engine.connect() as c:
+        statuses = {
+            row.coupon_id: row.status
+            for row in c.execute(UserCoupon.__table__.select().where(UserCoupon.user_id == user_id))
+        }
+    assert statuses[coupon_ids[4]] == "expired"
+    assert all(statuses[cid] == "unused" for cid in coupon_ids[:4])
+
+
+def test_wallet_invalidation_reaches_other_workers(monkeypatch, tmp_path):
+    # Two caches stand in for two pre-fork workers sharing the generation directory
+    monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+    worker_a, worker_b = WalletCache(), WalletCache()
+    worker_a.put("u", [("a",)])
+    worker_b.put("u", [("a",)])
+    worker_a.invalidate("u")
+    assert worker_b.get("u") is None
+
+    # A load that raced with an invalidation is not served either
+    gen = worker_b.generation("u")
+    worker_a.invalidate("u")
+    worker_b.put("u", [("stale",)], gen)
+    assert worker_b.get("u") is None
+
+
+def test_expiry_job_runs_in_one_worker(monkeypatch, tmp_path):
+    monkeypatch.setenv("JOB_LOCK_DIR", str(tmp_path))
+    first, second = CouponExpiryJob(60), CouponExpiryJob(60)
+    try:
+        assert first.lock.acquire()
+        assert not second.lock.acquire()
+    finally:
+        first.stop()
+        second.stop()
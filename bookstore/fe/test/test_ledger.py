@@ -0,0 +1,83 @@
+import uuid
+import pytest
+from be.model import store, ledger as ledger_module
+from be.model.ledger import Ledger
+from be.model.db_schema import BalanceLedger
+from fe.access.new_buyer import register_new_buyer
+from fe.test.gen_book_data import GenBook
+from fe.test.helpers import balance
+
+
+def ledger_rows(user_id: str) -> int:
+    with store.database_instance.engine.connect() as c:
+        return len(c.execute(BalanceLedger.__table__.select().where(BalanceLedger.user_id == user_id)).all())
+
+
+@pytest.fixture
+def user():
+    user_id = "test_ledger_{}".format(uuid.uuid1())
+    yield register_new_buyer(user_id, user_id)
+    store.database_instance.Session.remove()
+
+
+def test_credit_balance_and_compact(user):
+    assert user.add_funds(100) == 200
+    ledger = Ledger()
+    for i in range(5):
+        ledger.credit(user.user_id, 10 + i, "order_{}".format(i))
+    ledger.conn.commit()
+
+    assert balance(user.user_id) == 100 + 60
+
+    # Small batches; other tests' rows may interleave
+    while ledger_rows(user.user_id):
+        ledger.compact(batch_size=2, max_batches=10)
+    assert balance(user.user_id) == 160
+    assert balance("test_ledger_no_such_user") is None
+
+
+def test_single_compactor(user, monkeypatch, tmp_path):
+    # On by default; under pre-fork only the holder of the lock file compacts
+    monkeypatch.delenv("LEDGER_COMPACT_INTERVAL", raising=False)
+    monkeypatch.setenv("JOB_LOCK_DIR", str(tmp_path))
+    first = ledger_module.start_from_env()
+    second = ledger_module.LedgerCompactor(first.interval)
+    try:
+        assert first.interval == 10
+        assert first.lock.acquire()
+        assert not second.lock.acquire()
+        first.stop()
+        assert second.lock.acquire()
+    finally:
+        first.stop()
+        second.stop()
+
+    from script import compact_ledger
+    ledger = Ledger()
+    ledger.credit(user.user_id, 7, "order_script")
+    ledger.conn.commit()
+    store.database_instance.Session.remove()
+    compact_ledger.main(["--batch-size", "100"])
+    assert ledger_rows(user.user_id) == 0
+    assert balance(user.user_id) == 7
+
+
+def test_payment_spends_uncompacted_credit(user):
+    seller_id = "test_ledger_seller_{}".format(uuid.uuid1())
+    store_id = "test_ledger_store_{}".format(uuid.uuid1())
+    gen_book = GenBook(seller_id, store_id)
+    ok, book_ids = gen_book.gen(non_exist_book_id=False, low_stock_level=False, max_book_count=1)
+    assert ok
+    code, order_id = user.new_order(store_id, [(book_ids[0][0], 1)])
+    assert code == 200
+    price = gen_book.buy_book_info_list[0][0].price
+    assert price > 0
+
+    # The buyer's whole balance is a not yet compacted ledger credit
+    ledger = Ledger()
+    ledger.credit(user.user_id, price, "income")
+    ledger.conn.commit()
+    store.database_instance.Session.remove()
+    assert user.payment(order_id) == 200
+    assert balance(user.user_id) == 0
+    assert balance(seller_id) == price
@@ -0,0 +1,86 @@
+import os
+import re
+import json
+import uuid
+import requests
+from urllib.parse import urljoin
+from unittest.mock import patch
+from fe import conf
+from fe.access.new_buyer import register_new_buyer
+from be.model import metrics
+
+
+def parse_metrics(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        samples[name] = float(value)
+    return samples
+
+
+def scrape() -> dict:
+    r = requests.get(urljoin(conf.URL, "metrics"))
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("text/plain")
+    return parse_metrics(r.text)
+
+
+def test_metrics_endpoint():
+    buyer = register_new_buyer("test_metrics_b_{}".format(uuid.uuid1()), "p")
+    ok = 'bookstore_http_requests_total{method="POST",route="/buyer/add_funds",status="200"}'
+    before = scrape()
+
+    r = requests.post(
+        urljoin(conf.URL, "buyer/add_funds"),
+        headers={"token": buyer.token},
+        json={"user_id": buyer.user_id, "password": "p", "add_value": 10},
+    )
+    assert r.status_code == 200
+    r = requests.post(
+        urljoin(conf.URL, "buyer/add_funds"),
+        headers={"token": buyer.token},
+        json={"user_id": buyer.user_id, "password": "wrong", "add_value": 10},
+    )
+    assert r.status_code >= 400
+    err = 'bookstore_http_errors_total{{route="/buyer/add_funds",status="{}"}}'.format(r.status_code)
+
+    after = scrape()
+    assert after[ok] == before.get(ok, 0) + 1
+    assert after[err] == before.get(err, 0) + 1
+    count = 'bookstore_http_request_duration_seconds_count{method="POST",route="/buyer/add_funds"}'
+    inf = 'bookstore_http_request_duration_seconds_bucket{method="POST",route="/buyer/add_funds",le="+Inf"}'
+    assert after[count] == after[inf] >= 2
+    assert any(name.startswith("bookstore_db_pool_checked_out{") for name in after)
+
+
+def test_metrics_aggregate_worker_files(tmp_path):
+    dead_pid = 2 ** 22 + 1  # above the default pid_max, never a live process
+    data = {
+        "counters": [["bookstore_orders_created_total", [], 5]],
+        "histograms": [["bookstore_blob_store_duration_seconds", [["op", "get"]],
+                        [1] + [0] * len(metrics.LATENCY_BUCKETS) + [0.004]]],
+        "gauges": [["bookstore_db_pool_checked_out", [["pid", str(dead_pid)]], 3]],
+    }
+    with open(tmp_path / "{}.json".format(dead_pid), "w") as f:
+        json.dump(data, f)
+
+    m = metrics.Metrics()
+    m.inc("bookstore_orders_created_total", 2)
+    m.observe("bookstore_blob_store_duration_seconds", 20.0, op="get")
+    with patch.dict(os.environ, {"METRICS_DIR": str(tmp_path)}):
+        samples = parse_metrics(m.render())
+        # This worker's own file is skipped in favour of its in-memory values
+        m.flush()
+        assert os.path.exists(tmp_path / "{}.json".format(os.getpid()))
+        assert parse_metrics(m.render()) == samples
+
+    assert samples["bookstore_orders_created_total"] == 7
+    bucket = 'bookstore_blob_store_duration_seconds_bucket{op="get",le="0.005"}'
+    assert samples[bucket] == 1
+    assert samples['bookstore_blob_store_duration_seconds_bucket{op="get",le="+Inf"}'] == 2
+    assert samples['bookstore_blob_store_duration_seconds_count{op="get"}'] == 2
+    assert abs(samples['bookstore_blob_store_duration_seconds_sum{op="get"}'] - 20.004) < 1e-9
+    # Pool gauges of exited workers are dropped
+    assert not any(re.search(str(dead_pid), name) for name in samples)
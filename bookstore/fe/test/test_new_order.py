@@ -56,3 +56,12 @@ class TestNewOrder:
         assert ok
         code, _ = self.buyer.new_order(self.store_id + "_x", buy_book_id_list)
         assert code != 200
+
+    def test_repeated_book_lines(self):
+        ok, buy_book_id_list = self.gen_book.gen(
+            non_exist_book_id=False, low_stock_level=False
+        )
+        assert ok
+        book_id = buy_book_id_list[0][0]
+        code, _ = self.buyer.new_order(self.store_id, [(book_id, 1), (book_id, 1)])
+        assert code == 200
@@ -67,4 +67,41 @@ class TestOrderCancel:
         # Try to cancel paid order -> Should fail or refund (depending on logic)
         # In this system, usually only unpaid can be cancelled by buyer
         code = self.buyer.cancel_order(order_id)
-        assert code != 200
\ No newline at end of file
+        assert code != 200
+
+    def test_timeout_sweep_batches_and_resume(self):
+        from be.model.order import Order as OrderApi
+        from be.model.db_schema import StoreBook
+
+        order_ids = []
+        for count in (1, 2, 3):
+            code, order_id = self.buyer.new_order(self.store_id, [(self.book.id, count)])
+            assert code == 200
+            order_ids.append(order_id)
+
+        # Age the orders far enough that no other test's orders fall before the cutoff
+        conn = db_conn.DBConn().conn
+        old = datetime(2000, 1, 1)
+        for i, order_id in enumerate(order_ids):
+            conn.query(Order).filter_by(order_id=order_id).update({"created_at": old + timedelta(seconds=i)})
+        conn.commit()
+        timeout_seconds = int((datetime.now() - old).total_seconds()) - 60
+
+        cursors = []
+        om = OrderApi()
+        canceled = om.cancel_timeout_orders(
+            timeout_seconds=timeout_seconds, batch_size=2, max_batches=1,
+            progress=lambda n, cursor: cursors.append(cursor))
+        assert canceled == 2
+        assert len(cursors) == 1
+
+        # Resume from the reported cursor: only the remaining order is left
+        canceled = om.cancel_timeout_orders(timeout_seconds=timeout_seconds, batch_size=2, cursor=cursors[0])
+        assert canceled == 1
+        assert om.cancel_timeout_orders(timeout_seconds=timeout_seconds) == 0
+
+        conn.expire_all()
+        statuses = {o.status for o in conn.query(Order).filter(Order.order_id.in_(order_ids))}
+        assert statuses == {"canceled"}
+        stock = conn.query(StoreBook).filter_by(store_id=self.store_id, book_id=self.book.id).first()
+        assert stock.stock_level == 10
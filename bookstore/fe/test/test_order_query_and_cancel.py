@@ -1,7 +1,9 @@
 import uuid
 import pytest
 import requests
+from sqlalchemy import create_engine, inspect, text
 
+from be.model.db_schema import init_db_schema
 from fe import conf
 from fe.access.new_seller import register_new_seller
 from fe.access.new_buyer import register_new_buyer
@@ -58,6 +60,46 @@ class TestOrderQueryAndCancel:
         # 至少能看到刚刚那一单
         assert any(o["order_id"] == self.order_id for o in data["orders"])
 
+    def test_list_orders_cursor(self):
+        # 再下两单，共三单，每页两单
+        order_ids = [self.order_id]
+        for _ in range(2):
+            code, order_id = self.buyer.new_order(self.store_id, [(self.book_id, 1)])
+            assert code == 200
+            order_ids.append(order_id)
+
+        url = f"{conf.URL}/buyer/list_orders"
+        headers = {"token": self.buyer_token}
+        resp = requests.get(url, headers=headers, params={"user_id": self.buyer_id, "limit": 2, "cursor": ""})
+        assert resp.status_code == 200
+        first = resp.json()
+        assert len(first["orders"]) == 2
+        assert first["next_cursor"] != ""
+        assert all(len(o["items"]) == 1 for o in first["orders"])
+
+        resp = requests.get(
+            url,
+            headers=headers,
+            params={"user_id": self.buyer_id, "limit": 2, "cursor": first["next_cursor"], "compact": 1},
+        )
+        assert resp.status_code == 200
+        second = resp.json()
+        assert len(second["orders"]) == 1
+        assert second["next_cursor"] == ""
+        assert "items" not in second["orders"][0]
+
+        seen = [o["order_id"] for o in first["orders"] + second["orders"]]
+        assert sorted(seen) == sorted(order_ids)
+
+    def test_list_orders_invalid_cursor(self):
+        url = f"{conf.URL}/buyer/list_orders"
+        resp = requests.get(
+            url,
+            headers={"token": self.buyer_token},
+            params={"user_id": self.buyer_id, "cursor": "not-a-cursor"},
+        )
+        assert resp.status_code == 400
+
     def test_cancel_order(self):
         url = f"{conf.URL}/buyer/cancel_order"
         resp = requests.post(
@@ -67,3 +109,14 @@ class TestOrderQueryAndCancel:
         )
         assert resp.status_code == 200
         assert resp.json()["message"] == "ok"
+
+
+def test_existing_database_gets_keyset_index(tmp_path):
+    # A database created before the index was declared gets it at startup
+    engine = create_engine("sqlite:///{}".format(tmp_path / "old.db"))
+    init_db_schema(engine)
+    with engine.begin() as c:
+        c.execute(text("DROP INDEX idx_order_user_created_at"))
+    init_db_schema(engine)
+    assert "idx_order_user_created_at" in {i["name"] for i in inspect(engine).get_indexes("order")}
+    engine.dispose()
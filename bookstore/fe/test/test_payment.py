@@ -1,10 +1,14 @@
+import threading
 import pytest
+import requests
+from urllib.parse import urljoin
 
 from fe.access.buyer import Buyer
 from fe.test.gen_book_data import GenBook
 from fe.access.new_buyer import register_new_buyer
 from fe.access.book import Book
 import uuid
+from fe.test.helpers import balance, server_timing_queries
 
 
 class TestPayment:
@@ -70,3 +74,51 @@ class TestPayment:
 
         code = self.buyer.payment(self.order_id)
         assert code != 200
+
+    def test_transfer_and_statement_count(self):
+        code = self.buyer.add_funds(self.total_price + 7)
+        assert code == 200
+        seller_before = balance(self.seller_id)
+        r = requests.post(
+            urljoin(self.buyer.url_prefix, "payment"),
+            headers={"token": self.buyer.token},
+            json={"user_id": self.buyer_id, "password": self.password, "order_id": self.order_id},
+        )
+        assert r.status_code == 200
+        # SELECT order + UPDATE order + lock buyer + UPDATE buyer + INSERT seller ledger
+        assert server_timing_queries(r) <= 5
+        assert balance(self.buyer_id) == 7
+        assert balance(self.seller_id) == seller_before + self.total_price
+        code = self.buyer.payment(self.order_id)
+        assert code != 200
+        assert balance(self.buyer_id) == 7
+
+    def test_concurrent_payments_same_seller(self):
+        seller_id = self.seller_id + "_2"
+        store_id = self.store_id + "_2"
+        gen_book = GenBook(seller_id, store_id)
+        ok, book_ids = gen_book.gen(non_exist_book_id=False, low_stock_level=False, max_book_count=1)
+        assert ok
+        book_ids = [(book_ids[0][0], 1)]
+        assert gen_book.seller.add_stock_level(seller_id, store_id, book_ids[0][0], 10) == 200
+        total = gen_book.buy_book_info_list[0][0].price
+        assert total > 0
+        orders = []
+        for i in range(6):
+            b = register_new_buyer("{}_{}".format(self.buyer_id, i), self.password)
+            code, order_id = b.new_order(store_id, book_ids)
+            assert code == 200
+            assert b.add_funds(10 ** 6) == 200
+            orders.append((b, order_id))
+
+        codes = []
+        threads = [threading.Thread(target=lambda b=b, o=o: codes.append(b.payment(o))) for b, o in orders]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert codes == [200] * len(orders)
+        # No lost update: every buyer debited once, every credit reached the seller
+        for b, _ in orders:
+            assert balance(b.user_id) == 10 ** 6 - total
+        assert balance(seller_id) == len(orders) * total
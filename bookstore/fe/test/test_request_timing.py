@@ -0,0 +1,53 @@
+import uuid
+import requests
+from urllib.parse import urljoin
+from flask import Flask
+from unittest.mock import patch
+from sqlalchemy import text
+from fe import conf
+from fe.access.new_buyer import register_new_buyer
+from be.model import store, request_timing
+from fe.test.helpers import parse_server_timing, server_timing_queries
+
+
+def test_server_timing_header():
+    buyer = register_new_buyer("test_timing_b_{}".format(uuid.uuid1()), "p")
+    r = requests.post(
+        urljoin(conf.URL, "buyer/add_funds"),
+        headers={"token": buyer.token},
+        json={"user_id": buyer.user_id, "password": "p", "add_value": 10},
+    )
+    assert r.status_code == 200
+    metrics = parse_server_timing(r.headers["Server-Timing"])
+    assert metrics["total"] >= metrics["db"] >= 0
+    assert "auth" in metrics and "mongo" in metrics
+    assert server_timing_queries(r) >= 1
+
+    r = requests.get(urljoin(conf.URL, "timing"))
+    assert r.status_code == 200
+    stats = r.json()["endpoints"]["/buyer/add_funds"]
+    assert stats["count"] >= 1
+    assert stats["avg_sql_count"] >= 1
+
+
+def test_n_plus_one_flagged():
+    engine = store.database_instance.engine
+    app = Flask(__name__)
+    request_timing.init_app(app, engine)
+
+    @app.route("/many")
+    def many():
+        with engine.connect() as c:
+            for i in range(request_timing.QUERY_THRESHOLD + 1):
+                c.execute(text("SELECT :i"), {"i": i})
+        return "ok"
+
+    request_timing.endpoint_stats.clear()
+    with patch("logging.warning") as warning:
+        r = app.test_client().get("/many")
+    assert r.status_code == 200
+    assert warning.called
+    assert "N+1" in warning.call_args[0][0]
+    stats = request_timing.endpoint_stats.snapshot()["/many"]
+    assert stats["n_plus_one"] == 1
+    assert stats["max_sql_count"] == request_timing.QUERY_THRESHOLD + 1
@@ -1,9 +1,16 @@
+import copy
 import pytest
 import uuid
+from unittest.mock import patch
+from sqlalchemy import text
 from fe.access.new_seller import register_new_seller
 from fe.access.new_buyer import register_new_buyer
 from fe.access import book as bookdb
 from fe import conf
+import requests
+from urllib.parse import urljoin
+from be.model import store, fulltext
+from be.model.db_schema import Book as BookModel
 
 class TestSearchBook:
     @pytest.fixture(autouse=True)
@@ -26,6 +33,18 @@ class TestSearchBook:
         
         yield
 
+    def add_unique_book(self, title: str):
+        book = copy.copy(self.book)
+        book.id = "test_search_book_{}".format(uuid.uuid1())
+        book.title = title
+        assert self.seller.add_book(self.store_id, 10, book) == 200
+        return book
+
+    def search_ids(self, keyword: str, limit: int = 100):
+        r = requests.get(urljoin(conf.URL, "book/search"), params={"q": keyword, "limit": limit})
+        assert r.status_code == 200
+        return [b["id"] for b in r.json()["books"]], r.json()["total"]
+
     def test_search_in_store(self):
         # 1. Search by title in specific store
         keyword = self.book.title[:2] # Partial match
@@ -68,4 +87,43 @@ class TestSearchBook:
     def test_search_no_result(self):
         code, res = self.buyer.search_book("non_existent_keyword_xyz", self.store_id)
         assert code == 200
-        assert len(res) == 0
\ No newline at end of file
+        assert len(res) == 0
+
+    def test_search_global_ranked_total(self):
+        # Substring of the title (full-text index path) returns the book and a total
+        book = self.add_unique_book("龘靐书名{}".format(uuid.uuid1().hex))
+        url = urljoin(conf.URL, "book/search")
+        r = requests.get(url, params={"q": book.title[1:], "limit": 5})
+        assert r.status_code == 200
+        data = r.json()
+        assert data["total"] == 1
+        assert [b["id"] for b in data["books"]] == [book.id]
+
+    def test_search_short_cjk_term(self):
+        # 1-2 character terms are served from book_fts_short, not from a LIKE scan
+        book = self.add_unique_book("龘靐之书")
+        with patch.object(fulltext.LikeBackend, "search", side_effect=AssertionError("LIKE scan")) as like:
+            for keyword in ("龘靐", "靐"):
+                ids, total = self.search_ids(keyword)
+                assert book.id in ids
+                assert total >= 1
+        if store.get_fulltext_backend().name == "fts5":
+            assert like.call_count == 0
+
+    def test_search_after_vacuum(self):
+        if store.get_fulltext_backend().name != "fts5":
+            pytest.skip("SQLite FTS5 backend only")
+        engine = store.database_instance.engine
+        # Leave rowid gaps in book so that VACUUM renumbers the remaining rows
+        with engine.begin() as c:
+            c.execute(BookModel.__table__.insert(), [
+                {"id": "test_search_gap_{}".format(uuid.uuid1()), "title": "gap"} for _ in range(20)
+            ])
+            c.execute(BookModel.__table__.delete().where(BookModel.id.like("test_search_gap_%")))
+        book = self.add_unique_book("真空之后{}".format(uuid.uuid1().hex))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as c:
+            c.execute(text("VACUUM"))
+        ids, total = self.search_ids(book.title[1:])
+        assert ids == [book.id]
+        ids, total = self.search_ids("真空")
+        assert book.id in ids
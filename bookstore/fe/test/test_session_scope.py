@@ -0,0 +1,66 @@
+import time
+import uuid
+from flask import Flask
+from sqlalchemy.orm import sessionmaker
+from be.model import store, session_scope
+from be.model.db_conn import DBConn
+from be.model.db_schema import User
+from be.model.session_scope import SessionLeakDetector
+from fe.access.new_buyer import register_new_buyer
+from fe.test.helpers import balance
+
+
+def make_app():
+    app = Flask(__name__)
+    session_scope.init_app(app, store.database_instance)
+    return app
+
+
+def test_request_session_commit_rollback_and_release():
+    database = store.database_instance
+    user_id = register_new_buyer("test_session_scope_{}".format(uuid.uuid1()), "p").user_id
+
+    app = make_app()
+    seen = []
+
+    def add_one(status, fail=False):
+        conn = DBConn().conn
+        seen.append(conn)
+        user = conn.query(User).filter_by(user_id=user_id).with_for_update().first()
+        user.balance += 1
+        # No commit / rollback in the view: the teardown decides
+        if fail:
+            raise RuntimeError("view failed")
+        return "", status
+
+    app.add_url_rule("/ok", "ok", lambda: add_one(200))
+    app.add_url_rule("/error", "error", lambda: add_one(400))
+    app.add_url_rule("/raise", "raise", lambda: add_one(200, fail=True))
+
+    client = app.test_client()
+    checked_out = database.engine.pool.checkedout()
+    assert client.get("/ok").status_code == 200
+    assert balance(user_id) == 1
+    assert client.get("/error").status_code == 400
+    assert balance(user_id) == 1
+    assert client.get("/raise").status_code == 500
+    assert balance(user_id) == 1
+
+    # Every request got a fresh session and gave its connection back
+    assert len({id(s) for s in seen}) == 3
+    assert database.engine.pool.checkedout() <= checked_out
+
+
+def test_leak_detector_reports_long_transactions():
+    factory = sessionmaker(bind=store.database_instance.engine)
+    detector = SessionLeakDetector(factory, threshold=0.05)
+    session = factory()
+    session.query(User).first()
+    assert detector.leaks() == []
+    time.sleep(0.1)
+    assert len(detector.leaks()) == 1
+    assert detector.check() == 1
+    assert detector.check() == 0  # reported once
+    session.commit()
+    assert detector.leaks() == []
+    session.close()
@@ -0,0 +1,54 @@
+import os
+import uuid
+import threading
+from unittest.mock import patch
+from fe.access.new_buyer import register_new_buyer
+from be.model import store
+from be.model.buyer import Buyer
+
+
+def test_engine_options_from_env():
+    env = {"DB_POOL_SIZE": "3", "DB_MAX_OVERFLOW": "0", "DB_POOL_TIMEOUT": "2.5", "DB_POOL_PRE_PING": "0"}
+    with patch.dict(os.environ, env):
+        options = store.engine_options("postgresql://u:p@localhost/bookstore")
+        assert options["pool_size"] == 3
+        assert options["max_overflow"] == 0
+        assert options["pool_timeout"] == 2.5
+        assert options["pool_pre_ping"] is False
+        sqlite = store.engine_options("sqlite:///x.db")
+        assert sqlite["pool_size"] == 3
+        assert "pool_pre_ping" not in sqlite
+    with patch.dict(os.environ, {"SQLITE_BUSY_TIMEOUT": "1500", "SQLITE_SYNCHRONOUS": "FULL"}):
+        assert store.engine_options("sqlite:///x.db")["connect_args"]["timeout"] == 1.5
+        assert store.sqlite_pragmas()["synchronous"] == "FULL"
+
+
+def test_sqlite_pragmas_applied():
+    instance = store.database_instance
+    if instance.engine.dialect.name != "sqlite":
+        return
+    assert instance.settings["journal_mode"] == "wal"
+    assert instance.settings["busy_timeout"] == store.sqlite_pragmas()["busy_timeout"]
+    # Every pooled connection gets the pragmas, not just the first one
+    with instance.engine.connect() as c1, instance.engine.connect() as c2:
+        for c in (c1, c2):
+            assert c.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+
+def test_concurrent_writers_not_locked():
+    buyers = [register_new_buyer("test_store_cfg_{}".format(uuid.uuid1()), "p") for _ in range(8)]
+    errors = []
+
+    def add_funds(user_id):
+        for _ in range(5):
+            ok, msg = Buyer().add_funds(user_id, "p", 1)
+            if not ok:
+                errors.append(msg)
+        store.database_instance.Session.remove()
+
+    threads = [threading.Thread(target=add_funds, args=(b.user_id,)) for b in buyers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
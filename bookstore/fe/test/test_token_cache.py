@@ -0,0 +1,113 @@
+import time
+import uuid
+
+import pytest
+import requests
+from urllib.parse import urljoin
+
+from be.model import generation
+from be.model.token_cache import TokenCache
+from be.model.user import User
+from fe.access import auth
+from fe import conf
+
+
+class TestTokenCache:
+    def test_hit_and_miss(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        assert not cache.get("u", "t")
+        cache.put("u", "t", time.time() + 100)
+        assert cache.get("u", "t")
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_lru_eviction(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.put("u1", "t", time.time() + 100)
+        cache.put("u2", "t", time.time() + 100)
+        # touch u1 so that u2 becomes the least recently used
+        assert cache.get("u1", "t")
+        cache.put("u3", "t", time.time() + 100)
+        assert cache.get("u1", "t")
+        assert not cache.get("u2", "t")
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.put("u", "t", time.time() - 1)
+        assert not cache.get("u", "t")
+        cache = TokenCache(max_size=10, ttl=0)
+        cache.put("u", "t", time.time() + 100)
+        assert not cache.get("u", "t")
+
+    def test_invalidate(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.put("u", "t1", time.time() + 100)
+        cache.put("u", "t2", time.time() + 100)
+        cache.put("v", "t1", time.time() + 100)
+        cache.invalidate("u", "t1")
+        assert not cache.get("u", "t1")
+        assert cache.get("u", "t2")
+        cache.invalidate("u")
+        assert not cache.get("u", "t2")
+        assert cache.get("v", "t1")
+
+    def test_invalidate_other_worker(self, tmp_path, monkeypatch):
+        # Two caches stand for two pre-fork workers sharing CACHE_GENERATION_DIR
+        monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+        worker_a = TokenCache(max_size=10, ttl=60)
+        worker_b = TokenCache(max_size=10, ttl=60)
+        worker_a.put("u", "t", time.time() + 100)
+        worker_a.put("v", "t", time.time() + 100)
+        assert worker_a.get("u", "t")
+        worker_b.invalidate("u")
+        assert not worker_a.get("u", "t")
+        assert worker_a.get("v", "t")
+
+    def test_reset_all_other_workers(self, tmp_path, monkeypatch):
+        # The database was replaced: every entry of every worker is dropped
+        monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+        worker_a = TokenCache(max_size=10, ttl=60)
+        worker_a.put("u", "t", time.time() + 100)
+        worker_a.put("v", "t", time.time() + 100)
+        generation.bump_all()
+        assert not worker_a.get("u", "t")
+        assert not worker_a.get("v", "t")
+
+    def test_invalidate_during_verify(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CACHE_GENERATION_DIR", str(tmp_path))
+        cache = TokenCache(max_size=10, ttl=60)
+        gen = cache.generation("u")
+        # Revoked by another worker while this one was verifying the token
+        TokenCache(max_size=10, ttl=60).invalidate("u")
+        cache.put("u", "t", time.time() + 100, gen)
+        assert not cache.get("u", "t")
+
+
+class TestTokenCacheAuth:
+    @pytest.fixture(autouse=True)
+    def pre_run_initialization(self):
+        self.auth = auth.Auth(conf.URL)
+        self.user_id = "test_token_cache_{}".format(str(uuid.uuid1()))
+        self.password = "password_" + self.user_id
+        assert self.auth.register(self.user_id, self.password) == 200
+        code, self.token = self.auth.login(self.user_id, self.password, "terminal")
+        assert code == 200
+        yield
+
+    def test_unregister_invalidates(self):
+        um = User()
+        assert um.check_token(self.user_id, self.token)[0] == 200
+        # second check is served from the cache
+        assert um.check_token(self.user_id, self.token)[0] == 200
+        assert self.auth.unregister(self.user_id, self.password) == 200
+        assert um.check_token(self.user_id, self.token)[0] == 401
+
+    def test_stats(self):
+        r = requests.get(urljoin(conf.URL, "auth/token_cache"))
+        assert r.status_code == 200
+        stats = r.json()["stats"]
+        assert "hit_rate" in stats
+        assert stats["size"] <= stats["max_size"]
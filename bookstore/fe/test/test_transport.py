@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+import pytest
+import requests
+from fe import conf
+from fe.access import auth, transport
+from fe.access.new_buyer import register_new_buyer
+
+
+class CountingSession(requests.Session):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def request(self, *args, **kwargs):
+        self.calls += 1
+        return super().request(*args, **kwargs)
+
+
+def test_clients_share_pooled_session():
+    buyer = register_new_buyer("test_transport_b_{}".format(uuid.uuid1()), "p")
+    assert buyer.session is transport.get_session()
+    assert buyer.auth.session is buyer.session
+    assert buyer.add_funds(10) == 200
+
+
+def test_injected_session():
+    session = CountingSession()
+    a = auth.Auth(conf.URL, session=session)
+    user_id = "test_transport_i_{}".format(uuid.uuid1())
+    assert a.register(user_id, "p") == 200
+    code, token = a.login(user_id, "p", "t")
+    assert code == 200 and token
+    assert session.calls == 2
+    session.close()
+
+
+def test_async_client():
+    pytest.importorskip("aiohttp")
+    from fe.access.async_client import AsyncClient
+
+    user_id = "test_transport_a_{}".format(uuid.uuid1())
+    assert auth.Auth(conf.URL).register(user_id, "p") == 200
+
+    async def run():
+        async with AsyncClient(conf.URL, pool_size=4) as client:
+            buyer = await client.login_buyer(user_id, "p")
+            codes = await asyncio.gather(*[buyer.add_funds(1) for _ in range(8)])
+            code, _ = await buyer.new_order("no_such_store_" + user_id, [("x", 1)])
+            return codes, code
+
+    codes, code = asyncio.run(run())
+    assert codes == [200] * 8
+    assert code != 200
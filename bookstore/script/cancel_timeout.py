@@ -1,16 +1,42 @@
 # script/cancel_timeout.py
 """
 自动取消超时未支付的订单
+
+分批处理，每批一个事务；每批提交后打印游标，中断后可用 --cursor 继续：
+    PYTHONPATH=. python script/cancel_timeout.py --timeout 900 --batch-size 500
+    PYTHONPATH=. python script/cancel_timeout.py --cursor <上次打印的游标>
 """
 
-from be.model.order import Order
+import argparse
+import os
+from be.model import store
+from be.model.order import Order, TIMEOUT_BATCH_SIZE
 
 # 超时时间，秒
 TIMEOUT_SECONDS = 15 * 60  # 15分钟
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cancel unpaid orders that timed out")
+    parser.add_argument("--timeout", type=int, default=TIMEOUT_SECONDS, help="seconds before an unpaid order times out")
+    parser.add_argument("--batch-size", type=int, default=TIMEOUT_BATCH_SIZE, help="orders canceled per transaction")
+    parser.add_argument("--cursor", default=None, help="resume from the cursor printed by an interrupted run")
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if store.database_instance is None:
+        store.init_database(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def progress(canceled, cursor):
+        print(f"canceled {canceled} orders so far, cursor {cursor}")
+
     om = Order()
-    n = om.cancel_timeout_orders(timeout_seconds=TIMEOUT_SECONDS)
+    n = om.cancel_timeout_orders(
+        timeout_seconds=args.timeout,
+        batch_size=args.batch_size,
+        cursor=args.cursor,
+        max_batches=args.max_batches,
+        progress=progress,
+    )
     print(f"canceled {n} timeout orders.")
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+# script/compact_ledger.py
+"""
+把 balance_ledger 中的卖家收入合并进 user.balance
+
+后端默认每 LEDGER_COMPACT_INTERVAL 秒自动合并 (pre-fork 模式下只由一个 worker 运行)；
+设置 LEDGER_COMPACT_INTERVAL=0 关闭后，可以用本脚本手动或定时合并：
+    PYTHONPATH=. python script/compact_ledger.py --batch-size 1000
+    PYTHONPATH=. python script/compact_ledger.py --interval 10
+"""
+
+import argparse
+import os
+import time
+from be.model import store
+from be.model.ledger import Ledger, COMPACT_BATCH_SIZE
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold balance ledger rows into user balances")
+    parser.add_argument("--batch-size", type=int, default=COMPACT_BATCH_SIZE, help="ledger rows folded per transaction")
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--interval", type=float, default=0, help="keep running, compacting every INTERVAL seconds")
+    args = parser.parse_args(argv)
+
+    if store.database_instance is None:
+        store.init_database(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    while True:
+        try:
+            n = Ledger().compact(batch_size=args.batch_size, max_batches=args.max_batches)
+        finally:
+            store.database_instance.Session.remove()
+        print(f"folded {n} ledger rows.")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()